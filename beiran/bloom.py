@@ -0,0 +1,97 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Bloom filter for advertising set membership compactly
+"""
+
+import base64
+import hashlib
+import math
+
+from typing import Iterable
+
+
+class BloomFilter:
+    """
+    Bloom filter using double hashing over sha256 of keys.
+
+    It can tell a key is definitely not in the set, or probably is,
+    with a false positive rate given at creation.
+    """
+
+    def __init__(self, size: int, hash_count: int, bits: bytes = None) -> None:
+        """
+
+        Args:
+            size (int): number of bits, rounded up to whole bytes
+            hash_count (int): number of hash functions
+            bits (bytes): bit array of an existing filter
+        """
+        self.size = int(math.ceil(size / 8.0)) * 8
+        self.hash_count = hash_count
+        self.bits = bytearray(bits) if bits else bytearray(self.size // 8)
+        if len(self.bits) * 8 != self.size:
+            raise ValueError("bit array does not match filter size")
+
+    @classmethod
+    def for_capacity(cls, capacity: int, error_rate: float = 0.01) -> "BloomFilter":
+        """Create a filter sized to hold `capacity` keys with `error_rate` false positives"""
+        capacity = max(capacity, 1)
+        size = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        hash_count = max(int(round(size / capacity * math.log(2))), 1)
+        return cls(size, hash_count)
+
+    @classmethod
+    def from_keys(cls, keys: Iterable[str], error_rate: float = 0.01) -> "BloomFilter":
+        """Create a filter holding `keys`"""
+        keys = list(keys)
+        bloom = cls.for_capacity(len(keys), error_rate)
+        for key in keys:
+            bloom.add(key)
+        return bloom
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode('utf-8')).digest()
+        hash1 = int.from_bytes(digest[:8], 'big')
+        hash2 = int.from_bytes(digest[8:16], 'big') | 1
+        for i in range(self.hash_count):
+            yield (hash1 + i * hash2) % self.size
+
+    def add(self, key: str):
+        """Add a key to filter"""
+        for pos in self._positions(key):
+            self.bits[pos // 8] |= 1 << (pos % 8)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(key))
+
+    def to_dict(self) -> dict:
+        """Serialize filter"""
+        return {
+            "size": self.size,
+            "hash_count": self.hash_count,
+            "bits": base64.b64encode(bytes(self.bits)).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, _dict: dict) -> "BloomFilter":
+        """Deserialize filter"""
+        return cls(_dict['size'], _dict['hash_count'], base64.b64decode(_dict['bits']))
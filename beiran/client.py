@@ -222,6 +222,53 @@ class Client:
         path = "/status" if not plugin else "/status/plugins/{}".format(plugin)
         return await self.request_json(path=path, **kwargs)
 
+    async def get_bandwidth(self, **kwargs) -> dict:
+        """
+        Retrieve bandwidth limits and transfers of node
+        Returns:
+            object: limits of uploads and downloads
+        """
+        return await self.request_json(path="/bandwidth", **kwargs)
+
+    async def set_bandwidth(self, limits: dict, **kwargs) -> dict:
+        """
+        Change bandwidth limits of node
+        Args:
+            limits (dict): limits by direction, e.g. ``{"upload": {"rate": 1048576}}``
+        Returns:
+            object: limits of uploads and downloads
+        """
+        return await self.request_json(path="/bandwidth", data=limits, method="POST",
+                                       raise_error=True, **kwargs)
+
+    async def get_tasks(self, status: str = None, **kwargs) -> list:
+        """
+        Get latest jobs of node, like image pulls
+        Args:
+            status (str): only jobs in this status, such as `queued` or `running`
+        Returns:
+            list: jobs with their progress
+        """
+        path = '/tasks'
+        if status:
+            path = path + '?status={}'.format(status)
+        resp = await self.request_json(path=path, raise_error=True, **kwargs)
+        return resp.get('tasks', [])
+
+    async def get_task(self, task_id: str, **kwargs) -> dict:
+        """
+        Get a job of node with its progress
+        """
+        return await self.request_json(path='/tasks/{}'.format(task_id), raise_error=True,
+                                       **kwargs)
+
+    async def cancel_task(self, task_id: str, **kwargs) -> dict:
+        """
+        Cancel a queued or running job of node
+        """
+        return await self.request_json(path='/tasks/{}'.format(task_id), method='DELETE',
+                                       raise_error=True, **kwargs)
+
     async def ping(self, timeout: int = 10, **kwargs) -> bool:
         """
         Pings the node
@@ -234,6 +281,30 @@ class Client:
         # TODO: Return ping time
         return True
 
+    async def open_channel(self, **kwargs) -> aiohttp.ClientWebSocketResponse:
+        """
+        Open persistent peer channel of the node
+
+        Usage::
+
+            channel = await client.open_channel()
+            async for msg in channel:
+                do something with msg.data
+
+        Returns:
+            ClientWebSocketResponse: websocket connection to `/ws`
+        """
+        if not self.http_client:
+            await self.create_client()
+
+        try:
+            return await self.http_client.ws_connect(self.url + "/ws", **kwargs) # type: ignore
+        except aiohttp.WSServerHandshakeError as err:
+            raise Client.HTTPError(err.code, err.message, headers=err.headers,
+                                   history=err.history, request=err.request_info)
+        except (aiohttp.ClientError, OSError) as err:
+            raise Client.Error(str(err))
+
     async def probe_node(self, address: str, probe_back: bool = True, **kwargs) -> dict:
         """
         Connect to a new node
@@ -296,6 +367,7 @@ class Client:
         wait = kwargs.pop('wait', False)
         node = kwargs.pop('node', None)
         whole_image_only = kwargs.pop('whole_image_only', False)
+        priority = kwargs.pop('priority', None)
 
         path = '/docker/images?cmd=pull'
         data = {
@@ -304,7 +376,8 @@ class Client:
             'wait': wait,
             'force': force,
             'progress': progress,
-            'whole_image_only': whole_image_only
+            'whole_image_only': whole_image_only,
+            'priority': priority
         }
 
         resp = await self.request(path,
@@ -315,6 +388,35 @@ class Client:
         return resp
     #pylint: enable-msg=too-many-arguments
 
+    async def prewarm_images(self, images: list, **kwargs) -> dict:
+        """
+        Pull images on nodes of cluster in background, with this node coordinating
+        Args:
+            images (list): image references
+            nodes (list): uuids of nodes, all online nodes if not given
+            selector (str): labels nodes must match, such as `zone=eu-1,rack=r1`
+            deadline (float): unix time to give up pulls not finished
+            concurrency (int): number of nodes pulling at the same time
+        Returns:
+            object: id and progress of pre-warming
+        """
+        data = {'images': images}
+        for key in ('nodes', 'selector', 'deadline', 'concurrency'):
+            if kwargs.get(key) is not None:
+                data[key] = kwargs.pop(key)
+            kwargs.pop(key, None)
+        return await self.request_json(path='/docker/prewarm', data=data,
+                                       method='POST', raise_error=True, **kwargs)
+
+    async def get_prewarms(self, prewarm_id: str = None, **kwargs) -> dict:
+        """
+        Get progress of a pre-warming, or of all pre-warmings of node
+        """
+        path = '/docker/prewarm'
+        if prewarm_id:
+            path = path + '/' + prewarm_id
+        return await self.request_json(path=path, raise_error=True, **kwargs)
+
     async def stream_image(self, imagename: str, **kwargs) -> aiohttp.client_reqrep.ClientResponse:
         """
         Stream image from this node
@@ -353,3 +455,70 @@ class Client:
         resp = await self.request_json(path=path, **kwargs)
 
         return resp.get('layers', [])
+
+    async def get_catalog_tree(self, kind: str, prefix: str = '', **kwargs) -> dict:
+        """
+        Get a node of docker catalog hash tree of images or layers
+        Returns:
+            object: hash of node and hashes of its children or its entries
+        """
+        path = '/docker/catalog/{}s/tree/{}'.format(kind, prefix)
+        return await self.request_json(path=path, raise_error=True, **kwargs)
+
+    async def get_catalog_entries(self, keys: List[str], **kwargs) -> dict:
+        """
+        Get images and layers of catalog keys
+        Returns:
+            object: lists of images and layers
+        """
+        return await self.request_json(path='/docker/catalog/entries',
+                                       data={'keys': keys},
+                                       method='POST',
+                                       **kwargs)
+
+    async def get_holders(self, kind: str, identifier: str, local: bool = False,
+                          **kwargs) -> dict:
+        """
+        Ask node which nodes hold a docker layer or image
+        Args:
+            kind (str): `layer` or `image`
+            identifier (str): layer digest or image identifier
+            local (bool): ask only if node itself holds it
+        Returns:
+            object: list of holders, or answer of the node if `local`
+        """
+        path = '/docker/{}s/{}/holders'.format(kind, identifier)
+        if local:
+            path = path + '?local=true'
+        return await self.request_json(path=path, raise_error=True, **kwargs)
+
+    async def get_layer_stats(self, **kwargs) -> dict:
+        """
+        Get request counts of docker layers served by node
+        Returns:
+            object: request counts by layer digest, and hot layers
+        """
+        return await self.request_json(path='/docker/layers/stats', raise_error=True, **kwargs)
+
+    async def replicate_layer(self, digest: str, **kwargs) -> dict:
+        """
+        Ask node to download a hot docker layer from its holders in background
+        Args:
+            digest (str): layer digest
+        Returns:
+            object: digest, and if node started downloading the layer
+        """
+        path = '/docker/layers/{}/replicate'.format(digest)
+        return await self.request_json(path=path, data={}, method='POST',
+                                       raise_error=True, **kwargs)
+
+    async def get_layer_filter(self, since: str = None, **kwargs) -> dict:
+        """
+        Get bloom filter of docker layers of node
+        Returns:
+            object: version of filter, and filter itself if it is not `since`
+        """
+        path = '/docker/layers/filter'
+        if since is not None:
+            path = path + '?since={}'.format(since)
+        return await self.request_json(path=path, raise_error=True, **kwargs)
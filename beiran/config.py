@@ -40,6 +40,16 @@ DEFAULTS = {
     'CACHE_DIR': '/var/cache/beiran',
     'RUN_DIR': '/var/run',
     'KNOWN_NODES': [],
+    'SYNC_MODE': 'channel',
+    'MAX_UPLOADS': 8,
+    'UPLOAD_QUEUE': 16,
+    'UPLOAD_RATE': 0,
+    'DOWNLOAD_RATE': 0,
+    'PEER_RATE': 0,
+    'BACKGROUND_RATE': 1048576,
+    'MAX_JOBS': 4,
+    'MAX_REGISTRY_JOBS': 2,
+    'DISK_INTERVAL': 600,
 }
 
 DEFAULT_FILE_PATHS = {
@@ -293,6 +303,34 @@ class Config(metaclass=ConfigMeta):
         """
         return self.get_config('beiran.hostname', 'HOSTNAME')
 
+    @property
+    def zone(self):
+        """
+        Zone (e.g. availability zone) of the node. Nodes prefer peers in the
+        same zone as download sources and, when zones are set, only one
+        node per zone downloads a layer from the registry.
+        The default value is ``None``
+
+        config.toml: section ``beiran``, key ``zone``
+
+        Environment variable: ``BEIRAN_ZONE``
+
+        """
+        return self.get_config('beiran.zone', 'ZONE')
+
+    @property
+    def rack(self):
+        """
+        Rack of the node in its zone. Peers in the same rack are preferred
+        over other peers of the zone. The default value is ``None``
+
+        config.toml: section ``beiran``, key ``rack``
+
+        Environment variable: ``BEIRAN_RACK``
+
+        """
+        return self.get_config('beiran.rack', 'RACK')
+
     @property
     def listen_interface(self):
         """
@@ -318,6 +356,145 @@ class Config(metaclass=ConfigMeta):
         """
         return self.get_config('beiran.known_nodes', 'KNOWN_NODES')
 
+    @property
+    def sync_mode(self):
+        """
+        How daemon learns state changes of its peers after the initial sync.
+        The default value is ``channel``, which keeps a websocket channel open
+        to every peer. ``gossip`` relies on the discovery plugin to spread
+        sync state versions, for large clusters.
+
+        config.toml: section ``beiran``, key ``sync_mode``
+
+        Environment variable: ``BEIRAN_SYNC_MODE``
+
+        """
+        return self.get_config('beiran.sync_mode', 'SYNC_MODE')
+
+    @property
+    def max_uploads(self):
+        """
+        How many uploads to other nodes are served at the same time. Further
+        requests wait in the upload queue. The default value is ``8``,
+        ``0`` means unlimited.
+
+        config.toml: section ``beiran``, key ``max_uploads``
+
+        Environment variable: ``BEIRAN_MAX_UPLOADS``
+
+        """
+        return int(self.get_config('beiran.max_uploads', 'MAX_UPLOADS'))
+
+    @property
+    def upload_queue(self):
+        """
+        How many upload requests can wait for a free slot. Requests beyond
+        are rejected with ``503`` and a ``Retry-After`` header.
+        The default value is ``16``.
+
+        config.toml: section ``beiran``, key ``upload_queue``
+
+        Environment variable: ``BEIRAN_UPLOAD_QUEUE``
+
+        """
+        return int(self.get_config('beiran.upload_queue', 'UPLOAD_QUEUE'))
+
+    @property
+    def upload_rate(self):
+        """
+        Total upload bandwidth in bytes per second shared by all uploads.
+        The default value is ``0``, which means unlimited.
+
+        config.toml: section ``beiran``, key ``upload_rate``
+
+        Environment variable: ``BEIRAN_UPLOAD_RATE``
+
+        """
+        return int(self.get_config('beiran.upload_rate', 'UPLOAD_RATE'))
+
+    @property
+    def download_rate(self):
+        """
+        Total download bandwidth in bytes per second shared by all downloads,
+        from other nodes or registries. The default value is ``0``, which
+        means unlimited.
+
+        config.toml: section ``beiran``, key ``download_rate``
+
+        Environment variable: ``BEIRAN_DOWNLOAD_RATE``
+
+        """
+        return int(self.get_config('beiran.download_rate', 'DOWNLOAD_RATE'))
+
+    @property
+    def peer_rate(self):
+        """
+        Bandwidth in bytes per second of uploads to, and downloads from,
+        each single peer. The default value is ``0``, which means unlimited.
+
+        config.toml: section ``beiran``, key ``peer_rate``
+
+        Environment variable: ``BEIRAN_PEER_RATE``
+
+        """
+        return int(self.get_config('beiran.peer_rate', 'PEER_RATE'))
+
+    @property
+    def background_rate(self):
+        """
+        Bandwidth in bytes per second left to background transfers, like
+        replication and prefetching, while interactive pulls are going on
+        in the same direction. The default value is ``1048576``, ``0``
+        means unlimited.
+
+        config.toml: section ``beiran``, key ``background_rate``
+
+        Environment variable: ``BEIRAN_BACKGROUND_RATE``
+
+        """
+        return int(self.get_config('beiran.background_rate', 'BACKGROUND_RATE'))
+
+    @property
+    def max_jobs(self):
+        """
+        How many pull jobs run at the same time. Further jobs wait in the
+        job queue, by their priority. The default value is ``4``, ``0``
+        means unlimited.
+
+        config.toml: section ``beiran``, key ``max_jobs``
+
+        Environment variable: ``BEIRAN_MAX_JOBS``
+
+        """
+        return int(self.get_config('beiran.max_jobs', 'MAX_JOBS'))
+
+    @property
+    def max_registry_jobs(self):
+        """
+        How many pull jobs of images of the same registry run at the same
+        time. The default value is ``2``, ``0`` means unlimited.
+
+        config.toml: section ``beiran``, key ``max_registry_jobs``
+
+        Environment variable: ``BEIRAN_MAX_REGISTRY_JOBS``
+
+        """
+        return int(self.get_config('beiran.max_registry_jobs', 'MAX_REGISTRY_JOBS'))
+
+    @property
+    def disk_interval(self):
+        """
+        Seconds between walking the cache and image stores to correct disk
+        usage, which is otherwise kept up to date as files change. The
+        default value is ``600``.
+
+        config.toml: section ``beiran``, key ``disk_interval``
+
+        Environment variable: ``BEIRAN_DISK_INTERVAL``
+
+        """
+        return int(self.get_config('beiran.disk_interval', 'DISK_INTERVAL'))
+
     @property
     def db_file(self):
         """
@@ -22,10 +22,20 @@
 from pyee import EventEmitter
 
 from beiran.log import build_logger
+from beiran.ratelimit import BandwidthShaper, UploadAdmission
+from beiran.daemon.disk import DiskUsage
+from beiran.daemon.jobs import JobManager
 from beiran.version import get_version
 
 
 EVENTS = EventEmitter()
+UPLOADS = UploadAdmission()
+BANDWIDTH = {
+    'upload': BandwidthShaper(),
+    'download': BandwidthShaper()
+}
+JOBS = JobManager()
+DISK = DiskUsage()
 VERSION = get_version('short', 'daemon')
 
 
@@ -0,0 +1,217 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Disk usage accounting
+
+Bytes and inodes used by the beiran cache and image stores of container
+runtimes are kept as running totals, updated when files are added or
+removed, or when a store is told to have changed. Stores are walked again
+in background, periodically or soon after changes, to correct the totals.
+Reading usage never walks the disk.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from typing import Dict, Optional, Tuple
+
+
+def walk(path: str, track_files: bool = False) -> Tuple[int, int, Optional[Dict[str, int]]]:
+    """
+    Sum allocated bytes and inodes of files and directories under `path`,
+    counting hard links once.
+
+    Returns:
+        (int, int, dict): bytes, inodes, and bytes of each file if `track_files`
+    """
+    used_bytes = 0
+    inodes = set()
+    files = {} if track_files else None # type: Optional[Dict[str, int]]
+    for root, dirs, names in os.walk(path):
+        for is_file, name in [(False, name) for name in dirs] + [(True, name) for name in names]:
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.lstat(file_path)
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) in inodes:
+                continue
+            inodes.add((stat.st_dev, stat.st_ino))
+            used_bytes += stat.st_blocks * 512
+            if files is not None and is_file:
+                files[file_path] = stat.st_blocks * 512
+    return used_bytes, len(inodes), files
+
+
+class DiskUsage:
+    """Running totals of disk usage of stores"""
+
+    # seconds to gather changes of a store before walking it
+    CHANGE_DELAY = 5
+    # least seconds between walks of a store for its changes
+    CHANGE_INTERVAL = 60
+
+    def __init__(self, interval: float = 600, logger: logging.Logger = None) -> None:
+        """
+        Args:
+            interval (float): seconds between walking stores to correct totals
+        """
+        self.interval = interval
+        self.logger = logger if logger else logging.getLogger('beiran.disk')
+        self.stores = {} # type: Dict[str, dict]
+        self.changed_stores = set() # type: set
+        self.wakeup = None # type: Optional[asyncio.Event]
+        self.task = None # type: Optional[asyncio.Future]
+
+    def configure(self, interval: float = None):
+        """Change reconcile interval, keeping it if not given"""
+        if interval is not None:
+            self.interval = interval
+
+    def add_store(self, name: str, path: str, track_files: bool = False):
+        """
+        Account disk usage under `path` as store `name`. Files of stores
+        with `track_files` can be added and removed one by one.
+        """
+        self.stores[name] = {
+            'path': os.path.realpath(path),
+            'track_files': track_files,
+            'bytes': 0,
+            'inodes': 0,
+            'files': {},
+            'reconciled_at': None
+        }
+        self.changed(name)
+
+    def store_of(self, path: str) -> Optional[dict]:
+        """Store of file at `path`, the most specific one if stores are nested"""
+        path = os.path.realpath(path)
+        found = None
+        for store in self.stores.values():
+            if (path + os.sep).startswith(store['path'] + os.sep) and \
+                    (not found or len(store['path']) > len(found['path'])):
+                found = store
+        return found
+
+    def added(self, path: str):
+        """File at `path` is written, or rewritten"""
+        store = self.store_of(path)
+        if not store or not store['track_files']:
+            return
+        try:
+            size = os.lstat(path).st_blocks * 512
+        except OSError:
+            return
+        path = os.path.realpath(path)
+        if path not in store['files']:
+            store['inodes'] += 1
+        store['bytes'] += size - store['files'].get(path, 0)
+        store['files'][path] = size
+
+    def removed(self, path: str):
+        """File at `path` is removed"""
+        store = self.store_of(path)
+        if not store or not store['track_files']:
+            return
+        size = store['files'].pop(os.path.realpath(path), None)
+        if size is not None:
+            store['inodes'] -= 1
+            store['bytes'] -= size
+
+    def changed(self, name: str, *_):
+        """Store `name` is changed in ways not told file by file, walk it soon"""
+        self.changed_stores.add(name)
+        if self.wakeup:
+            self.wakeup.set()
+
+    def walk_due(self, name: str) -> float:
+        """Time store `name` can be walked again for its changes"""
+        return (self.stores[name]['reconciled_at'] or 0) + self.CHANGE_INTERVAL
+
+    async def reconcile(self, name: str):
+        """Walk store `name` and correct its totals"""
+        store = self.stores[name]
+        self.changed_stores.discard(name)
+        used_bytes, inodes, files = await asyncio.get_event_loop().run_in_executor(
+            None, walk, store['path'], store['track_files'])
+        store['bytes'], store['inodes'] = used_bytes, inodes
+        store['files'] = files or {}
+        store['reconciled_at'] = time.time()
+
+    async def run(self):
+        """
+        Walk changed stores soon, but not more often than every
+        `CHANGE_INTERVAL` seconds, and all of them every `interval` seconds
+        """
+        self.wakeup = asyncio.Event()
+        last_walk = 0.
+        while True:
+            now = time.time()
+            if now - last_walk >= self.interval:
+                last_walk = now
+                names = list(self.stores)
+            else:
+                names = [name for name in self.changed_stores
+                         if name in self.stores and self.walk_due(name) <= now]
+
+            for name in names:
+                try:
+                    await self.reconcile(name)
+                except Exception as err: # pylint: disable=broad-except
+                    self.logger.error("cannot walk disk store %s: %s", name, err)
+
+            # stores changed too soon after their last walk wait for their turn
+            wake_at = min([last_walk + self.interval] +
+                          [self.walk_due(name) for name in self.changed_stores
+                           if name in self.stores])
+            try:
+                await asyncio.wait_for(self.wakeup.wait(),
+                                       timeout=max(wake_at - time.time(), 0))
+                await asyncio.sleep(self.CHANGE_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def start(self):
+        """Start correcting totals in background"""
+        if not self.task:
+            self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        """Stop correcting totals"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def usage(self, name: str) -> dict:
+        """Usage of store `name`"""
+        store = self.stores[name]
+        return {
+            'path': store['path'],
+            'bytes': store['bytes'],
+            'inodes': store['inodes'],
+            'reconciled_at': store['reconciled_at']
+        }
+
+    def to_dict(self) -> dict:
+        """Usage of all stores"""
+        return {name: self.usage(name) for name in self.stores}
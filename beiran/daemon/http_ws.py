@@ -19,15 +19,22 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 """HTTP and WS API implementation of beiran daemon"""
+import json
+
 from tornado import websocket, web
 from tornado.options import define
 from tornado.web import HTTPError
 
 from beiran.config import config
-from beiran.models import Node, PeerAddress
-from beiran.cmd_req_handler import RPCEndpoint, rpc
+from beiran.models import Node, PeerAddress, Job
+from beiran.cmd_req_handler import JSONEndpoint, RPCEndpoint, rpc
 
 from beiran.daemon.common import Services
+from beiran.daemon.common import UPLOADS
+from beiran.daemon.common import BANDWIDTH
+from beiran.daemon.common import DISK
+from beiran.daemon.common import JOBS
+from beiran.daemon.scoring import SCORES
 from beiran.daemon.lib import get_listen_address
 
 
@@ -45,32 +52,65 @@ define('unix_socket',
        help='Path to unix socket to bind')
 
 
-class EchoWebSocket(websocket.WebSocketHandler):
-    """ Websocket implementation for test
+class PeerChannel(websocket.WebSocketHandler):
+    """
+    Persistent channel for beirand-beirand communication.
+
+    Peers keep this websocket open to get state changes pushed as soon as they
+    happen, instead of polling `/status`. Messages are JSON objects with a
+    ``type`` key;
+
+     - ``hello``: sent by us once the channel is opened
+     - ``state``: sent by us on every plugin state update
+     - ``ping``/``pong``: liveness and round trip time measurement
     """
+    CHANNELS = set() # type: set
 
     def data_received(self, chunk):
-        """
-        Web socket data received in chunk
-        Args:
-            chunk: Current received data
-        """
         pass
 
+    def check_origin(self, origin: str) -> bool:
+        """Peers are not browsers, accept connections from anywhere"""
+        return True
+
     def open(self, *args, **kwargs):
-        """ Monitor if websocket is opened
-        """
-        Services.get_logger().info("WebSocket opened")
+        """Register the channel and greet the peer with our current state"""
+        Services.get_logger().debug("peer channel opened from %s", self.request.remote_ip)
+        PeerChannel.CHANNELS.add(self)
+        self.send({
+            "type": "hello",
+            "uuid": Services.daemon.nodes.local_node.uuid.hex,
+            "sync_state_version": Services.daemon.sync_state_version
+        })
 
     def on_message(self, message: str):
-        """ Received message from websocket
-        """
-        self.write_message(u"You said: " + message)
+        """Handle messages coming from the peer"""
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            Services.get_logger().warning("invalid message on peer channel: %s", message)
+            return
+
+        if msg.get('type') == 'ping':
+            self.send({"type": "pong", "ts": msg.get('ts')})
 
     def on_close(self):
-        """ Monitor if websocket is closed
-        """
-        Services.get_logger().info("WebSocket closed")
+        """Unregister the channel"""
+        Services.get_logger().debug("peer channel closed from %s", self.request.remote_ip)
+        PeerChannel.CHANNELS.discard(self)
+
+    def send(self, msg: dict):
+        """Send a message to peer, ignore if the channel is already closed"""
+        try:
+            self.write_message(json.dumps(msg))
+        except websocket.WebSocketClosedError:
+            PeerChannel.CHANNELS.discard(self)
+
+    @classmethod
+    def broadcast(cls, msg: dict):
+        """Send a message to all connected peers"""
+        for channel in list(cls.CHANNELS):
+            channel.send(msg)
 
 
 class ApiRootHandler(web.RequestHandler):
@@ -80,6 +120,7 @@ class ApiRootHandler(web.RequestHandler):
         pass
 
     def get(self, *args, **kwargs):
+        """Version of daemon"""
         self.set_header("Content-Type", "application/json")
         self.write('{"version":"' + Services.daemon.nodes.local_node.version + '"}')
         self.finish()
@@ -208,10 +249,15 @@ class StatusHandler(web.RequestHandler):
 
     # pylint: disable=arguments-differ
     def get(self):
+        """Status of daemon and its sync state"""
         status_response = {
             "status": "ok",
             "sync_state_version": Services.daemon.sync_state_version,
-            "plugins": {}
+            "plugins": {},
+            "uploads": UPLOADS.to_dict(),
+            "bandwidth": {key: shaper.to_dict() for key, shaper in BANDWIDTH.items()},
+            "peer_scores": SCORES.to_dict(),
+            "disk": DISK.to_dict()
         }
         for name, plugin in Services.plugins.items():
             status_response['plugins'][name] = {
@@ -229,6 +275,112 @@ class StatusHandler(web.RequestHandler):
     # pylint: enable=arguments-differ
 
 
+class BandwidthHandler(JSONEndpoint):
+    """Show or change bandwidth limits of uploads and downloads at runtime"""
+
+    LIMITS = ('rate', 'peer_rate', 'background_rate')
+
+    # pylint: disable=arguments-differ
+    def get(self):
+        """Bandwidth limits and usage of uploads and downloads"""
+        self.response = {key: shaper.to_dict() for key, shaper in BANDWIDTH.items()}
+        self.write_json()
+        self.finish()
+
+    def post(self):
+        """
+        Change limits, e.g. ``{"download": {"rate": 1048576}}``. Limits are
+        in bytes per second, ``0`` means unlimited, the ones not given are kept.
+        """
+        changes = {}
+        for direction, limits in self.json_data.items():
+            if direction not in BANDWIDTH or not isinstance(limits, dict):
+                raise HTTPError(status_code=400,
+                                log_message="unknown direction `{}`".format(direction))
+            try:
+                changes[direction] = {key: float(limits[key])
+                                      for key in self.LIMITS if key in limits}
+            except (TypeError, ValueError):
+                raise HTTPError(status_code=400, log_message="limits must be numbers")
+            if any(value < 0 for value in changes[direction].values()):
+                raise HTTPError(status_code=400, log_message="limits can not be negative")
+
+        for direction, limits in changes.items():
+            BANDWIDTH[direction].configure(**limits)
+
+        self.get()
+    # pylint: enable=arguments-differ
+
+
+class TasksHandler(JSONEndpoint):
+    """List jobs of daemon"""
+
+    # pylint: disable=arguments-differ
+    def get(self):
+        """Return latest jobs, filtered by `status` and `kind` arguments if given"""
+        query = Job.select().order_by(Job.created_at.desc()).limit(100)
+        for field in ('status', 'kind'):
+            value = self.get_argument(field, None)
+            if value:
+                query = query.where(getattr(Job, field) == value)
+        self.response = {"tasks": [JOBS.to_dict(JOBS.running.get(job.id, job))
+                                   for job in query]}
+        self.write_json()
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+class TaskHandler(JSONEndpoint):
+    """Show or cancel a job"""
+
+    # pylint: disable=arguments-differ
+    def get(self, job_id: str):
+        """Job with its status and progress"""
+        try:
+            self.response = JOBS.to_dict(JOBS.get(job_id))
+        except Job.DoesNotExist:
+            raise HTTPError(status_code=404, log_message="Task Not Found")
+        self.write_json()
+        self.finish()
+
+    def delete(self, job_id: str):
+        """Cancel a queued or running job"""
+        try:
+            self.response = JOBS.to_dict(JOBS.cancel(job_id))
+        except Job.DoesNotExist:
+            raise HTTPError(status_code=404, log_message="Task Not Found")
+        self.write_json()
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+class TaskStatusHandler(web.RequestHandler):
+    """Stream status and progress changes of a job until it finishes"""
+
+    def data_received(self, chunk):
+        pass
+
+    # pylint: disable=arguments-differ
+    async def get(self, job_id: str):
+        """Stream status and progress changes of job as a JSON document"""
+        try:
+            JOBS.get(job_id)
+        except Job.DoesNotExist:
+            raise HTTPError(status_code=404, log_message="Task Not Found")
+
+        self.set_header("Content-Type", "application/json")
+        # Sorry for hand-typed json, this is for streaming.
+        self.write('{"task": "%s", "updates": [' % job_id)
+        separator = ''
+        async for event in JOBS.follow(job_id):
+            self.write(separator + json.dumps(event))
+            self.flush()
+            separator = ','
+        self.write(']}')
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
 class PluginStatusHandler(web.RequestHandler):
     """Status endpoint for plugins"""
 
@@ -237,6 +389,7 @@ class PluginStatusHandler(web.RequestHandler):
 
     # pylint: disable=arguments-differ
     def get(self, plugin_id: str):
+        """Status of plugin"""
         if not plugin_id in Services.plugins:
             raise HTTPError(status_code=404, log_message="Plugin Not Found")
 
@@ -262,6 +415,10 @@ ROUTES = [
     (r'/status/plugins/([0-9a-z]+(?::[0-9a-z]+))', PluginStatusHandler),
     (r'/nodes', NodesHandler),
     (r'/ping', Ping),
+    (r'/bandwidth', BandwidthHandler),
+    (r'/tasks', TasksHandler),
+    (r'/tasks/([0-9a-f]+)', TaskHandler),
+    (r'/tasks/([0-9a-f]+)/status', TaskStatusHandler),
     # (r'/layers', LayersHandler),
-    (r'/ws', EchoWebSocket),
+    (r'/ws', PeerChannel),
 ]
@@ -0,0 +1,242 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Queue of daemon jobs
+
+Jobs, like image pulls, are kept in database, so unfinished ones resume after
+daemon restarts. Identical requests share the same job. Queued jobs start by
+their priority, limiting the number of jobs running at the same time in total
+and for each registry.
+"""
+
+import asyncio
+import logging
+import time
+
+from typing import Any, Awaitable, Callable, Dict, List
+
+from beiran.models import Job
+from beiran.ratelimit import PRIORITIES, PRIORITY_INTERACTIVE
+
+
+# called as `report(key, update)` to tell progress of a part of job, like a layer
+ReportFunc = Callable[[str, dict], None]
+RunnerFunc = Callable[[Job, ReportFunc], Awaitable[Any]]
+
+
+def priority_rank(priority: str) -> int:
+    """Lower is more urgent"""
+    return PRIORITIES.index(priority) if priority in PRIORITIES else len(PRIORITIES)
+
+
+class JobManager:
+    """Persistent job queue with deduplication and priorities"""
+
+    def __init__(self, max_jobs: int = 0, max_registry_jobs: int = 0,
+                 logger: logging.Logger = None) -> None:
+        """
+        Args:
+            max_jobs (int): jobs running at the same time, 0 means unlimited
+            max_registry_jobs (int): jobs of the same registry running at the same
+                time, 0 means unlimited
+        """
+        self.max_jobs = max_jobs
+        self.max_registry_jobs = max_registry_jobs
+        self.logger = logger if logger else logging.getLogger('beiran.jobs')
+        self.runners = {} # type: Dict[str, RunnerFunc]
+        self.running = {} # type: Dict[str, Job]
+        self.tasks = {} # type: Dict[str, asyncio.Future]
+        self.progress = {} # type: Dict[str, Dict[str, dict]]
+        self.followers = {} # type: Dict[str, List[asyncio.Queue]]
+        self.started = False
+        self.stopping = False
+
+    def configure(self, max_jobs: int = None, max_registry_jobs: int = None):
+        """Change concurrency limits, keeping the ones not given"""
+        if max_jobs is not None:
+            self.max_jobs = max_jobs
+        if max_registry_jobs is not None:
+            self.max_registry_jobs = max_registry_jobs
+        self.schedule()
+
+    def register(self, kind: str, runner: RunnerFunc):
+        """Register coroutine function running jobs of `kind`"""
+        self.runners[kind] = runner
+        self.schedule()
+
+    def submit(self, kind: str, key: str, params: dict = None, # pylint: disable=too-many-arguments
+               priority: str = PRIORITY_INTERACTIVE, registry: str = None) -> Job:
+        """
+        Queue a job, or return the unfinished job of the same `kind` and `key`.
+        A more urgent request raises priority of the queued job.
+        """
+        job = Job.select().where(Job.kind == kind, Job.key == key,
+                                 Job.status.in_(Job.ACTIVE)).first()
+        if job:
+            if priority_rank(priority) < priority_rank(job.priority):
+                job.priority = priority
+                job.save()
+                self.publish(job)
+            return job
+
+        job = Job.create(kind=kind, key=key, params=params or {}, priority=priority,
+                         registry=registry)
+        self.logger.debug("job %s is queued: %s %s", job.id, kind, key)
+        self.publish(job)
+        self.schedule()
+        return job
+
+    def schedule(self):
+        """Start queued jobs as limits allow, most urgent and oldest first"""
+        if not self.started or self.stopping:
+            return
+
+        queued = Job.select().where(Job.status == Job.STATUS_QUEUED)
+        for job in sorted(queued, key=lambda job: (priority_rank(job.priority), job.created_at)):
+            if self.max_jobs and len(self.running) >= self.max_jobs:
+                break
+            if job.kind not in self.runners:
+                continue
+            if self.max_registry_jobs and job.registry and \
+                    sum(1 for running in self.running.values()
+                        if running.registry == job.registry) >= self.max_registry_jobs:
+                continue
+            self.running[job.id] = job
+            self.tasks[job.id] = asyncio.ensure_future(self.run(job))
+
+    async def run(self, job: Job):
+        """Run job and record how it ends"""
+        job.status = Job.STATUS_RUNNING
+        job.started_at = time.time()
+        job.save()
+        self.publish(job)
+
+        try:
+            await self.runners[job.kind](job, lambda key, update: self.report(job, key, update))
+            job.status = Job.STATUS_DONE
+        except asyncio.CancelledError:
+            if self.stopping:
+                # left running in database, to resume after restart
+                return
+            job.status = Job.STATUS_CANCELLED
+        except Exception as err: # pylint: disable=broad-except
+            self.logger.error("job %s failed: %s", job.id, err)
+            job.status = Job.STATUS_FAILED
+            job.error = str(err)
+        finally:
+            self.running.pop(job.id, None)
+            self.tasks.pop(job.id, None)
+
+        job.finished_at = time.time()
+        job.save()
+        self.publish(job)
+        self.progress.pop(job.id, None)
+        self.schedule()
+
+    def report(self, job: Job, key: str, update: dict):
+        """Record and publish progress of a part of running job"""
+        self.progress.setdefault(job.id, {})[key] = update
+        for queue in self.followers.get(job.id, []):
+            queue.put_nowait({'type': 'progress', 'key': key, 'update': update})
+
+    def publish(self, job: Job):
+        """Tell followers of job about its status"""
+        for queue in self.followers.get(job.id, []):
+            queue.put_nowait({'type': 'status', 'task': self.to_dict(job)})
+
+    def get(self, job_id: str) -> Job:
+        """
+        Raises:
+            Job.DoesNotExist: if there is no such job
+        """
+        if job_id in self.running:
+            return self.running[job_id]
+        return Job.get(Job.id == job_id)
+
+    async def follow(self, job_id: str):
+        """
+        Async generator of status and progress changes of job, starting with
+        the current ones, until job finishes
+
+        Raises:
+            Job.DoesNotExist: if there is no such job
+        """
+        job = self.get(job_id)
+        queue = asyncio.Queue() # type: asyncio.Queue
+        self.followers.setdefault(job_id, []).append(queue)
+        try:
+            yield {'type': 'status', 'task': self.to_dict(job)}
+            for key, update in list(self.progress.get(job_id, {}).items()):
+                yield {'type': 'progress', 'key': key, 'update': update}
+            if job.finished:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event['type'] == 'status' and event['task']['status'] not in Job.ACTIVE:
+                    return
+        finally:
+            self.followers[job_id].remove(queue)
+            if not self.followers[job_id]:
+                del self.followers[job_id]
+
+    async def wait(self, job_id: str) -> Job:
+        """Wait for job to finish"""
+        async for _ in self.follow(job_id):
+            pass
+        return self.get(job_id)
+
+    def cancel(self, job_id: str) -> Job:
+        """
+        Cancel a queued or running job
+
+        Raises:
+            Job.DoesNotExist: if there is no such job
+        """
+        job = self.get(job_id)
+        if job_id in self.tasks:
+            self.tasks[job_id].cancel()
+        elif job.status == Job.STATUS_QUEUED:
+            job.status = Job.STATUS_CANCELLED
+            job.finished_at = time.time()
+            job.save()
+            self.publish(job)
+        return job
+
+    def to_dict(self, job: Job) -> dict:
+        """Job with its progress"""
+        _dict = job.to_dict()
+        _dict['progress'] = dict(self.progress.get(job.id, {}))
+        return _dict
+
+    def start(self):
+        """Resume jobs left unfinished by previous run of daemon, and start queued ones"""
+        resumed = Job.update(status=Job.STATUS_QUEUED) \
+                     .where(Job.status == Job.STATUS_RUNNING).execute()
+        if resumed:
+            self.logger.info("resuming %d unfinished jobs", resumed)
+        self.started = True
+        self.schedule()
+
+    def stop(self):
+        """Stop running jobs, leaving them to resume after restart"""
+        self.stopping = True
+        for task in list(self.tasks.values()):
+            task.cancel()
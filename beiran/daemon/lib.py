@@ -241,5 +241,7 @@ def collect_node_info() -> dict:
         "os_version": platform.version(),
         "architecture": platform.machine(),
         "version": get_version(),
-        "last_sync_version": get_sync_version()
+        "last_sync_version": get_sync_version(),
+        "zone": config.zone,
+        "rack": config.rack
     }
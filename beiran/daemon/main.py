@@ -42,22 +42,27 @@ from pyee import EventEmitter
 
 from beiran.daemon.common import VERSION
 from beiran.daemon.common import EVENTS
+from beiran.daemon.common import UPLOADS
+from beiran.daemon.common import BANDWIDTH
+from beiran.daemon.common import JOBS, DISK
 from beiran.daemon.common import Services
 
 from beiran.daemon.nodes import Nodes
-from beiran.daemon.peer import Peer
+from beiran.daemon.peer import Peer, PEER_REGISTRY
+from beiran.daemon.scoring import SCORES
 
 from beiran.daemon.lib import collect_node_info
 from beiran.daemon.lib import get_advertise_address
 from beiran.daemon.lib import update_sync_version_file
 
 from beiran.daemon.http_ws import ROUTES
+from beiran.daemon.http_ws import PeerChannel
 from beiran.daemon.version import __version__
 
 from beiran.config import config
 from beiran.models import Node, PeerAddress
 from beiran.log import build_logger
-from beiran.util import run_in_loop, wait_event
+from beiran.util import wait_event
 
 AsyncIOMainLoop().install()
 
@@ -119,10 +124,11 @@ class BeiranDaemon(EventEmitter):
 
         """Placeholder for event on node removed"""
         Services.get_logger().info("new event: an existing node removed %s", node.uuid)
+        SCORES.forget(node.uuid.hex)
 
     async def on_new_node_added(self, node: Node):
-        """Placeholder for event on node removed"""
-        pass
+        """Placeholder for event on node added, plugins subscribe to it for their work"""
+        Services.get_logger().info("new event: a new node added %s", node.uuid)
 
     async def on_plugin_state_update(self, plugin: Any, update: dict):
         """
@@ -143,6 +149,22 @@ class BeiranDaemon(EventEmitter):
         Services.get_logger().info("sync version up: %d", self.nodes.local_node.last_sync_version)
         EVENTS.emit('state.update', update, plugin)
 
+    async def on_state_update(self, update: dict, plugin: Any):
+        """Push state update to the peers connected to our channel"""
+        PeerChannel.broadcast({
+            "type": "state",
+            "sync_state_version": self.sync_state_version,
+            "plugin": "%s:%s" % (plugin.plugin_type, plugin.plugin_name),
+            "update": update
+        })
+
+    async def on_peer_catalog(self, uuid: str, version: int):
+        """Sync with peer whose sync state version is gossiped by discovery"""
+        for peer in PEER_REGISTRY.values():
+            if peer.uuid == uuid:
+                peer.schedule_sync({"sync_state_version": version})
+                return
+
     # pylint: disable=redefined-outer-name
     async def get_plugin(self, plugin_type: str, plugin_name: str, config: dict) -> Any:
         """
@@ -180,21 +202,22 @@ class BeiranDaemon(EventEmitter):
         """Return plugin instance"""
         return Services.plugins[plugin_name]
 
-    def check_wait_plugin_status_ready(self, plugin_name, loop=None, timeout=None):
-        """Check or wait uniil plugin status to be 'ready'"""
+    async def check_wait_plugin_status_ready(self, plugin_name, timeout=None):
+        """
+        Check or wait until plugin status to be 'ready'
+
+        Raises:
+            asyncio.TimeoutError: if plugin is not ready in `timeout` seconds
+        """
         plugin_instance = self.get_plugin_instance(plugin_name)
 
         if plugin_instance.status == 'ready':
             return
 
-        run_in_loop(self.wait_plugin_status_ready(plugin_instance, timeout=timeout),
-                    loop=loop, sync=True)
+        await asyncio.wait_for(self.wait_plugin_status_ready(plugin_instance), timeout)
 
     async def wait_plugin_status_ready(self, plugin_instance, timeout=None):
         """Wait until plugin status to be 'ready'"""
-
-        # FIXME! timeout parameter should apply to the whole execution of
-        # this method. not just *each* execution of wait_event
         while True:
             await wait_event(plugin_instance, 'status', timeout=timeout)
             if plugin_instance.status == 'ready':
@@ -348,6 +371,8 @@ class BeiranDaemon(EventEmitter):
         # collect node info and create node object
         self.nodes.local_node = Node.from_dict(collect_node_info())
         self.nodes.add_or_update(self.nodes.local_node)
+        SCORES.set_location(self.nodes.local_node.zone, self.nodes.local_node.rack,
+                            self.nodes.local_node.uuid.hex)
         self.set_status(Node.STATUS_INIT)
         Services.get_logger().info("local node added, known nodes are: %s", self.nodes.all_nodes)
 
@@ -361,6 +386,14 @@ class BeiranDaemon(EventEmitter):
         # initialize sync_state_version
         self.sync_state_version = self.nodes.local_node.last_sync_version
 
+        UPLOADS.configure(max_uploads=config.max_uploads, max_queue=config.upload_queue)
+        BANDWIDTH['upload'].configure(rate=config.upload_rate, peer_rate=config.peer_rate,
+                                      background_rate=config.background_rate)
+        BANDWIDTH['download'].configure(rate=config.download_rate, peer_rate=config.peer_rate,
+                                        background_rate=config.background_rate)
+        JOBS.configure(max_jobs=config.max_jobs, max_registry_jobs=config.max_registry_jobs)
+        DISK.configure(interval=config.disk_interval)
+
         # initialize plugins
         await self.init_plugins()
 
@@ -394,6 +427,7 @@ class BeiranDaemon(EventEmitter):
         # Register daemon events
         EVENTS.on('node.added', self.on_new_node_added)
         EVENTS.on('node.removed', self.on_node_removed)
+        EVENTS.on('state.update', self.on_state_update)
 
         # Ready
         self.set_status(Node.STATUS_READY)
@@ -402,6 +436,7 @@ class BeiranDaemon(EventEmitter):
         if 'discovery' in Services.plugins:
             Services.plugins['discovery'].on('discovered', self.new_node)
             Services.plugins['discovery'].on('undiscovered', self.removed_node)
+            Services.plugins['discovery'].on('catalog', self.on_peer_catalog)
 
             await Services.plugins['discovery'].start()
 
@@ -412,6 +447,12 @@ class BeiranDaemon(EventEmitter):
             Services.get_logger().info("starting plugin: %s", name)
             await plugin.start()
 
+        # plugins registered their job runners, resume unfinished jobs
+        JOBS.start()
+
+        # plugins added their stores, start correcting disk usage
+        DISK.start()
+
         # Bootstrapping peer without discovery
         await self.probe_without_discovery()
 
@@ -439,6 +480,8 @@ class BeiranDaemon(EventEmitter):
         """Graceful shutdown"""
         self.clean_database()
         self.set_status(Node.STATUS_CLOSING)
+        JOBS.stop()
+        DISK.stop()
 
         if 'discovery' in Services.plugins:
             Services.get_logger().info("stopping discovery")
@@ -28,6 +28,7 @@ import urllib
 from typing import Optional
 
 from beiran.models import Node
+from beiran.daemon.scoring import SCORES
 
 class Nodes:
     """Nodes is in memory data model, composed of members of Beiran Cluster"""
@@ -91,6 +92,8 @@ class Nodes:
         """Append node to online nodes collection
         """
         self.all_nodes.update({node.uuid.hex: node})
+        if self.local_node and node.uuid != self.local_node.uuid:
+            SCORES.locate(node.uuid.hex, node.zone, node.rack)
 
     def set_offline(self, node: Node):
         """Remove node from online nodes collection
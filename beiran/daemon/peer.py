@@ -26,21 +26,39 @@
 """
 
 import asyncio
+import json
 import logging
 import time
+from typing import Optional
+import aiohttp
 from aiohttp import ClientConnectorError
 from pyee import EventEmitter
 
 from beiran.client import Client
+from beiran.config import config
 from beiran.models import Node
 from beiran.daemon.common import Services
+from beiran.daemon.scoring import SCORES
 
 PEER_REGISTRY: dict = dict()
 
 
-class Peer(EventEmitter):
+class Peer(EventEmitter):  # pylint: disable=too-many-instance-attributes
     """Peer class"""
 
+    # peer channel liveness, in seconds
+    PING_INTERVAL = 10
+    PING_TIMEOUT = 5
+
+    # peer channel reconnection backoff, in seconds
+    RECONNECT_MIN = 1
+    RECONNECT_MAX = 30
+    RECONNECT_MAX_FAILS = 5
+
+    class ChannelNotSupported(Exception):
+        """Remote node does not speak peer channel protocol"""
+        pass
+
     @classmethod
     def find_or_create(cls, *args, node: Node = None, **kwargs):
         """Find node in peer registty or create new Peer"""
@@ -73,7 +91,10 @@ class Peer(EventEmitter):
         self.nodes = nodes
         self.local = local
         self.ping = -1
+        self.last_pong = 0.
         self.last_sync_state_version = 0  # self.node.last_sync_version
+        self._pending_status = None # type: Optional[dict]
+        self._sync_task = None # type: Optional[asyncio.Task]
         self.__probe_lock = asyncio.Lock()
         self.peer_address = node.get_latest_connection()
         if not self.local:
@@ -116,30 +137,85 @@ class Peer(EventEmitter):
                          self.node.port)
         self.emit('sync')
 
-    # TODO: reconnect
-    # async def reconnect(self):
-    #     # ..
-    #     # node.status = 'reconnecting'
-    #     pass
-
-    async def peerloop(self):
-        """lifecycle of a beiran-node connection"""
-
-        while not self.node:
-            self.node = await self.probe_node(self.peer_address)
-
-        if not self.node:
+    def schedule_sync(self, remote_status: dict):
+        """
+        Sync with peer in background. Multiple calls while a sync is in
+        progress are coalesced into one more sync with the latest status.
+        """
+        self._pending_status = remote_status
+        if self._sync_task and not self._sync_task.done():
             return
+        self._sync_task = self.loop.create_task(self._sync_pending())
 
-        self.logger.info("getting new nodes' images and layers from %s at port %s\n\n ",
-                         self.node.ip_address, self.node.port)
-        self.node.status = Node.STATUS_SYNCING
-        self.node.save()
+    async def _sync_pending(self):
+        """Sync until there is no pending remote status"""
+        while self._pending_status:
+            remote_status, self._pending_status = self._pending_status, None
+            try:
+                await self.sync(remote_status)
+            except Exception as err:  # pylint: disable=broad-except
+                self.logger.error("syncing with node(%s) failed: %s", self.uuid, str(err))
+
+    async def on_channel_message(self, msg: dict):
+        """Handle a message received from peer channel"""
+        msg_type = msg.get('type')
+
+        if msg_type == 'pong':
+            self.last_pong = time.time()
+            self.ping = round((self.last_pong - msg['ts']) * 1000)
+            SCORES.observe_rtt(self.uuid, self.ping)
+            self.emit('ping', self.ping)
+
+        elif msg_type in ('hello', 'state'):
+            if msg_type == 'state':
+                self.emit('state', msg.get('plugin'), msg.get('update'))
+            if msg.get('sync_state_version') != self.last_sync_state_version:
+                self.logger.info("Node(%s) out-of-sync, syncing", self.uuid)
+                self.schedule_sync(msg)
+
+    async def ping_channel(self, channel):
+        """Ping peer over the channel periodically, close it if peer stops responding"""
+        self.last_pong = time.time()
+        while not channel.closed:
+            try:
+                await channel.send_str(json.dumps({"type": "ping", "ts": time.time()}))
+            except ConnectionError:
+                return
+            await asyncio.sleep(self.PING_INTERVAL)
+            if time.time() - self.last_pong > self.PING_INTERVAL + self.PING_TIMEOUT:
+                self.logger.debug("node(%s) did not respond ping in time", self.uuid)
+                self.ping = -1
+                await channel.close()
 
-        await self.sync()
+    async def channel_loop(self):
+        """
+        Receive pushed messages from peer until the channel is closed.
 
-        # In future this part will be replaced with a websocket or gRPC connection
-        # Check node availability every x second, drop online status if it fails
+        Raises:
+            Client.Error: if channel cannot be opened
+            Peer.ChannelNotSupported: if remote does not speak the channel protocol
+        """
+        channel = await self.client.open_channel()
+        self.logger.debug("channel opened to node(%s)", self.uuid)
+        ping_task = self.loop.create_task(self.ping_channel(channel))
+        try:
+            async for msg in channel:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    break
+                try:
+                    data = json.loads(msg.data)
+                except ValueError:
+                    raise Peer.ChannelNotSupported(msg.data)
+                await self.on_channel_message(data)
+        finally:
+            ping_task.cancel()
+            await channel.close()
+
+    async def poll_loop(self):
+        """
+        Legacy way of following peer state, for nodes which do not support
+        peer channel. Check node availability every x second, return if it fails.
+        """
         check_interval = 30
         retry_interval = 5
         timeout = 4
@@ -148,24 +224,65 @@ class Peer(EventEmitter):
             await asyncio.sleep(check_interval)
             try:
                 timestamp = time.time()
-                new_status = None
                 new_status = await self.client.get_status(timeout=timeout)
-                # self.status
-                ping_duration = round((time.time()-timestamp)*1000)
-                self.ping = ping_duration
+                self.ping = round((time.time()-timestamp)*1000)
+                SCORES.observe_rtt(self.uuid, self.ping)
                 # Check if we're out of sync. resync everything if we're
                 if new_status['sync_state_version'] != self.last_sync_state_version:
-                    self.logger.info("Node(%s) out-of-sync, syncing", self.node.uuid.hex)
+                    self.logger.info("Node(%s) out-of-sync, syncing", self.uuid)
                     await self.sync(new_status)
                 fails = 0
                 check_interval = 15
             except Exception as err:  # pylint: disable=unused-variable,broad-except
-                self.node.ping = -1
+                self.ping = -1
                 self.logger.debug("pinging node failed, because %s", str(err))
                 check_interval = retry_interval
                 fails += 1
                 if fails >= 2:
-                    break
+                    return
+
+    async def peerloop(self):
+        """lifecycle of a beiran-node connection"""
+
+        while not self.node:
+            self.node = await self.probe_node(self.peer_address)
+
+        if not self.node:
+            return
+
+        self.logger.info("getting new nodes' images and layers from %s at port %s\n\n ",
+                         self.node.ip_address, self.node.port)
+        self.node.status = Node.STATUS_SYNCING
+        self.node.save()
+
+        await self.sync()
+
+        if config.sync_mode == 'gossip':
+            # state changes of peer will be gossiped by discovery plugin
+            return
+
+        # Keep a channel open to the peer, so its state changes are pushed to us.
+        # Reconnect with backoff if it drops, and give up after a few failures.
+        backoff = self.RECONNECT_MIN
+        fails = 0
+        while fails < self.RECONNECT_MAX_FAILS:
+            try:
+                await self.channel_loop()
+                fails = 0
+                backoff = self.RECONNECT_MIN
+            except Peer.ChannelNotSupported:
+                self.logger.info("node(%s) does not support peer channel, polling instead",
+                                 self.uuid)
+                await self.poll_loop()
+                break
+            except (Client.Error, aiohttp.ClientError) as err:
+                fails += 1
+                self.ping = -1
+                self.logger.debug("channel to node(%s) failed (%d/%d), because %s",
+                                  self.uuid, fails, self.RECONNECT_MAX_FAILS, str(err))
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.RECONNECT_MAX)
 
         self.logger.info("lost connection to node %s(%s:%d)",
                          self.node.uuid.hex, self.node.ip_address, self.node.port)
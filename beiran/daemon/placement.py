@@ -0,0 +1,42 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Placement of objects on nodes
+
+Objects are assigned to nodes by rendezvous (highest random weight)
+hashing; every node computes the same assignment from the same set of
+nodes without any coordination, and only the objects of a node which
+joins or leaves move.
+"""
+
+import hashlib
+
+from typing import Iterable, List
+
+
+def weight(key: str, uuid: str) -> int:
+    """Random but stable weight of node `uuid` for object `key`"""
+    digest = hashlib.sha256('{}:{}'.format(key, uuid).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def rendezvous(key: str, uuids: Iterable[str]) -> List[str]:
+    """Order nodes by their weight for object `key`, assigned nodes first"""
+    return sorted(set(uuids), key=lambda uuid: (weight(key, uuid), uuid), reverse=True)
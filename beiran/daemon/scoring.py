@@ -0,0 +1,211 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Scoring of peers as download sources
+
+Every peer gets an estimated cost (in seconds) for transferring an object
+of given size from it, combining its smoothed round trip time, recently
+observed throughput, advertised concurrent uploads and recent failures.
+
+When zones are configured, peers are ranked by their distance to local node
+first (same rack, same zone, others), and by cost within the same distance,
+to keep transfers away from expensive cross zone links.
+
+Throughput of a peer also decides the format layers are transferred in;
+compressed layers over slow links, raw tarballs where decompressing would
+cost more than the bytes it saves.
+"""
+
+import logging
+import time
+
+from typing import Dict, List, Optional
+
+
+class PeerScore:
+    """Observations about a peer as a download source"""
+
+    # weight of new observations in exponentially weighted moving averages
+    ALPHA = 0.3
+
+    # assumed until we transfer something from the peer, bytes per second
+    DEFAULT_THROUGHPUT = 10 * 1024 * 1024
+    DEFAULT_RTT = 100
+
+    # failures are forgotten with this half-life, in seconds
+    FAILURE_HALF_LIFE = 120
+
+    def __init__(self, uuid: str) -> None:
+        self.uuid = uuid
+        self.rtt = None # type: Optional[float]
+        self.throughput = None # type: Optional[float]
+        self.load = 0
+        self.transfers = 0
+        self.zone = None # type: Optional[str]
+        self.rack = None # type: Optional[str]
+        self.local_uuid = None # type: Optional[str]
+        self._failures = 0.
+        self._failed_at = 0.
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        if current is None:
+            return value
+        return (1 - self.ALPHA) * current + self.ALPHA * value
+
+    def observe_rtt(self, rtt: float):
+        """Round trip time to peer in ms"""
+        if rtt >= 0:
+            self.rtt = self._ewma(self.rtt, rtt)
+
+    def observe_load(self, load: int):
+        """Concurrent uploads advertised by peer"""
+        self.load = max(int(load), 0)
+
+    def observe_transfer(self, size: int, seconds: float):
+        """A transfer of `size` bytes from peer finished in `seconds`"""
+        if size <= 0 or seconds <= 0:
+            return
+        self.transfers += 1
+        self.throughput = self._ewma(self.throughput, size / seconds)
+
+    def observe_failure(self):
+        """A transfer or request to peer failed"""
+        self._failures = self.failures + 1
+        self._failed_at = time.time()
+
+    @property
+    def failures(self) -> float:
+        """Decayed count of recent failures"""
+        if not self._failures:
+            return 0.
+        elapsed = time.time() - self._failed_at
+        return self._failures * 0.5 ** (elapsed / self.FAILURE_HALF_LIFE)
+
+    def cost(self, size: int = None) -> float:
+        """Estimated seconds to transfer `size` bytes from peer"""
+        rtt = self.rtt if self.rtt is not None else self.DEFAULT_RTT
+        throughput = self.throughput or self.DEFAULT_THROUGHPUT
+        cost = rtt / 1000. + (size or 0) / throughput
+        # the bandwidth of peer is shared among its uploads
+        cost *= 1 + self.load
+        # every recent failure doubles the cost
+        return cost * 2 ** self.failures
+
+    def to_dict(self) -> dict:
+        """Serialize score for status and logs"""
+        return {
+            "rtt": round(self.rtt) if self.rtt is not None else None,
+            "throughput": round(self.throughput) if self.throughput else None,
+            "load": self.load,
+            "failures": round(self.failures, 2),
+            "transfers": self.transfers,
+            "zone": self.zone,
+            "rack": self.rack,
+            "cost": round(self.cost(), 4)
+        }
+
+
+class PeerScoring:
+    """Scores of all peers"""
+
+    SAME_RACK = 0
+    SAME_ZONE = 1
+    OTHER_ZONE = 2
+
+    # links faster than this, bytes per second, carry raw tarballs
+    FAST_LINK = 64 * 1024 * 1024
+
+    def __init__(self) -> None:
+        self.scores = {} # type: Dict[str, PeerScore]
+        self.zone = None # type: Optional[str]
+        self.rack = None # type: Optional[str]
+        self.local_uuid = None # type: Optional[str]
+        self.logger = logging.getLogger('beiran.scoring')
+
+    def get(self, uuid: str) -> PeerScore:
+        """Score of peer, created if it does not exist"""
+        if uuid not in self.scores:
+            self.scores[uuid] = PeerScore(uuid)
+        return self.scores[uuid]
+
+    def observe_rtt(self, uuid: str, rtt: float):
+        """Record round trip time to peer in ms"""
+        self.get(uuid).observe_rtt(rtt)
+
+    def observe_load(self, uuid: str, load: int):
+        """Record concurrent uploads advertised by peer"""
+        self.get(uuid).observe_load(load)
+
+    def observe_transfer(self, uuid: str, size: int, seconds: float):
+        """Record a finished transfer from peer"""
+        self.get(uuid).observe_transfer(size, seconds)
+
+    def observe_failure(self, uuid: str):
+        """Record a failure of peer"""
+        self.get(uuid).observe_failure()
+
+    def set_location(self, zone: Optional[str], rack: Optional[str], uuid: str = None):
+        """Set zone and rack of local node, which has `uuid`"""
+        self.zone, self.rack = zone or None, rack or None
+        self.local_uuid = uuid
+
+    def locate(self, uuid: str, zone: Optional[str], rack: Optional[str]):
+        """Record zone and rack of peer"""
+        score = self.get(uuid)
+        score.zone, score.rack = zone or None, rack or None
+
+    def distance(self, uuid: str) -> int:
+        """Distance of peer to local node, all peers are near if zones are not used"""
+        if not self.zone or uuid == self.local_uuid:
+            return self.SAME_RACK
+        score = self.get(uuid)
+        if score.zone != self.zone:
+            return self.OTHER_ZONE
+        if self.rack and score.rack == self.rack:
+            return self.SAME_RACK
+        return self.SAME_ZONE
+
+    def forget(self, uuid: str):
+        """Drop score of a node which left"""
+        self.scores.pop(uuid, None)
+
+    def rank(self, uuids: List[str], size: int = None) -> List[str]:
+        """Sort peers, nearest and cheapest source of an object of `size` bytes first"""
+        ranked = sorted(uuids, key=lambda uuid: (self.distance(uuid), self.get(uuid).cost(size)))
+        if len(ranked) > 1:
+            self.logger.debug("ranked sources for %s bytes: %s", size,
+                              ', '.join('%s(%d, %.3fs)' % (uuid, self.distance(uuid),
+                                                           self.get(uuid).cost(size))
+                                        for uuid in ranked))
+        return ranked
+
+    def layer_format(self, uuid: str) -> str:
+        """Format to download layers from peer in, 'gz' over slow links, 'tar' over fast ones"""
+        score = self.get(uuid)
+        throughput = score.throughput or score.DEFAULT_THROUGHPUT
+        return 'tar' if throughput >= self.FAST_LINK else 'gz'
+
+    def to_dict(self) -> dict:
+        """Scores of all peers"""
+        return {uuid: score.to_dict() for uuid, score in self.scores.items()}
+
+
+SCORES = PeerScoring()
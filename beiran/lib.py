@@ -66,7 +66,7 @@ async def async_req(url: str, return_json: bool = True, # pylint: disable=too-ma
 async def async_write_file_stream(url: str, save_path: str, queue=None, # pylint: disable=too-many-arguments,too-many-locals
                                   timeout: int = 3, retry: int = 1,
                                   retry_interval: int = 2, method: str = "GET",
-                                  **kwargs) -> aiohttp.client_reqrep.ClientResponse:
+                                  transfer=None, **kwargs) -> aiohttp.client_reqrep.ClientResponse:
     """
     Async write a stream to a file
     Args:
@@ -75,6 +75,7 @@ async def async_write_file_stream(url: str, save_path: str, queue=None, # pylint
         mode (str): file mode
         timeout (int): timeout
         method (str): HTTP method
+        transfer (beiran.ratelimit.Transfer): shapes bandwidth of download
 
     Returns:
         aiohttp.client_reqrep.ClientResponse: request response
@@ -92,8 +93,12 @@ async def async_write_file_stream(url: str, save_path: str, queue=None, # pylint
 
                         with open(save_path, 'wb')as file:
                             async for chunk in input_reader(resp.content):
+                                if transfer:
+                                    await transfer.throttle(len(chunk))
                                 file.write(chunk)
                                 if queue:
+                                    # followers of queue may read the file
+                                    file.flush()
                                     queue.put_nowait(chunk)
                         if queue:
                             queue.put_nowait(None)
@@ -0,0 +1,167 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Bucketed hash tree for comparing catalogs of nodes
+
+Catalog entries are spread into leaf buckets by the hash of their keys.
+Two nodes compare their root hashes and descend only into the subtrees
+whose hashes differ, so finding out the differences costs
+O(differences * log n) data instead of exchanging whole catalogs.
+"""
+
+import asyncio
+import hashlib
+import json
+
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple
+
+HEX_DIGITS = '0123456789abcdef'
+
+
+def entry_hash(*values: Any) -> str:
+    """Hash of a catalog entry built from its identifying values"""
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class MerkleTree:
+    """
+    Hash tree with a fanout of 16. Nodes are identified by hex prefixes;
+    root is ``''``, leaf buckets are prefixes of ``depth`` digits.
+
+    Hashes of nodes are cached and only the path from an updated bucket
+    to the root is invalidated on changes.
+    """
+
+    def __init__(self, depth: int = 2) -> None:
+        self.depth = depth
+        self.buckets = {} # type: Dict[str, Dict[str, str]]
+        self._hashes = {} # type: Dict[str, str]
+
+    def __len__(self) -> int:
+        return sum(len(bucket) for bucket in self.buckets.values())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.buckets.get(self.bucket_of(key), {})
+
+    def bucket_of(self, key: str) -> str:
+        """Prefix of the leaf bucket `key` belongs to"""
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:self.depth]
+
+    def _invalidate(self, bucket: str):
+        for i in range(len(bucket) + 1):
+            self._hashes.pop(bucket[:i], None)
+
+    def set(self, key: str, value_hash: str):
+        """Add or update an entry"""
+        bucket = self.bucket_of(key)
+        entries = self.buckets.setdefault(bucket, {})
+        if entries.get(key) == value_hash:
+            return
+        entries[key] = value_hash
+        self._invalidate(bucket)
+
+    def discard(self, key: str):
+        """Remove an entry if exists"""
+        bucket = self.bucket_of(key)
+        entries = self.buckets.get(bucket, {})
+        if key not in entries:
+            return
+        del entries[key]
+        self._invalidate(bucket)
+
+    def reset(self, entries: Iterable[Tuple[str, str]] = ()):
+        """Replace all entries with `entries`"""
+        self.buckets = {}
+        self._hashes = {}
+        for key, value_hash in entries:
+            self.buckets.setdefault(self.bucket_of(key), {})[key] = value_hash
+
+    def is_leaf(self, prefix: str) -> bool:
+        """Is prefix a leaf bucket"""
+        return len(prefix) == self.depth
+
+    def hash(self, prefix: str = '') -> str:
+        """Hash of the node at `prefix`"""
+        if prefix in self._hashes:
+            return self._hashes[prefix]
+
+        digest = hashlib.sha256()
+        if self.is_leaf(prefix):
+            for key, value_hash in sorted(self.buckets.get(prefix, {}).items()):
+                digest.update('{}:{}\n'.format(key, value_hash).encode('utf-8'))
+        else:
+            for digit in HEX_DIGITS:
+                digest.update(self.hash(prefix + digit).encode('utf-8'))
+
+        self._hashes[prefix] = digest.hexdigest()
+        return self._hashes[prefix]
+
+    def node(self, prefix: str = '') -> dict:
+        """
+        Serializable view of the node at `prefix`; hashes of children for
+        inner nodes, entries for leaf buckets.
+        """
+        if len(prefix) > self.depth or any(c not in HEX_DIGITS for c in prefix):
+            raise KeyError(prefix)
+
+        node = {"prefix": prefix, "hash": self.hash(prefix)} # type: Dict[str, Any]
+        if self.is_leaf(prefix):
+            node['entries'] = dict(self.buckets.get(prefix, {}))
+        else:
+            node['children'] = {prefix + digit: self.hash(prefix + digit)
+                                for digit in HEX_DIGITS}
+        return node
+
+    async def diff(self, fetch: Callable[[str], Awaitable[dict]]) -> Tuple[Dict[str, str],
+                                                                          List[str]]:
+        """
+        Compare this tree with a remote one, descending only into differing nodes.
+
+        Args:
+            fetch: coroutine function returning ``node(prefix)`` of remote tree
+
+        Returns:
+            (dict, list): entries which are missing or different in this tree,
+            and keys which do not exist in remote tree
+        """
+        changed = {} # type: Dict[str, str]
+        removed = [] # type: List[str]
+
+        level = [await fetch('')]
+        while level:
+            prefixes = []
+            for remote in level:
+                if remote['hash'] == self.hash(remote['prefix']):
+                    continue
+
+                if 'entries' in remote:
+                    local = self.buckets.get(remote['prefix'], {})
+                    changed.update({key: value_hash
+                                    for key, value_hash in remote['entries'].items()
+                                    if local.get(key) != value_hash})
+                    removed.extend(key for key in local if key not in remote['entries'])
+                else:
+                    prefixes.extend(prefix for prefix, child_hash in remote['children'].items()
+                                    if child_hash != self.hash(prefix))
+
+            level = await asyncio.gather(*[fetch(prefix) for prefix in prefixes])
+
+        return changed, removed
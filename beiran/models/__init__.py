@@ -26,10 +26,11 @@ from peewee import SqliteDatabase
 from beiran.log import build_logger
 from .base import BaseModel
 from .node import Node, PeerAddress
+from .job import Job
 
 LOGGER = build_logger()
 
-MODEL_LIST = [Node, PeerAddress]
+MODEL_LIST = [Node, PeerAddress, Job]
 
 
 def create_tables(database: SqliteDatabase, model_list: list = None) -> None:
@@ -0,0 +1,57 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Module for Job Data Model
+"""
+import time
+import uuid
+
+from peewee import CharField, FloatField, TextField
+from beiran.models.base import BaseModel, JSONStringField
+
+
+class Job(BaseModel):
+    """Data model for queued and running jobs of daemon, kept to resume after restart"""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+
+    ACTIVE = (STATUS_QUEUED, STATUS_RUNNING)
+
+    id = CharField(max_length=32, primary_key=True, # pylint: disable=invalid-name
+                   default=lambda: uuid.uuid4().hex)
+    kind = CharField(max_length=64)
+    key = CharField(max_length=255)  # identical requests have the same key
+    params = JSONStringField(default=dict)
+    priority = CharField(max_length=32)
+    registry = CharField(max_length=255, null=True)
+    status = CharField(max_length=32, default=STATUS_QUEUED)
+    error = TextField(null=True)
+    created_at = FloatField(default=time.time)
+    started_at = FloatField(null=True)
+    finished_at = FloatField(null=True)
+
+    @property
+    def finished(self) -> bool:
+        """Is job done, failed or cancelled"""
+        return self.status not in self.ACTIVE
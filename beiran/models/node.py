@@ -289,6 +289,8 @@ class Node(BaseModel):
     version = CharField(max_length=10)  # beiran daemon version of node
     status: Union[CharField, str] = CharField(max_length=32, default=STATUS_NEW)
     last_sync_version = IntegerField()
+    zone = CharField(max_length=64, null=True)
+    rack = CharField(max_length=64, null=True)
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         self._address = None
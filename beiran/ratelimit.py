@@ -0,0 +1,289 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Rate and concurrency limiting primitives
+"""
+
+import asyncio
+import collections
+import time
+
+from typing import Deque, Dict
+
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BACKGROUND = 'background'
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)
+
+
+class TokenBucket:
+    """
+    Token bucket limiting throughput to `rate` units per second with bursts
+    up to `burst` units. Consumers going over the limit sleep until their
+    debt is paid, so concurrent consumers are served in order.
+    """
+
+    def __init__(self, rate: float = 0, burst: float = None) -> None:
+        """
+
+        Args:
+            rate (float): units per second, 0 means unlimited
+            burst (float): bucket capacity, one second of `rate` by default
+        """
+        self.rate = 0.
+        self.burst = 0.
+        self.tokens = 0.
+        self.updated_at = time.monotonic()
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate: float, burst: float = None):
+        """Change rate of bucket, a bucket which was unlimited starts full"""
+        self._refill()
+        unlimited = not self.rate
+        self.rate = float(rate or 0)
+        self.burst = float(burst or self.rate)
+        self.tokens = self.burst if unlimited else min(self.tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, amount: float) -> float:
+        """Take `amount` tokens, return seconds to wait before using them"""
+        if not self.rate:
+            return 0.
+        self._refill()
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.
+
+    async def consume(self, amount: float):
+        """Take `amount` tokens, waiting as long as needed"""
+        wait = self.delay(amount)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class Transfer:
+    """
+    A transfer shaped by a `BandwidthShaper`, counted as active while
+    used as a context manager
+    """
+
+    def __init__(self, shaper: "BandwidthShaper", peer: str = None,
+                 priority: str = PRIORITY_INTERACTIVE) -> None:
+        self.shaper = shaper
+        self.peer = peer
+        self.priority = priority if priority in PRIORITIES else PRIORITY_INTERACTIVE
+
+    def __enter__(self) -> "Transfer":
+        self.shaper.started(self)
+        return self
+
+    def __exit__(self, *args):
+        self.shaper.finished(self)
+
+    async def throttle(self, amount: int):
+        """Wait until `amount` bytes can be transferred within limits"""
+        await self.shaper.throttle(amount, self.peer, self.priority)
+
+
+class BandwidthShaper:
+    """
+    Shapes bandwidth of transfers in one direction. All transfers share
+    `rate`, transfers with each peer share `peer_rate`, and background
+    transfers are limited to `background_rate` while any interactive
+    transfer is active, so they get out of the way of interactive ones.
+    Rates are bytes per second, 0 means unlimited.
+    """
+
+    def __init__(self, rate: float = 0, peer_rate: float = 0,
+                 background_rate: float = 0) -> None:
+        self.bucket = TokenBucket()
+        self.background = TokenBucket()
+        self.peer_rate = 0.
+        self.peers = {} # type: Dict[str, TokenBucket]
+        self.peer_transfers = {} # type: Dict[str, int]
+        self.active = {priority: 0 for priority in PRIORITIES}
+        self.configure(rate, peer_rate, background_rate)
+
+    def configure(self, rate: float = None, peer_rate: float = None,
+                  background_rate: float = None):
+        """Change limits, the ones not given are kept"""
+        if rate is not None:
+            self.bucket.set_rate(rate)
+        if background_rate is not None:
+            self.background.set_rate(background_rate)
+        if peer_rate is not None:
+            self.peer_rate = float(peer_rate)
+            for bucket in self.peers.values():
+                bucket.set_rate(self.peer_rate)
+
+    def transfer(self, peer: str = None, priority: str = PRIORITY_INTERACTIVE) -> Transfer:
+        """
+        Create a transfer to be shaped
+
+        Usage::
+
+            with shaper.transfer(peer, priority) as transfer:
+                for chunk in chunks:
+                    await transfer.throttle(len(chunk))
+                    send chunk
+        """
+        return Transfer(self, peer, priority)
+
+    def started(self, transfer: Transfer):
+        """Count an active transfer"""
+        self.active[transfer.priority] += 1
+        if transfer.peer:
+            if transfer.peer not in self.peers:
+                self.peers[transfer.peer] = TokenBucket(self.peer_rate)
+                self.peer_transfers[transfer.peer] = 0
+            self.peer_transfers[transfer.peer] += 1
+
+    def finished(self, transfer: Transfer):
+        """Forget a finished transfer"""
+        self.active[transfer.priority] -= 1
+        if transfer.peer and transfer.peer in self.peer_transfers:
+            self.peer_transfers[transfer.peer] -= 1
+            if not self.peer_transfers[transfer.peer]:
+                del self.peer_transfers[transfer.peer]
+                del self.peers[transfer.peer]
+
+    def duration(self, size: int, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """Seconds a transfer of `size` bytes with a single peer may take at most"""
+        rates = [self.bucket.rate, self.peer_rate]
+        if priority == PRIORITY_BACKGROUND:
+            rates.append(self.background.rate)
+        rates = [rate for rate in rates if rate]
+        return size / min(rates) if rates else 0.
+
+    async def throttle(self, amount: int, peer: str = None,
+                       priority: str = PRIORITY_INTERACTIVE):
+        """Wait until `amount` bytes can be transferred within limits"""
+        delays = [self.bucket.delay(amount)]
+        if peer in self.peers:
+            delays.append(self.peers[peer].delay(amount))
+        if priority == PRIORITY_BACKGROUND and self.active[PRIORITY_INTERACTIVE]:
+            delays.append(self.background.delay(amount))
+        wait = max(delays)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def to_dict(self) -> dict:
+        """Current transfers and limits"""
+        return {
+            "rate": self.bucket.rate,
+            "peer_rate": self.peer_rate,
+            "background_rate": self.background.rate,
+            "active": dict(self.active)
+        }
+
+
+class UploadAdmission:
+    """
+    Admission control for serving uploads. At most `max_uploads` uploads
+    are served at once, `max_queue` more wait up to `queue_timeout`
+    seconds for a slot, others are rejected.
+    """
+
+    def __init__(self, max_uploads: int = 0, max_queue: int = 0,
+                 queue_timeout: float = 10.) -> None:
+        self.max_uploads = 0
+        self.max_queue = 0
+        self.queue_timeout = 0.
+        self.active = 0
+        self.rejected = 0
+        self._waiters = collections.deque() # type: Deque[asyncio.Future]
+        self.configure(max_uploads, max_queue, queue_timeout)
+
+    def configure(self, max_uploads: int = 0, max_queue: int = 0,
+                  queue_timeout: float = 10.):
+        """Change limits; 0 means unlimited for `max_uploads`"""
+        self.max_uploads = int(max_uploads or 0)
+        self.max_queue = int(max_queue or 0)
+        self.queue_timeout = float(queue_timeout)
+
+    @property
+    def waiting(self) -> int:
+        """Number of uploads waiting for a slot"""
+        return len(self._waiters)
+
+    @property
+    def load(self) -> int:
+        """Uploads served or waiting"""
+        return self.active + self.waiting
+
+    @property
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying"""
+        if not self.max_uploads:
+            return 1
+        return max(1, int(self.queue_timeout * (1 + self.waiting) / self.max_uploads))
+
+    async def acquire(self) -> bool:
+        """Wait for an upload slot, return False if rejected"""
+        if not self.max_uploads or (self.active < self.max_uploads and not self._waiters):
+            self.active += 1
+            return True
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            # slot may have been handed over just before the timeout
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self.rejected += 1
+                return False
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        return True
+
+    def release(self):
+        """Release upload slot, handing it over to the next waiting upload"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def to_dict(self) -> dict:
+        """Current load and limits"""
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_uploads": self.max_uploads,
+            "max_queue": self.max_queue
+        }
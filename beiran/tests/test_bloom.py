@@ -0,0 +1,74 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from beiran.bloom import BloomFilter
+from beiran_interface_docker.availability import HolderQuery, LayerAvailability
+
+
+def test_membership():
+    keys = ['sha256:%064x' % i for i in range(2000)]
+    bloom = BloomFilter.from_keys(keys, error_rate=0.01)
+    assert all(key in bloom for key in keys)
+
+    others = ['sha256:%064x' % i for i in range(2000, 12000)]
+    false_positives = sum(1 for key in others if key in bloom)
+    assert false_positives < len(others) * 0.02
+
+def test_serialization():
+    bloom = BloomFilter.from_keys(['a', 'b', 'c'])
+    copy = BloomFilter.from_dict(bloom.to_dict())
+    assert copy.size == bloom.size
+    assert copy.hash_count == bloom.hash_count
+    assert 'a' in copy and 'b' in copy and 'c' in copy
+
+def test_empty_filter():
+    bloom = BloomFilter.from_keys([])
+    assert 'a' not in bloom
+
+def test_filter_version_survives_restart():
+    def availability(digests):
+        # a freshly started daemon with given local layers
+        layers = LayerAvailability(local_node=None)
+        layers.local_digests = lambda: digests
+        return layers
+
+    before = availability(['sha256:a', 'sha256:b'])
+    version = before.advertisement()['version']
+    assert before.advertisement(since=version) == {"version": version}
+
+    # same layers after a restart, nothing to fetch again
+    assert availability(['sha256:b', 'sha256:a']).advertisement(since=version) == \
+        {"version": version}
+
+    # a restart with other layers never answers an old version as unchanged
+    assert 'filter' in availability(['sha256:a']).advertisement(since=version)
+
+def test_holder_cache_drops_old_results():
+    holders = HolderQuery(local_node=None)
+    holders.keep(('layer', 'sha256:a'), [], now=0)
+    holders.keep(('layer', 'sha256:b'), [], now=5)
+    # results of `a` are expired by now
+    holders.keep(('layer', 'sha256:c'), [], now=12)
+    assert list(holders.cache) == [('layer', 'sha256:b'), ('layer', 'sha256:c')]
+
+    holders.CACHE_SIZE = 2
+    holders.keep(('image', 'x'), [], now=13)
+    assert list(holders.cache) == [('layer', 'sha256:c'), ('image', 'x')]
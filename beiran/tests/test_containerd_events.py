@@ -0,0 +1,52 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import pytest
+
+pytest.importorskip('grpc')
+
+# pylint: disable=wrong-import-position
+from beiran_package_container.grpc.events_pb2 import Envelope
+from beiran_package_container.grpc.image_events_pb2 import ImageCreate
+from beiran_package_container.grpc.content_events_pb2 import ContentDelete
+from beiran_interface_containerd.services.events import event_subject
+
+
+def envelope(topic, type_url, event):
+    """Envelope as containerd sends it, type urls have no prefix"""
+    env = Envelope(namespace='k8s.io', topic=topic)
+    env.event.type_url = type_url
+    env.event.value = event.SerializeToString()
+    return env
+
+
+def test_event_subject():
+    assert event_subject(envelope('/images/create', 'containerd.services.images.v1.ImageCreate',
+                                  ImageCreate(name='docker.io/library/nginx:latest'))) == \
+           'docker.io/library/nginx:latest'
+    assert event_subject(envelope('/content/delete', 'containerd.events.ContentDelete',
+                                  ContentDelete(digest='sha256:aa'))) == 'sha256:aa'
+
+
+def test_event_subject_of_other_events():
+    assert event_subject(envelope('/tasks/start', 'containerd.events.TaskStart',
+                                  ImageCreate(name='x'))) is None
+    # topic and type of event do not match
+    assert event_subject(envelope('/images/create', 'containerd.events.ContentDelete',
+                                  ContentDelete(digest='sha256:aa'))) is None
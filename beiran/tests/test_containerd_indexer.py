@@ -0,0 +1,130 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import hashlib
+import json
+from types import SimpleNamespace
+
+import pytest
+from peewee import SqliteDatabase
+
+pytest.importorskip('grpc')
+
+# pylint: disable=wrong-import-position
+from beiran.models.base import DB_PROXY
+from beiran_package_container.models import ContainerImage, ContainerLayer
+from beiran_interface_containerd.indexer import ContainerdIndexer
+
+
+INDEX_TYPE = 'application/vnd.oci.image.index.v1+json'
+
+
+class FakeContent:
+    def __init__(self):
+        self.blobs = {}
+
+    def put(self, obj):
+        blob = json.dumps(obj).encode()
+        digest = 'sha256:' + hashlib.sha256(blob).hexdigest()
+        self.blobs[digest] = blob
+        return digest
+
+    async def read(self, digest):
+        return self.blobs[digest]
+
+
+class FakeImages:
+    def __init__(self, images):
+        self.images = images
+
+    async def list_images(self, filters=None): # pylint: disable=unused-argument
+        return SimpleNamespace(images=[
+            SimpleNamespace(name=name, target=SimpleNamespace(media_type=media_type,
+                                                              digest=digest))
+            for name, media_type, digest in self.images
+        ])
+
+
+@pytest.fixture
+def database():
+    database = SqliteDatabase(':memory:')
+    DB_PROXY.initialize(database)
+    database.create_tables([ContainerImage, ContainerLayer])
+    yield database
+    database.close()
+
+
+def test_index_saves_images_and_layers(database): # pylint: disable=unused-argument,redefined-outer-name
+    content = FakeContent()
+    config = content.put({'created': '2019-01-01T00:00:00.123456789Z',
+                          'rootfs': {'diff_ids': ['sha256:d1', 'sha256:d2']}})
+    manifest = content.put({'config': {'digest': config},
+                            'layers': [{'digest': 'sha256:l1', 'size': 10},
+                                       {'digest': 'sha256:l2', 'size': 20}]})
+    index = content.put({'manifests': [
+        {'digest': 'sha256:other', 'platform': {'architecture': 'arm', 'os': 'linux'}},
+        {'digest': manifest, 'platform': {'architecture': 'amd64', 'os': 'linux'}}
+    ]})
+    images = FakeImages([
+        ('docker.io/library/nginx:latest', INDEX_TYPE, index),
+        (config, INDEX_TYPE, index),
+        ('docker.io/library/broken:1', INDEX_TYPE, 'sha256:missing'),
+    ])
+    ContainerLayer.create(digest='sha256:l1', diff_id='sha256:d1', chain_id='sha256:d1',
+                          size=10, available_at=['other'], local_image_refs=['sha256:other'])
+
+    indexer = ContainerdIndexer(images, content, 'local')
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(indexer.index()) == [config]
+    # indexing again changes nothing
+    loop.run_until_complete(indexer.index())
+
+    image = ContainerImage.get()
+    assert image.hash_id == config
+    assert image.tags == ['docker.io/library/nginx:latest']
+    assert image.repo_digests == ['docker.io/library/nginx@' + manifest]
+    assert image.layers == ['sha256:d1', 'sha256:d2']
+    assert image.available_at == ['local']
+    assert image.size == 30
+
+    shared, own = ContainerLayer.select().order_by(ContainerLayer.id)
+    assert shared.available_at == ['local', 'other']
+    assert shared.local_image_refs == sorted([config, 'sha256:other'])
+    assert own.chain_id not in ('', 'sha256:d2')
+    assert ContainerLayer.select().count() == 2
+
+
+def test_remove_forgets_names(database): # pylint: disable=unused-argument,redefined-outer-name
+    ContainerLayer.create(digest='sha256:l1', diff_id='sha256:d1', chain_id='sha256:d1',
+                          size=10, available_at=['local'], local_image_refs=['sha256:a'])
+    ContainerImage.create(hash_id='sha256:a', created_at=0, layers=['sha256:d1'],
+                          tags=['docker.io/library/nginx:latest', 'docker.io/library/nginx:1'],
+                          repo_digests=['docker.io/library/nginx@sha256:m'],
+                          available_at=['local', 'other'])
+    indexer = ContainerdIndexer(None, None, 'local')
+
+    assert indexer.remove(['docker.io/library/nginx:1']) == []
+    assert ContainerImage.get().tags == ['docker.io/library/nginx:latest']
+
+    assert indexer.remove(['docker.io/library/nginx:latest']) == ['sha256:a']
+    image = ContainerImage.get()
+    assert image.available_at == ['other']
+    assert image.repo_digests == []
+    assert ContainerLayer.get().available_at == []
@@ -0,0 +1,150 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import hashlib
+import json
+
+import pytest
+
+grpc = pytest.importorskip('grpc')
+
+# pylint: disable=wrong-import-position
+from beiran_interface_containerd.ingest import ContentIngester, MEDIA_LAYER, \
+    MEDIA_LAYER_GZIP, GC_LABEL_CONFIG, GC_LABEL_LAYER, GC_LABEL_MANIFEST
+
+
+class FakeError(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class FakeContent:
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.labels = {}
+
+    async def info(self, digest):
+        if digest not in self.blobs:
+            raise FakeError(grpc.StatusCode.NOT_FOUND)
+
+    async def write(self, ref, digest, size, chunks, labels=None): # pylint: disable=too-many-arguments
+        data = b''
+        async for chunk in chunks:
+            data += chunk
+        assert ref and len(data) == size
+        assert 'sha256:' + hashlib.sha256(data).hexdigest() == digest
+        self.blobs[digest] = data
+        self.labels[digest] = labels
+
+
+class FakeImages:
+    def __init__(self):
+        self.images = {}
+        self.updated = []
+
+    async def create_image(self, image):
+        if image.name in self.images:
+            raise FakeError(grpc.StatusCode.ALREADY_EXISTS)
+        self.images[image.name] = image.target.digest
+
+    async def update_image(self, image):
+        self.images[image.name] = image.target.digest
+        self.updated.append(image.name)
+
+
+def digest_of(data):
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+def test_ingest_image(tmpdir):
+    layers = []
+    for content in (b'present layer', b'new layer'):
+        path = tmpdir.join(digest_of(content)[7:] + '.tar')
+        path.write_binary(content)
+        layers.append((MEDIA_LAYER, digest_of(content), str(path)))
+    content = FakeContent({layers[0][1]: b'present layer'})
+    images = FakeImages()
+    ingester = ContentIngester(content, images)
+    ingester.CHUNK_SIZE = 4
+    config = json.dumps({'rootfs': {'diff_ids': [layer[1] for layer in layers]}})
+
+    loop = asyncio.get_event_loop()
+    manifest_digest = loop.run_until_complete(
+        ingester.ingest_image('docker.io/library/app:1', config, layers))
+
+    manifest = json.loads(content.blobs[manifest_digest].decode())
+    assert [layer['digest'] for layer in manifest['layers']] == [layers[0][1], layers[1][1]]
+    assert manifest['config']['digest'] == digest_of(config.encode())
+    assert content.labels[layers[1][1]] is None
+    # present layer is not written again
+    assert layers[0][1] not in content.labels
+    assert content.labels[manifest_digest] == {
+        GC_LABEL_CONFIG: digest_of(config.encode()),
+        GC_LABEL_LAYER % 0: layers[0][1],
+        GC_LABEL_LAYER % 1: layers[1][1],
+    }
+    assert images.images == {'docker.io/library/app:1': manifest_digest}
+
+    # pulling again points the existing image to the manifest
+    loop.run_until_complete(ingester.ingest_image('docker.io/library/app:1', config, layers))
+    assert images.updated == ['docker.io/library/app:1']
+
+
+def test_ingest_keeps_pulled_manifest(tmpdir):
+    path = tmpdir.join('layer.tar.gz')
+    path.write_binary(b'compressed layer')
+    layers = [(MEDIA_LAYER_GZIP, digest_of(b'compressed layer'), str(path))]
+    config = json.dumps({'rootfs': {'diff_ids': ['sha256:d1']}})
+    # registry formats manifests its own way
+    manifest = json.dumps({
+        'schemaVersion': 2,
+        'mediaType': 'application/vnd.oci.image.manifest.v1+json',
+        'config': {'digest': digest_of(config.encode())},
+        'layers': [{'digest': layers[0][1]}]
+    }, indent=3).encode()
+    index = json.dumps({'manifests': [{'digest': 'sha256:other'},
+                                      {'digest': digest_of(manifest)}]}).encode()
+    content = FakeContent({})
+    images = FakeImages()
+    ingester = ContentIngester(content, images)
+
+    loop = asyncio.get_event_loop()
+    target = loop.run_until_complete(ingester.ingest_image(
+        'docker.io/library/app:1', config, layers,
+        (manifest, 'application/vnd.oci.image.manifest.v1+json'),
+        (index, 'application/vnd.oci.image.index.v1+json')))
+    assert target == digest_of(index)
+    assert content.blobs[digest_of(manifest)] == manifest
+    assert content.labels[target] == {GC_LABEL_MANIFEST % 1: digest_of(manifest)}
+
+    # manifest can not be kept if layers in cache are not the ones in registry
+    tar_path = tmpdir.join('layer.tar')
+    tar_path.write_binary(b'layer')
+    target = loop.run_until_complete(ingester.ingest_image(
+        'docker.io/library/app:1', config, [(MEDIA_LAYER, digest_of(b'layer'), str(tar_path))],
+        (manifest, 'application/vnd.oci.image.manifest.v1+json'),
+        (index, 'application/vnd.oci.image.index.v1+json')))
+    assert target not in (digest_of(manifest), digest_of(index))
+    assert json.loads(content.blobs[target].decode())['layers'][0]['digest'] == \
+        digest_of(b'layer')
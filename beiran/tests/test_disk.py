@@ -0,0 +1,86 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import os
+
+from beiran.daemon.disk import DiskUsage
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def write(path, size):
+    with open(path, 'wb') as file:
+        file.write(os.urandom(size))
+
+
+def test_files_are_accounted_incrementally(tmpdir):
+    disk = DiskUsage()
+    disk.add_store('cache', str(tmpdir), track_files=True)
+    layer = str(tmpdir.join('layer.tar'))
+
+    write(layer, 8192)
+    disk.added(layer)
+    disk.added(layer)
+    size = disk.usage('cache')['bytes']
+    assert size >= 8192
+    assert disk.usage('cache')['inodes'] == 1
+
+    disk.removed(layer)
+    os.remove(layer)
+    assert disk.usage('cache')['bytes'] == 0
+    assert disk.usage('cache')['inodes'] == 0
+
+    # files out of tracked stores are ignored
+    disk.added('/etc/hostname')
+    assert disk.usage('cache')['bytes'] == 0
+
+
+def test_reconcile_corrects_totals(tmpdir):
+    disk = DiskUsage()
+    disk.add_store('cache', str(tmpdir), track_files=True)
+    disk.add_store('docker', str(tmpdir.mkdir('docker')))
+    write(str(tmpdir.join('docker', 'image')), 4096)
+    write(str(tmpdir.join('untold')), 4096)
+    assert disk.changed_stores == {'cache', 'docker'}
+
+    run(disk.reconcile('docker'))
+    run(disk.reconcile('cache'))
+    assert disk.changed_stores == set()
+    assert disk.usage('docker')['bytes'] >= 4096
+    assert disk.usage('docker')['inodes'] == 1
+    # nested store is walked in cache too, with its directory
+    assert disk.usage('cache')['inodes'] == 3
+
+    disk.removed(str(tmpdir.join('untold')))
+    assert disk.usage('cache')['inodes'] == 2
+    assert set(disk.to_dict()) == {'cache', 'docker'}
+
+
+def test_changed_store_is_not_walked_too_often(tmpdir):
+    disk = DiskUsage()
+    disk.add_store('docker', str(tmpdir))
+    assert disk.walk_due('docker') == disk.CHANGE_INTERVAL
+
+    run(disk.reconcile('docker'))
+    disk.changed('docker')
+    reconciled_at = disk.usage('docker')['reconciled_at']
+    assert disk.walk_due('docker') == reconciled_at + disk.CHANGE_INTERVAL
@@ -0,0 +1,85 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from beiran_discovery_gossip.membership import Member, Membership, ALIVE, SUSPECT, DEAD
+
+
+def new_member(name, inc=1, catalog=0):
+    return Member(uuid=name, host='10.0.0.1', port=8888, gossip_port=8888,
+                  incarnation=inc, catalog=catalog)
+
+def new_membership():
+    membership = Membership(new_member('local'), suspicion_timeout=5.0)
+    events = []
+    for event in ('join', 'leave', 'catalog'):
+        membership.on(event, lambda member, event=event: events.append((event, member.uuid)))
+    return membership, events
+
+def test_join_and_catalog():
+    membership, events = new_membership()
+    membership.apply(Membership.message(ALIVE, new_member('a')))
+    membership.apply(Membership.message(ALIVE, new_member('a')))
+    assert events == [('join', 'a')]
+
+    membership.apply(Membership.message('catalog', new_member('a', catalog=3)))
+    membership.apply(Membership.message('catalog', new_member('a', catalog=2)))
+    assert events[-1] == ('catalog', 'a')
+    assert membership.members['a'].catalog == 3
+    assert len(events) == 2
+
+    # member restarted, its sync state version started over
+    membership.apply(Membership.message('catalog', new_member('a', inc=2, catalog=1)))
+    assert membership.members['a'].catalog == 1
+
+def test_suspect_expires_to_dead():
+    membership, events = new_membership()
+    membership.apply(Membership.message(ALIVE, new_member('a')))
+    membership.suspect('a')
+    assert membership.members['a'].status == SUSPECT
+
+    membership.expire_suspects(now=membership.members['a'].suspected_at + 1)
+    assert membership.members['a'].status == SUSPECT
+
+    membership.expire_suspects(now=membership.members['a'].suspected_at + 5)
+    assert membership.members['a'].status == DEAD
+    assert events[-1] == ('leave', 'a')
+
+def test_alive_refutes_suspicion():
+    membership, _ = new_membership()
+    membership.apply(Membership.message(ALIVE, new_member('a')))
+    membership.apply(Membership.message(SUSPECT, new_member('a')))
+    assert membership.members['a'].status == SUSPECT
+
+    membership.apply(Membership.message(ALIVE, new_member('a', inc=2)))
+    assert membership.members['a'].status == ALIVE
+
+def test_local_refutes_suspicion():
+    membership, _ = new_membership()
+    membership.apply(Membership.message(SUSPECT, new_member('local', inc=1)))
+    assert membership.local.incarnation == 2
+    assert membership.updates['local']['msg']['type'] == ALIVE
+
+def test_piggyback_retransmit_limit():
+    membership, _ = new_membership()
+    limit = membership.retransmit_limit
+    for _ in range(limit):
+        assert membership.piggyback(8)
+    assert membership.piggyback(8) == []
@@ -0,0 +1,114 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+
+import pytest
+from peewee import SqliteDatabase
+
+from beiran.models import Job
+from beiran.models.base import DB_PROXY
+from beiran.daemon.jobs import JobManager
+from beiran.ratelimit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+
+@pytest.fixture
+def jobs():
+    database = SqliteDatabase(':memory:')
+    DB_PROXY.initialize(database)
+    database.create_tables([Job])
+    yield JobManager(max_jobs=2, max_registry_jobs=1)
+    database.close()
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_identical_requests_share_job(jobs):
+    first = jobs.submit('pull', 'docker.io/library/nginx:latest', priority=PRIORITY_BACKGROUND)
+    second = jobs.submit('pull', 'docker.io/library/nginx:latest',
+                         priority=PRIORITY_INTERACTIVE)
+    other = jobs.submit('pull', 'docker.io/library/redis:latest')
+
+    assert first.id == second.id
+    assert other.id != first.id
+    assert jobs.get(first.id).priority == PRIORITY_INTERACTIVE
+
+
+def test_jobs_start_by_priority_and_limits(jobs):
+    started = []
+    release = asyncio.Event()
+
+    async def runner(job, report):
+        started.append(job.key)
+        report('layer', {'progress': 50})
+        await release.wait()
+
+    jobs.submit('pull', 'a/low', priority=PRIORITY_BACKGROUND, registry='a')
+    jobs.submit('pull', 'a/high', registry='a')
+    jobs.submit('pull', 'b/high', registry='b')
+    jobs.submit('pull', 'c/high', registry='c')
+    jobs.register('pull', runner)
+    jobs.start()
+
+    async def main():
+        await asyncio.sleep(0.01)
+        # one job of registry `a`, then the next one by priority until two run
+        assert started == ['a/high', 'b/high']
+        release.set()
+        await asyncio.sleep(0.01)
+        assert sorted(started) == ['a/high', 'a/low', 'b/high', 'c/high']
+        await asyncio.sleep(0.01)
+
+    run(main())
+    assert all(job.status == Job.STATUS_DONE for job in Job.select())
+
+
+def test_failure_and_following(jobs):
+    async def runner(job, report):
+        report('layer', {'progress': 100})
+        await asyncio.sleep(0.01)
+        raise IOError("registry is down")
+
+    jobs.register('pull', runner)
+    jobs.start()
+    job = jobs.submit('pull', 'nginx')
+
+    async def follow():
+        return [event async for event in jobs.follow(job.id)]
+
+    events = run(follow())
+    assert events[-1]['task']['status'] == Job.STATUS_FAILED
+    assert events[-1]['task']['error'] == "registry is down"
+    assert {'type': 'progress', 'key': 'layer', 'update': {'progress': 100}} in events
+
+
+def test_unfinished_jobs_resume(jobs):
+    Job.create(kind='pull', key='nginx', priority=PRIORITY_INTERACTIVE,
+               status=Job.STATUS_RUNNING)
+    done = []
+
+    async def runner(job, report):
+        done.append(job.key)
+
+    jobs.register('pull', runner)
+    jobs.start()
+    run(asyncio.sleep(0.01))
+    assert done == ['nginx']
@@ -0,0 +1,89 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import asyncio
+
+from beiran.merkle import MerkleTree, entry_hash
+from beiran_package_container.models import ContainerImage
+from beiran_package_container.util import ContainerUtil
+
+
+def new_tree(keys):
+    tree = MerkleTree()
+    tree.reset((key, entry_hash(key)) for key in keys)
+    return tree
+
+def diff(local, remote):
+    fetched = []
+
+    async def fetch(prefix):
+        fetched.append(prefix)
+        return remote.node(prefix)
+
+    result = asyncio.get_event_loop().run_until_complete(local.diff(fetch))
+    return result, fetched
+
+def test_incremental_hash():
+    tree = new_tree(['image:%d' % i for i in range(100)])
+    same = new_tree(reversed(['image:%d' % i for i in range(100)]))
+    assert tree.hash() == same.hash()
+
+    root = tree.hash()
+    tree.set('image:100', entry_hash('image:100'))
+    assert tree.hash() != root
+    tree.discard('image:100')
+    assert tree.hash() == root
+    assert len(tree) == 100
+
+def test_diff_in_sync():
+    keys = ['layer:%d' % i for i in range(1000)]
+    (changed, removed), fetched = diff(new_tree(keys), new_tree(keys))
+    assert not changed and not removed
+    assert fetched == ['']
+
+def test_diff_descends_into_differences():
+    keys = ['layer:%d' % i for i in range(1000)]
+    local = new_tree(keys[:-1] + ['layer:gone'])
+    remote = new_tree(keys)
+    remote.set('layer:0', 'modified')
+
+    (changed, removed), fetched = diff(local, remote)
+    assert changed == {'layer:999': entry_hash('layer:999'), 'layer:0': 'modified'}
+    assert removed == ['layer:gone']
+
+    # root, at most 3 inner nodes and 3 leaf buckets
+    assert len(fetched) <= 7
+
+def test_retagging_changes_image_catalog():
+    image = ContainerImage(hash_id='sha256:aaa', layers=['sha256:bbb'],
+                           tags=['nginx:latest'], repo_digests=[])
+    tree = MerkleTree()
+    tree.reset([ContainerUtil.image_catalog_entry(image)])
+    root = tree.hash()
+
+    image.tags = ['nginx:1.17']
+    tree.set(*ContainerUtil.image_catalog_entry(image))
+    assert tree.hash() != root
+
+    image.tags = ['nginx:latest']
+    image.repo_digests = ['nginx@sha256:ccc']
+    tree.set(*ContainerUtil.image_catalog_entry(image))
+    assert tree.hash() != root
@@ -0,0 +1,33 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from beiran.daemon.placement import rendezvous
+
+
+def test_rendezvous_is_stable():
+    nodes = ['node{}'.format(i) for i in range(10)]
+    assignments = {key: rendezvous(key, nodes)[0] for key in map(str, range(100))}
+    assert rendezvous('1', reversed(nodes)) == rendezvous('1', nodes)
+    assert len(set(assignments.values())) > 1
+
+    # only objects of the leaving node move
+    rest = [node for node in nodes if node != 'node3']
+    for key, node in assignments.items():
+        if node != 'node3':
+            assert rendezvous(key, rest)[0] == node
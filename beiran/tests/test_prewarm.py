@@ -0,0 +1,61 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import time
+
+import pytest
+
+from beiran_interface_docker.prewarm import Prewarm, parse_selector
+
+
+def test_parse_selector():
+    assert parse_selector('zone=eu-1, rack=r1') == {'zone': 'eu-1', 'rack': 'r1'}
+    assert parse_selector(None) == {}
+    with pytest.raises(ValueError):
+        parse_selector('zone')
+
+
+def test_prewarm_bounds_concurrency_and_deadline():
+    pulling = set()
+    most = 0
+
+    async def pull(node: str, image: str):
+        nonlocal most
+        pulling.add(node)
+        most = max(most, len(pulling))
+        try:
+            if image == 'broken':
+                raise IOError("no such image")
+            await asyncio.sleep(0.2 if image == 'slow' else 0.01)
+        finally:
+            pulling.discard(node)
+
+    prewarm = Prewarm(['nginx', 'broken', 'slow', 'redis'], ['a', 'b', 'c'], pull,
+                      deadline=time.time() + 0.1, concurrency=2)
+    asyncio.get_event_loop().run_until_complete(prewarm.start())
+
+    progress = prewarm.to_dict()
+    assert progress['finished']
+    assert most <= 2
+    assert progress['nodes']['a']['nginx']['status'] == Prewarm.STATUS_DONE
+    assert progress['nodes']['a']['broken']['error'] == "no such image"
+    # third node waits for the first two, which pass the deadline pulling `slow`
+    assert progress['counts'] == {Prewarm.STATUS_DONE: 2, Prewarm.STATUS_FAILED: 2,
+                                  Prewarm.STATUS_EXPIRED: 8}
@@ -0,0 +1,95 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import os
+import uuid
+
+from beiran_interface_docker.util import DockerUtil
+
+
+class FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+        self.headers = {'Beiran-Layer-Format': 'tar'}
+
+
+class FakeNode:
+    def __init__(self):
+        self.uuid = uuid.uuid4()
+        self.url_without_uuid = 'http://{}:8888'.format(self.uuid.hex)
+
+
+class FakeContainer:
+    """Serves layer from every node but `broken` ones"""
+
+    def __init__(self, path: str, chunks: list, broken: list):
+        self.path = path
+        self.chunks = chunks
+        self.broken = broken
+        self.queues = {} # type: dict
+
+    def get_layer_tar_file(self, name: str) -> str:
+        return os.path.join(self.path, name + '.tar')
+
+    def get_layer_gz_file(self, name: str) -> str:
+        return os.path.join(self.path, name + '.tar.gz')
+
+    @staticmethod
+    def get_diffid_by_digest(digest: str) -> str:
+        return 'diff-' + digest
+
+    async def download_layer_from_node(self, digest, jobid, url, save_path, queue, peer):
+        if peer in self.broken:
+            queue.put_nowait(None)
+            return FakeResponse(500)
+        with open(save_path, 'wb') as file:
+            for chunk in self.chunks:
+                file.write(chunk)
+                queue.put_nowait(chunk)
+                await asyncio.sleep(0.01)
+        queue.put_nowait(None)
+        return FakeResponse(200)
+
+
+def test_progress_of_pull_ends_when_race_is_won(tmpdir):
+    chunks = [os.urandom(1024) for _ in range(4)]
+    nodes = [FakeNode(), FakeNode()]
+    util = DockerUtil(str(tmpdir), aiodocker=object())
+    util.container = FakeContainer(str(tmpdir), chunks, broken=[nodes[0].uuid.hex])
+    util.container.queues['job'] = {'sha256:aa': {'queue': asyncio.Queue(), 'size': 4096}}
+
+    async def follow() -> bytes:
+        """read progress of layer like pulls do, until it ends"""
+        received = b''
+        while True:
+            chunk = await util.container.queues['job']['sha256:aa']['queue'].get()
+            if not chunk:
+                return received
+            received += chunk
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(
+            util.download_layer_racing('sha256:aa', 'job', nodes), follow()), timeout=5)
+
+    downloaded, received = asyncio.get_event_loop().run_until_complete(main())
+    assert downloaded
+    assert received == b''.join(chunks)
+    with open(util.container.get_layer_tar_file('diff-sha256:aa'), 'rb') as file:
+        assert file.read() == b''.join(chunks)
@@ -0,0 +1,86 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+
+from beiran.ratelimit import TokenBucket, UploadAdmission, BandwidthShaper
+from beiran.ratelimit import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(rate=100)
+    assert bucket.delay(50) == 0
+    assert bucket.delay(150) > 0.9
+
+    assert TokenBucket().delay(10 ** 9) == 0
+
+
+def test_upload_admission():
+    loop = asyncio.get_event_loop()
+    admission = UploadAdmission(max_uploads=1, max_queue=1, queue_timeout=1)
+
+    assert loop.run_until_complete(admission.acquire())
+    waiter = asyncio.ensure_future(admission.acquire())
+    loop.run_until_complete(asyncio.sleep(0))
+    assert admission.waiting == 1
+
+    # queue is full
+    assert not loop.run_until_complete(admission.acquire())
+    assert admission.rejected == 1
+
+    # slot is handed over to the waiting upload
+    admission.release()
+    assert loop.run_until_complete(waiter)
+    assert admission.active == 1
+    assert admission.waiting == 0
+
+    admission.release()
+    assert admission.active == 0
+
+
+def test_upload_admission_timeout():
+    loop = asyncio.get_event_loop()
+    admission = UploadAdmission(max_uploads=1, max_queue=1, queue_timeout=0.01)
+
+    assert loop.run_until_complete(admission.acquire())
+    assert not loop.run_until_complete(admission.acquire())
+    assert admission.waiting == 0
+    assert admission.to_dict()['rejected'] == 1
+
+
+def test_bandwidth_shaper_priority():
+    shaper = BandwidthShaper(rate=0, peer_rate=100, background_rate=10)
+
+    loop = asyncio.get_event_loop()
+    with shaper.transfer('peer', PRIORITY_BACKGROUND) as background:
+        # background is not limited while no interactive transfer is active
+        loop.run_until_complete(background.throttle(20))
+        assert shaper.background.tokens == 10
+        with shaper.transfer('other') as interactive:
+            assert shaper.active == {PRIORITY_INTERACTIVE: 1, PRIORITY_BACKGROUND: 1}
+            loop.run_until_complete(interactive.throttle(50))
+            assert shaper.background.delay(20) > 0.9
+
+    assert not shaper.peers
+    assert shaper.duration(1000) == 10
+    assert shaper.duration(1000, PRIORITY_BACKGROUND) == 100
+
+    shaper.configure(peer_rate=0)
+    assert shaper.to_dict()['background_rate'] == 10
+    assert shaper.duration(1000) == 0
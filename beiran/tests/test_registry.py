@@ -0,0 +1,32 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from beiran_interface_docker.registry import BlobCache
+
+
+def test_blob_cache_drops_least_recently_used():
+    cache = BlobCache(size=2)
+    cache.set('sha256:aa', b'a', 'type/a')
+    cache.set('sha256:bb', b'b', 'type/b')
+    assert cache.get('sha256:aa') == (b'a', 'type/a')
+
+    cache.set('sha256:cc', b'c', 'type/c')
+    assert cache.get('sha256:bb') is None
+    assert cache.get('sha256:aa') == (b'a', 'type/a')
+    assert cache.get('sha256:cc') == (b'c', 'type/c')
@@ -0,0 +1,73 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import os
+
+from beiran_interface_docker.relay import OriginFetch
+
+
+def test_followers_get_whole_file(tmpdir):
+    path = str(tmpdir.join('layer.tar.gz'))
+    chunks = [os.urandom(100 * 1024) for _ in range(5)]
+
+    async def download(fetch: OriginFetch):
+        with open(path, 'wb') as file:
+            fetch.start(path, sum(len(chunk) for chunk in chunks))
+            for chunk in chunks:
+                file.write(chunk)
+                file.flush()
+                fetch.received(len(chunk))
+                await asyncio.sleep(0.01)
+        fetch.finish()
+
+    async def follow(fetch: OriginFetch, delay: float) -> bytes:
+        await asyncio.sleep(delay)
+        received = b''
+        async for chunk in fetch.follow():
+            received += chunk
+        return received
+
+    async def main():
+        fetch = OriginFetch()
+        results = await asyncio.gather(follow(fetch, 0), follow(fetch, 0.025),
+                                       download(fetch), follow(fetch, 0.1))
+        return [results[0], results[1], results[3]]
+
+    loop = asyncio.get_event_loop()
+    for received in loop.run_until_complete(main()):
+        assert received == b''.join(chunks)
+
+    complete = OriginFetch.complete(path)
+    assert loop.run_until_complete(follow(complete, 0)) == b''.join(chunks)
+
+
+def test_followers_get_error():
+    async def main():
+        fetch = OriginFetch()
+        fetch.finish(error=IOError("registry is down"))
+        assert not await fetch.wait_started()
+        try:
+            async for _ in fetch.follow():
+                pass
+        except IOError:
+            return True
+        return False
+
+    assert asyncio.get_event_loop().run_until_complete(main())
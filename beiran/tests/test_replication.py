@@ -0,0 +1,55 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
+
+from beiran_interface_docker.replication import LayerStats, HotLayerReplicator
+
+
+def test_hot_layers_decay():
+    stats = LayerStats(half_life=10)
+    for _ in range(8):
+        stats.requested('sha256:aa')
+    for _ in range(4):
+        stats.requested('sha256:bb')
+    stats.requested('sha256:cc')
+    stats.finished('sha256:aa', True)
+    stats.rejected('sha256:bb')
+
+    assert stats.hot(3) == ['sha256:aa', 'sha256:bb']
+    assert stats.to_dict()['sha256:aa']['served'] == 1
+    assert stats.to_dict()['sha256:bb']['rejected'] == 1
+
+    # ten seconds later, every rate is halved
+    for entry in stats.layers.values():
+        entry['updated'] = time.time() - 10
+    assert stats.hot(3) == ['sha256:aa']
+    assert round(stats.rate('sha256:bb')) == 2
+
+
+def test_holders_pick_same_targets():
+    replicator = HotLayerReplicator(None, LayerStats(), replicas=3)
+    online = ['{:032x}'.format(i) for i in range(10)]
+    holders = online[:1]
+
+    targets = replicator.targets('sha256:aa', holders, online)
+    assert len(targets) == 2
+    assert not set(targets) & set(holders)
+    assert replicator.targets('sha256:aa', holders, list(reversed(online))) == targets
+    assert replicator.targets('sha256:aa', online[:3], online) == []
@@ -0,0 +1,72 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from beiran.daemon.scoring import PeerScoring
+
+
+def test_rank_by_throughput_and_load():
+    scoring = PeerScoring()
+    scoring.observe_transfer('fast', 100 * 1024 * 1024, 1)
+    scoring.observe_transfer('slow', 100 * 1024 * 1024, 10)
+    assert scoring.rank(['slow', 'fast'], size=50 * 1024 * 1024) == ['fast', 'slow']
+
+    scoring.observe_load('fast', 20)
+    assert scoring.rank(['slow', 'fast'], size=50 * 1024 * 1024) == ['slow', 'fast']
+
+def test_rank_by_rtt_and_failures():
+    scoring = PeerScoring()
+    scoring.observe_rtt('near', 5)
+    scoring.observe_rtt('far', 200)
+    assert scoring.rank(['far', 'near']) == ['near', 'far']
+
+    for _ in range(6):
+        scoring.observe_failure('near')
+    assert scoring.rank(['far', 'near']) == ['far', 'near']
+
+def test_rtt_is_smoothed():
+    scoring = PeerScoring()
+    scoring.observe_rtt('peer', 10)
+    scoring.observe_rtt('peer', 1000)
+    assert 10 < scoring.get('peer').rtt < 1000
+
+def test_rank_by_zone_and_rack():
+    scoring = PeerScoring()
+    scoring.observe_rtt('far', 1)
+    scoring.observe_rtt('zone', 50)
+    scoring.observe_rtt('rack', 100)
+    assert scoring.rank(['rack', 'zone', 'far']) == ['far', 'zone', 'rack']
+
+    scoring.set_location('zone-a', 'rack-1', 'local')
+    scoring.locate('far', 'zone-b', 'rack-1')
+    scoring.locate('zone', 'zone-a', 'rack-2')
+    scoring.locate('rack', 'zone-a', 'rack-1')
+    assert scoring.rank(['far', 'zone', 'rack']) == ['rack', 'zone', 'far']
+    # local node is never in another zone
+    assert scoring.distance('local') == scoring.SAME_RACK
+
+def test_layer_format_by_throughput():
+    scoring = PeerScoring()
+    assert scoring.layer_format('new') == 'gz'
+
+    scoring.observe_transfer('lan', 1024 * 1024 * 1024, 1)
+    scoring.observe_transfer('wan', 1024 * 1024 * 1024, 100)
+    assert scoring.layer_format('lan') == 'tar'
+    assert scoring.layer_format('wan') == 'gz'
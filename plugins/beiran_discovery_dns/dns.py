@@ -39,6 +39,7 @@ class DNSDiscovery(BaseDiscoveryPlugin):
     DEFAULTS = {
         'discovery_service_address': 'beirand',
         'domain': '_beiran._tcp.local.',
+        'query_interval': 10.0,
     }
 
     def __init__(self, config: dict) -> None:
@@ -89,4 +90,4 @@ class DNSDiscovery(BaseDiscoveryPlugin):
                 self.log.info("Leaving node %s", node)
                 self.nodes.discard(node)
                 self.emit('undiscovered', node)
-            await asyncio.sleep(1.0)
+            await asyncio.sleep(float(self.config['query_interval']))
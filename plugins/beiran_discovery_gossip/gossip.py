@@ -0,0 +1,258 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+SWIM gossip discovery service implementation
+
+Members probe each other over UDP; one random member per protocol period,
+and indirectly through a few other members if it does not respond. Membership
+changes and sync state versions of nodes are piggybacked on these messages,
+so they spread through the cluster in O(log n) periods while each node sends
+a constant number of messages per period.
+"""
+
+import asyncio
+import json
+import time
+
+from typing import Optional, Tuple
+
+from beiran.models import PeerAddress
+from beiran.plugin import BaseDiscoveryPlugin
+
+from beiran_discovery_gossip.membership import Member, Membership
+
+# Beiran plugin variables
+PLUGIN_NAME = 'gossip'
+PLUGIN_TYPE = 'discovery'
+
+
+class GossipProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol passing received messages to discovery plugin"""
+
+    def __init__(self, discovery: "GossipDiscovery") -> None:
+        self.discovery = discovery
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        try:
+            msg = json.loads(data.decode('utf-8'))
+        except ValueError:
+            self.discovery.log.warning("invalid gossip message from %s", addr)
+            return
+        self.discovery.handle_message(msg, addr)
+
+    def error_received(self, exc: Exception):
+        self.discovery.log.debug("gossip transport error: %s", exc)
+
+
+class GossipDiscovery(BaseDiscoveryPlugin):  # pylint: disable=too-many-instance-attributes
+    """Beiran Implementation of SWIM Gossip Discovery
+    """
+    DEFAULTS = {
+        'gossip_port': None, # same port number with daemon, if not set
+        'seeds': [], # list of `host` or `host:gossip_port` to join the cluster through
+        'protocol_period': 1.0,
+        'ack_timeout': 0.5,
+        'indirect_checks': 3,
+        'suspicion_timeout': 5.0,
+        'retransmit_mult': 3,
+        'max_piggyback': 8,
+        'max_peers': 0, # how many members daemon connects to, 0 means all
+    }
+
+    def __init__(self, config: dict) -> None:
+        """ Creates an instance of Gossip Discovery Service
+        """
+        super().__init__(config)
+        self.gossip_port = int(self.config['gossip_port'] or self.port)
+        self.membership = Membership(
+            Member(uuid=self.node.uuid.hex, host=self.address, port=self.port,
+                   gossip_port=self.gossip_port, incarnation=int(time.time())),
+            suspicion_timeout=float(self.config['suspicion_timeout']),
+            retransmit_mult=int(self.config['retransmit_mult'])
+        )
+        self.membership.on('join', self.on_join)
+        self.membership.on('leave', self.on_leave)
+        self.membership.on('catalog', self.on_catalog)
+
+        self.peers = set() # type: set
+        self.transport = None # type: Optional[asyncio.DatagramTransport]
+        self.probe_task = None # type: Optional[asyncio.Task]
+        self.seq = 0
+        self.acks = {} # type: dict
+
+    async def start(self):
+        """ Starts discovery service
+        """
+        self.transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: GossipProtocol(self), local_addr=('0.0.0.0', self.gossip_port))
+
+        self.membership.update_local_catalog(self.daemon.sync_state_version)
+        self.config['events'].on('state.update', self.on_state_update)
+
+        for seed in self.seeds:
+            self.send(seed, {"t": "ping", "seq": self.next_seq()})
+
+        self.probe_task = self.loop.create_task(self.probe_loop())
+
+    async def stop(self):
+        """ Tell members we are leaving and stop the protocol"""
+        if self.probe_task:
+            self.probe_task.cancel()
+
+        leave_msg = self.membership.leave()
+        for member in self.membership.random_members(int(self.config['indirect_checks'])):
+            self.send(member.gossip_address, {"t": "leave", "events": [leave_msg]})
+
+        if self.transport:
+            self.transport.close()
+
+    @property
+    def seeds(self) -> list:
+        """udp addresses of seed members"""
+        seeds = self.config['seeds']
+        if isinstance(seeds, str):
+            seeds = seeds.split(';')
+
+        addresses = []
+        for seed in seeds:
+            host, _, port = seed.partition(':')
+            addresses.append((host, int(port or self.gossip_port)))
+        return addresses
+
+    def next_seq(self) -> int:
+        """Sequence number for a new probe"""
+        self.seq += 1
+        return self.seq
+
+    def send(self, addr: Tuple[str, int], msg: dict):
+        """Send message to addr, piggybacking membership updates"""
+        if not self.transport:
+            return
+        msg['from'] = self.membership.local.to_dict()
+        msg.setdefault('events', self.membership.piggyback(int(self.config['max_piggyback'])))
+        self.transport.sendto(json.dumps(msg).encode('utf-8'), addr)
+
+    def handle_message(self, msg: dict, addr: Tuple[str, int]):
+        """Process message received from a member"""
+        if 'from' in msg:
+            self.membership.apply({"type": "alive", **msg['from']})
+        for event in msg.get('events', []):
+            self.membership.apply(event)
+
+        msg_type = msg.get('t')
+        if msg_type == 'ping':
+            self.send(addr, {"t": "ack", "seq": msg['seq']})
+        elif msg_type == 'ping-req':
+            self.loop.create_task(self.relay_probe(addr, msg['seq'], tuple(msg['target'])))
+        elif msg_type == 'ack':
+            future = self.acks.pop(msg['seq'], None)
+            if future and not future.done():
+                future.set_result(True)
+
+    async def wait_ack(self, seq: int, timeout: float) -> bool:
+        """Wait for ack of probe `seq`"""
+        future = self.acks.setdefault(seq, self.loop.create_future())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    async def ping(self, addr: Tuple[str, int], timeout: float) -> bool:
+        """Ping a member directly"""
+        seq = self.next_seq()
+        self.acks[seq] = self.loop.create_future()
+        self.send(addr, {"t": "ping", "seq": seq})
+        try:
+            return await self.wait_ack(seq, timeout)
+        finally:
+            self.acks.pop(seq, None)
+
+    async def relay_probe(self, addr: Tuple[str, int], seq: int, target: Tuple[str, int]):
+        """Ping target on behalf of another member"""
+        if await self.ping(target, float(self.config['ack_timeout'])):
+            self.send(addr, {"t": "ack", "seq": seq})
+
+    async def probe(self, member: Member, deadline: float):
+        """Probe a member directly, then indirectly. Suspect it if both fail"""
+        if await self.ping(member.gossip_address, float(self.config['ack_timeout'])):
+            return
+
+        helpers = self.membership.random_members(int(self.config['indirect_checks']),
+                                                 exclude=[member.uuid])
+        if helpers:
+            seq = self.next_seq()
+            self.acks[seq] = self.loop.create_future()
+            for helper in helpers:
+                self.send(helper.gossip_address, {"t": "ping-req", "seq": seq,
+                                                  "target": list(member.gossip_address)})
+            try:
+                if await self.wait_ack(seq, max(deadline - self.loop.time(), 0)):
+                    return
+            finally:
+                self.acks.pop(seq, None)
+
+        self.log.debug("member did not respond to probes, suspecting %s", member)
+        self.membership.suspect(member.uuid)
+
+    async def probe_loop(self):
+        """Run failure detector, one probe per protocol period"""
+        period = float(self.config['protocol_period'])
+        while True:
+            started = self.loop.time()
+            try:
+                self.membership.expire_suspects()
+                member = self.membership.next_probe_target()
+                if member:
+                    await self.probe(member, started + period)
+            except Exception as err:  # pylint: disable=broad-except
+                self.log.error("gossip protocol period failed: %s", err)
+            await asyncio.sleep(max(started + period - self.loop.time(), 0))
+
+    def on_join(self, member: Member):
+        """A new member joined, let daemon connect it unless we have enough peers"""
+        self.log.info("member joined: %s", member)
+        max_peers = int(self.config['max_peers'])
+        if max_peers and len(self.peers) >= max_peers:
+            return
+        self.peers.add(member.uuid)
+        self.emit('discovered', peer_address=PeerAddress(host=member.host, port=member.port))
+
+    def on_leave(self, member: Member):
+        """A member left, let daemon remove it and pick another peer in its place"""
+        self.log.info("member left: %s", member)
+        if member.uuid not in self.peers:
+            return
+        self.peers.discard(member.uuid)
+        self.emit('undiscovered', ip_address=member.host, service_port=member.port)
+
+        for candidate in self.membership.random_members(len(self.membership.members)):
+            if candidate.uuid not in self.peers:
+                self.on_join(candidate)
+                break
+
+    def on_catalog(self, member: Member):
+        """Sync state version of a member changed"""
+        if member.uuid in self.peers:
+            self.emit('catalog', uuid=member.uuid, version=member.catalog)
+
+    async def on_state_update(self, update: dict, plugin): # pylint: disable=unused-argument
+        """Local sync state changed, gossip it"""
+        self.membership.update_local_catalog(self.daemon.sync_state_version)
@@ -0,0 +1,288 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+SWIM membership list and infection-style dissemination of its changes
+"""
+
+import math
+import random
+import time
+
+from typing import Dict, List, Optional, Tuple
+from pyee import EventEmitter
+
+
+ALIVE = 'alive'
+SUSPECT = 'suspect'
+DEAD = 'dead'
+
+
+class Member:
+    """A member of gossip cluster"""
+
+    def __init__(self, uuid: str, host: str, port: int, gossip_port: int, # pylint: disable=too-many-arguments
+                 incarnation: int = 0, catalog: int = 0) -> None:
+        """
+
+        Args:
+            uuid (str): node uuid
+            host (str): ip address of node
+            port (int): beirand service port
+            gossip_port (int): udp port gossip protocol runs on
+            incarnation (int): incarnation number of member, used for ordering
+                member state messages and for refuting suspicions
+            catalog (int): sync state version of node
+        """
+        self.uuid = uuid
+        self.host = host
+        self.port = port
+        self.gossip_port = gossip_port
+        self.incarnation = incarnation
+        self.catalog = catalog
+        self.catalog_key = (incarnation, catalog)
+        self.status = ALIVE
+        self.suspected_at = None # type: Optional[float]
+
+    def __repr__(self) -> str:
+        return "Member: {} Address: {}:{} Status: {}".format(self.uuid, self.host,
+                                                           self.port, self.status)
+
+    @property
+    def gossip_address(self) -> Tuple[str, int]:
+        """udp address of member"""
+        return (self.host, self.gossip_port)
+
+    def to_dict(self) -> dict:
+        """Serialize member"""
+        return {
+            "uuid": self.uuid,
+            "host": self.host,
+            "port": self.port,
+            "gossip_port": self.gossip_port,
+            "inc": self.incarnation,
+            "catalog": self.catalog
+        }
+
+    @classmethod
+    def from_dict(cls, _dict: dict) -> "Member":
+        """Deserialize member"""
+        return cls(uuid=_dict['uuid'], host=_dict['host'], port=_dict['port'],
+                   gossip_port=_dict['gossip_port'], incarnation=_dict.get('inc', 0),
+                   catalog=_dict.get('catalog', 0))
+
+
+class Membership(EventEmitter):
+    """
+    Membership list of local node. It applies `alive`, `suspect`, `dead` and
+    `catalog` messages received from other members and queues the changes
+    to be piggybacked on outgoing messages.
+
+    Emits;
+     - `join` (member): a new member is alive
+     - `leave` (member): a member is dead or left the cluster
+     - `catalog` (member): sync state version of a member changed
+    """
+
+    def __init__(self, local: Member, suspicion_timeout: float = 5.0,
+                 retransmit_mult: int = 3) -> None:
+        super().__init__()
+        self.local = local
+        self.suspicion_timeout = suspicion_timeout
+        self.retransmit_mult = retransmit_mult
+        self.members = {} # type: Dict[str, Member]
+        self.updates = {} # type: Dict[str, dict]
+        self._probe_list = [] # type: List[str]
+        self.enqueue(self.message(ALIVE, local))
+
+    @staticmethod
+    def message(msg_type: str, member: Member) -> dict:
+        """Build a message about `member`"""
+        return {"type": msg_type, **member.to_dict()}
+
+    @property
+    def alive_members(self) -> List[Member]:
+        """Members which are not known to be dead"""
+        return [m for m in self.members.values() if m.status != DEAD]
+
+    @property
+    def retransmit_limit(self) -> int:
+        """How many times an update is piggybacked before it is dropped"""
+        return self.retransmit_mult * math.ceil(math.log2(len(self.members) + 2))
+
+    def enqueue(self, msg: dict) -> None:
+        """Queue a message for dissemination, replacing older ones about same member"""
+        key = msg['uuid'] if msg['type'] != 'catalog' else 'catalog:' + msg['uuid']
+        self.updates[key] = {"msg": msg, "sent": 0}
+
+    def piggyback(self, limit: int) -> List[dict]:
+        """Pick least disseminated `limit` updates to be sent with next message"""
+        picked = sorted(self.updates.items(), key=lambda item: item[1]['sent'])[:limit]
+        messages = []
+        for key, update in picked:
+            update['sent'] += 1
+            if update['sent'] >= self.retransmit_limit:
+                del self.updates[key]
+            messages.append(update['msg'])
+        return messages
+
+    def apply(self, msg: dict) -> None:
+        """Apply a received message to membership list"""
+        handler = {
+            ALIVE: self.on_alive,
+            SUSPECT: self.on_suspect,
+            DEAD: self.on_dead,
+            'catalog': self.on_catalog,
+        }.get(msg.get('type'))
+        if handler:
+            handler(msg)
+
+    def refute(self, incarnation: int) -> None:
+        """Someone thinks we are suspect or dead, tell everyone we are alive"""
+        self.local.incarnation = max(self.local.incarnation, incarnation) + 1
+        self.enqueue(self.message(ALIVE, self.local))
+
+    def on_alive(self, msg: dict) -> None:
+        """Handle `alive` message"""
+        if msg['uuid'] == self.local.uuid:
+            return
+
+        member = self.members.get(msg['uuid'])
+        if not member or member.status == DEAD:
+            if member and msg['inc'] <= member.incarnation:
+                return
+            member = Member.from_dict(msg)
+            self.members[member.uuid] = member
+            self._probe_list.append(member.uuid)
+            self.enqueue(msg)
+            self.emit('join', member)
+            return
+
+        if msg['inc'] > member.incarnation:
+            member.incarnation = msg['inc']
+            member.status = ALIVE
+            member.suspected_at = None
+            self.enqueue(msg)
+        self.on_catalog(msg)
+
+    def on_suspect(self, msg: dict) -> None:
+        """Handle `suspect` message"""
+        if msg['uuid'] == self.local.uuid:
+            self.refute(msg['inc'])
+            return
+
+        member = self.members.get(msg['uuid'])
+        if not member or member.status == DEAD or msg['inc'] < member.incarnation:
+            return
+        if member.status == SUSPECT and msg['inc'] == member.incarnation:
+            return
+
+        member.incarnation = msg['inc']
+        member.status = SUSPECT
+        member.suspected_at = time.time()
+        self.enqueue(msg)
+
+    def on_dead(self, msg: dict) -> None:
+        """Handle `dead` message"""
+        if msg['uuid'] == self.local.uuid:
+            self.refute(msg['inc'])
+            return
+
+        member = self.members.get(msg['uuid'])
+        if not member or member.status == DEAD or msg['inc'] < member.incarnation:
+            return
+
+        member.incarnation = msg['inc']
+        self.enqueue(msg)
+        self.remove(member)
+
+    def on_catalog(self, msg: dict) -> None:
+        """Handle `catalog` message, which carries sync state version of a member"""
+        member = self.members.get(msg['uuid'])
+        if not member or member.status == DEAD:
+            return
+
+        # incarnation orders versions across restarts of the member,
+        # since its sync state version may start over
+        if (msg['inc'], msg['catalog']) <= member.catalog_key:
+            return
+
+        member.catalog = msg['catalog']
+        member.catalog_key = (msg['inc'], msg['catalog'])
+        if msg['type'] == 'catalog':
+            self.enqueue(msg)
+        self.emit('catalog', member)
+
+    def update_local_catalog(self, version: int) -> None:
+        """Announce a new sync state version of local node"""
+        self.local.catalog = version
+        self.enqueue(self.message('catalog', self.local))
+
+    def suspect(self, uuid: str) -> None:
+        """Local failure detector could not reach the member"""
+        member = self.members.get(uuid)
+        if not member or member.status != ALIVE:
+            return
+        member.status = SUSPECT
+        member.suspected_at = time.time()
+        self.enqueue(self.message(SUSPECT, member))
+
+    def expire_suspects(self, now: float = None) -> None:
+        """Declare members dead whose suspicion timed out"""
+        now = now or time.time()
+        for member in list(self.members.values()):
+            if member.status != SUSPECT:
+                continue
+            if now - member.suspected_at >= self.suspicion_timeout: # type: ignore
+                self.enqueue(self.message(DEAD, member))
+                self.remove(member)
+
+    def remove(self, member: Member) -> None:
+        """Mark member dead and let listeners know it left"""
+        member.status = DEAD
+        member.suspected_at = None
+        self.emit('leave', member)
+
+    def leave(self) -> dict:
+        """Build the message announcing that local node leaves the cluster"""
+        self.local.incarnation += 1
+        return self.message(DEAD, self.local)
+
+    def next_probe_target(self) -> Optional[Member]:
+        """
+        Pick next member to probe. Members are probed in a round-robin
+        order which is shuffled at every round, as described in SWIM paper.
+        """
+        while True:
+            if not self._probe_list:
+                self._probe_list = [m.uuid for m in self.alive_members]
+                if not self._probe_list:
+                    return None
+                random.shuffle(self._probe_list)
+
+            member = self.members.get(self._probe_list.pop())
+            if member and member.status != DEAD:
+                return member
+
+    def random_members(self, count: int, exclude: List[str] = None) -> List[Member]:
+        """Pick `count` random alive members"""
+        candidates = [m for m in self.alive_members
+                      if m.status == ALIVE and m.uuid not in (exclude or [])]
+        return random.sample(candidates, min(count, len(candidates)))
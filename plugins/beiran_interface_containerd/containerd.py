@@ -22,14 +22,24 @@
 containerd interface plugin
 """
 import asyncio
-import grpc
+import hashlib
+import json
+import os
+from typing import Optional, Tuple
 
-from beiran.plugin import BaseInterfacePlugin
+from beiran.plugin import BaseInterfacePlugin, History
+from beiran.daemon.common import DISK
 from beiran_interface_containerd.services.cri.image_service import ImageServiceClient
 from beiran_interface_containerd.services.content import ContentClient
 from beiran_interface_containerd.services.images import ImagesClient
+from beiran_interface_containerd.services.events import EventsClient, event_subject
+from beiran_interface_containerd.indexer import ContainerdIndexer
+from beiran_interface_containerd.ingest import ContentIngester, Blob, MEDIA_LAYER, \
+    MEDIA_LAYER_GZIP
 
+from beiran_package_container.channels import CHANNELS
 from beiran_package_container.util import ContainerUtil
+from beiran_package_container.image_ref import marshal_normalize_ref
 
 PLUGIN_NAME = 'containerd'
 PLUGIN_TYPE = 'interface'
@@ -37,14 +47,32 @@ PLUGIN_TYPE = 'interface'
 # pylint: disable=attribute-defined-outside-init
 class ContainerdInterface(BaseInterfacePlugin):
     """Containerd support for Beiran"""
+
+    # seconds to gather containerd events before applying them
+    EVENT_DELAY = 1
+
     DEFAULTS = {
-        'containerd_socket_path': "unix:///run/containerd/containerd.sock"
+        'containerd_socket_path': "unix:///run/containerd/containerd.sock",
+        'storage_path': "/var/lib/containerd",
+        # namespace images are indexed from and pulled into, kubelet
+        # and the cri plugin of containerd use `k8s.io`
+        'namespace': 'k8s.io',
+        'index_concurrency': 16
     }
 
     async def init(self):
-        channel = grpc.insecure_channel(self.config['containerd_socket_path'])
+        channel = CHANNELS.get(self.config['containerd_socket_path'])
         self.content_client = ContentClient(channel)
         self.images_client = ImagesClient(channel)
+        self.content_client.set_namespace(self.config['namespace'])
+        self.images_client.set_namespace(self.config['namespace'])
+        self.events_client = EventsClient(channel)
+        self.indexer = ContainerdIndexer(self.images_client, self.content_client,
+                                         self.node.uuid.hex,
+                                         concurrency=int(self.config['index_concurrency']),
+                                         logger=self.log)
+        self.ingester = ContentIngester(self.content_client, self.images_client, logger=self.log)
+        self.history = History() # type: History
 
         # if containerd's cri plugin is effective
         self.image_service_client = ImageServiceClient(channel)
@@ -52,6 +80,7 @@ class ContainerdInterface(BaseInterfacePlugin):
         # get storage path
         # response = await self.image_service_client.image_fs_info()
         # self.storage_path = response.image_filesystems[0].fs_id.mountpoint
+        DISK.add_store('containerd', self.config['storage_path'])
 
     async def load_depend_plugin_instances(self, instances: list) -> None:
         """Load instances of plugins that has dependencies on this plugin"""
@@ -66,10 +95,13 @@ class ContainerdInterface(BaseInterfacePlugin):
         self.probe_task = self.loop.create_task(self.probe_daemon())
         self.on('containerd.new_image', self.new_image_saved)
         self.on('containerd.existing_image_deleted', self.existing_image_deleted)
+        self.on('containerd.new_image', lambda *_: DISK.changed('containerd'))
+        self.on('containerd.existing_image_deleted', lambda *_: DISK.changed('containerd'))
 
     async def stop(self):
         if self.probe_task:
             self.probe_task.cancel()
+        await CHANNELS.close(self.config['containerd_socket_path'])
 
     async def probe_daemon(self):
         """Deal with local containerd states"""
@@ -95,74 +127,89 @@ class ContainerdInterface(BaseInterfacePlugin):
             #     self.log.error("Cannot access containerd storage, please run as sudo for now")
             #     raise err
 
-            # # Get Images
-            # self.log.debug("Getting containerd image list..")
-            # image_list = await self.aiodocker.images.list(all=1)
-            # not_intermediates = await self.aiodocker.images.list()
+            # subscribe before indexing, so that changes made meanwhile are not lost
+            namespace = 'namespace==%s' % self.images_client.namespace[1]
+            events = self.events_client.subscribe([namespace + ',topic~="^/images/"',
+                                                   namespace + ',topic=="/content/delete"'])
+            await events.wait_for_connection()
 
-            # for image_data in image_list:
-            #     self.log.debug("existing image..%s", image_data)
+            # Get Images
+            self.log.debug("Getting containerd image list..")
+            await self.indexer.index()
 
-            #     if image_data in not_intermediates:
-            #         await self.save_image(image_data['Id'], skip_updates=True)
-            #     else:
-            #         await self.save_image(image_data['Id'], skip_updates=True,
-            #                               skip_updating_layer=True)
-
-            # # This will be converted to something like
-            # #   daemon.plugins['containerd'].setReady(true)
-            # # in the future; will we in containerd plugin code.
-            # self.history.update('init')
-            # self.status = 'ready'
+            # This will be converted to something like
+            #   daemon.plugins['containerd'].setReady(true)
+            # in the future; will we in containerd plugin code.
+            self.history.update('init')
+            self.status = 'ready'
 
             # Do not block on this
-            self.probe_task = self.loop.create_task(self.listen_daemon_events())
+            self.probe_task = self.loop.create_task(self.listen_daemon_events(events))
 
         except Exception as err:  # pylint: disable=broad-except
             await self.daemon_error(err)
 
-    async def listen_daemon_events(self):
+    async def listen_daemon_events(self, events):
         """
-        Subscribes aiodocker events channel and logs them.
-        If containerd is unavailable calls deamon_lost method
-        to emit the lost event.
+        Applies subscribed containerd events of images and contents in
+        batches. If containerd is unavailable calls deamon_lost method to
+        emit the lost event.
         """
-        # new_image_events = ['pull', 'load', 'tag', 'commit', 'import']
-        # remove_image_events = ['delete']
-
-        # try:
-        #     # await until containerd is unavailable
-        #     self.log.debug("subscribing to containerd events for further changes")
-        #     subscriber = self.aiodocker.events.subscribe()
-        #     while True:
-        #         event = await subscriber.get()
-        #         if event is None:
-        #             break
-
-        #         # log the event
-        #         self.log.debug("containerd event: %s[%s] %s",
-        #                        event['Action'], event['Type'], event.get('id', 'event has no id'))
-
-        #         # handle commit container (and build new image)
-        #         if event['Type'] == 'container' and event['Action'] in new_image_events:
-        #             await self.save_image(event['Actor']['Attributes']['imageID'])
-
-        #         # handle new image events
-        #         if event['Type'] == 'image' and event['Action'] in new_image_events:
-        #             await self.save_image(event['id'])
-
-        #         # handle untagging image
-        #         if event['Type'] == 'image' and event['Action'] == 'untag':
-        #             await self.untag_image(event['id'])
-
-        #         # handle delete existing image events
-        #         if event['Type'] == 'image' and event['Action'] in remove_image_events:
-        #             await self.delete_image(event['id'])
-
-        #     await self.daemon_lost()
-        # except Exception as err:  # pylint: disable=broad-except
-        #     await self.daemon_error(str(err))
-        pass
+        pending = {'changed': set(), 'deleted': set(), 'content_deleted': set()} # type: dict
+        wakeup = asyncio.Event()
+        applier = asyncio.ensure_future(self.apply_daemon_events(pending, wakeup))
+
+        try:
+            # await until containerd is unavailable
+            self.log.debug("listening containerd events for further changes")
+            async for envelope in events:
+                subject = event_subject(envelope)
+                self.log.debug("containerd event: %s %s", envelope.topic, subject)
+                if not subject:
+                    continue
+
+                if envelope.topic in ('/images/create', '/images/update'):
+                    pending['changed'].add(subject)
+                    pending['deleted'].discard(subject)
+                elif envelope.topic == '/images/delete':
+                    pending['deleted'].add(subject)
+                    pending['changed'].discard(subject)
+                else:
+                    pending['content_deleted'].add(subject)
+                wakeup.set()
+
+            await self.daemon_lost()
+        except Exception as err:  # pylint: disable=broad-except
+            await self.daemon_error(str(err))
+        finally:
+            applier.cancel()
+
+    async def apply_daemon_events(self, pending: dict, wakeup: asyncio.Event):
+        """Update database with events gathered for a while, and history once for them"""
+        while True:
+            await wakeup.wait()
+            await asyncio.sleep(self.EVENT_DELAY)
+            wakeup.clear()
+            changed, deleted, content_deleted = \
+                pending['changed'], pending['deleted'], pending['content_deleted']
+            pending.update({'changed': set(), 'deleted': set(), 'content_deleted': set()})
+
+            try:
+                saved = await self.indexer.index(list(changed)) if changed else []
+                removed = self.indexer.remove(list(deleted)) if deleted else []
+                if content_deleted:
+                    self.indexer.remove_content(list(content_deleted))
+                await ContainerUtil.delete_unavailable_objects()
+            except Exception as err:  # pylint: disable=broad-except
+                self.log.error("cannot apply containerd events: %s", err)
+                continue
+
+            self.history.update('images={},removed_images={},deleted_contents={}'.format(
+                len(saved), len(removed), len(content_deleted)))
+            for image_id in saved:
+                self.emit('containerd.new_image', image_id)
+            for image_id in removed:
+                self.emit('containerd.existing_image_deleted', image_id)
 
     async def daemon_error(self, error: str):
         """
@@ -198,6 +245,58 @@ class ContainerdInterface(BaseInterfacePlugin):
         await asyncio.sleep(30)
         self.probe_task = self.loop.create_task(self.probe_daemon())
 
+    async def load_image(self, tag_or_digest: str, config_json_str: str,
+                         repo_digest: str = None) -> str:
+        """
+        Write image pulled into cache to containerd, preferring compressed
+        layers, as containerd stores them
+
+        Args:
+            repo_digest (str): digest of manifest or manifest list image is pulled with
+
+        Returns:
+            str: digest of target of image
+        """
+        layers = []
+        for diff_id in json.loads(config_json_str)['rootfs']['diff_ids']:
+            digest = self.container.diffid_mapping.get(diff_id)
+            gz_layer_path = self.container.get_layer_gz_file(digest) if digest else None
+            tar_layer_path = self.container.get_layer_tar_file(diff_id)
+            if gz_layer_path and os.path.exists(gz_layer_path):
+                layers.append((MEDIA_LAYER_GZIP, digest, gz_layer_path))
+            elif os.path.exists(tar_layer_path):
+                layers.append((MEDIA_LAYER, diff_id, tar_layer_path))
+            else:
+                raise self.container.LayerNotFound("Layer doesn't exist in cache directory")
+
+        manifest, index = self.pulled_manifests(repo_digest, config_json_str)
+        return await self.ingester.ingest_image(marshal_normalize_ref(tag_or_digest),
+                                                config_json_str, layers, manifest, index)
+
+    def pulled_manifests(self, repo_digest: str, config_json_str: str) \
+            -> Tuple[Optional[Blob], Optional[Blob]]:
+        """
+        Manifest of image with config, as registry served it to the pull, and
+        the manifest list it is in, if the pull is by manifest list
+        """
+        pulled = self.container.manifests.get(repo_digest) if repo_digest else None
+        if not pulled:
+            return None, None
+
+        config_digest = 'sha256:' + hashlib.sha256(config_json_str.encode()).hexdigest()
+        manifest = json.loads(pulled[0].decode())
+        if 'manifests' not in manifest:
+            if manifest.get('config', {}).get('digest') == config_digest:
+                return pulled, None
+            return None, None
+
+        for descriptor in manifest['manifests']:
+            child = self.container.manifests.get(descriptor['digest'])
+            if child and \
+                    json.loads(child[0].decode()).get('config', {}).get('digest') == config_digest:
+                return child, pulled
+        return None, None
+
     async def new_image_saved(self, image_id: str):
         """placeholder method for new_image_saved event"""
         self.log.debug("a new image reported by containerd deamon registered...: %s", image_id)
@@ -0,0 +1,313 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Inventory of containerd images
+
+Images are listed with the Images API, their manifests and configs are read
+with the Content API with bounded concurrency, then images and layers are
+written to database in bulk, in a single transaction.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from peewee import SQL
+
+from beiran_package_container.image_ref import is_digest
+from beiran_package_container.models import ContainerImage, ContainerLayer
+from beiran_package_container.util import ContainerUtil
+from beiran_interface_containerd.services.content import ContentClient
+from beiran_interface_containerd.services.images import ImagesClient
+
+
+INDEX_MEDIA_TYPES = (
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.index.v1+json',
+)
+
+
+def created_at(config: dict) -> int:
+    """Creation time in config, like `2019-01-01T00:00:00.123456789Z`, as timestamp"""
+    try:
+        return int(datetime.strptime(config['created'][:19], "%Y-%m-%dT%H:%M:%S").timestamp())
+    except (KeyError, ValueError):
+        return 0
+
+
+def chunked(items: list, size: int) -> List[list]:
+    """Split items into lists of at most `size` items"""
+    return [items[idx:idx + size] for idx in range(0, len(items), size)]
+
+
+class ContainerdIndexer:
+    """Save images of containerd and their layers to database"""
+
+    # rows for each query and insert, keeping variables below sqlite's limit
+    BATCH = 50
+
+    def __init__(self, images_client: ImagesClient, content_client: ContentClient,
+                 node_uuid: str, concurrency: int = 16, logger: logging.Logger = None) -> None:
+        """
+        Args:
+            concurrency (int): images being read from containerd at the same time
+        """
+        self.images_client = images_client
+        self.content_client = content_client
+        self.node_uuid = node_uuid
+        self.concurrency = concurrency
+        self.logger = logger if logger else logging.getLogger('beiran.containerd')
+
+    async def read_json(self, digest: str) -> Tuple[dict, str]:
+        """Blob of `digest` as parsed and as string"""
+        blob = (await self.content_client.read(digest)).decode()
+        return json.loads(blob), blob
+
+    async def resolve(self, media_type: str, digest: str) -> Tuple[str, dict, str]:
+        """
+        Manifest of image for platform of this node, and config of image
+
+        Returns:
+            (str, dict, str): digest of manifest, manifest and config string
+        """
+        manifest, _ = await self.read_json(digest)
+        if media_type in INDEX_MEDIA_TYPES or 'manifests' in manifest:
+            arch = await ContainerUtil.get_go_python_arch()
+            os_name = await ContainerUtil.get_go_python_os()
+            for descriptor in manifest['manifests']:
+                platform = descriptor.get('platform', {})
+                if platform.get('architecture') == arch and platform.get('os') == os_name:
+                    digest = descriptor['digest']
+                    break
+            else:
+                raise ValueError("no manifest for %s/%s" % (os_name, arch))
+            manifest, _ = await self.read_json(digest)
+
+        _, config = await self.read_json(manifest['config']['digest'])
+        return digest, manifest, config
+
+    @staticmethod
+    def references(names: List[str], manifest_digest: str) -> Tuple[List[str], List[str]]:
+        """Tags and repo digests of image named `names` in containerd"""
+        tags, repo_digests = [], []
+        for name in names:
+            if name.startswith('sha256:'):
+                # reference of image by its id, added by cri plugin
+                continue
+            if is_digest(name):
+                repo_digests.append(name)
+                continue
+            tags.append(name)
+            repo = name.rsplit(':', 1)[0] if ':' in name.rsplit('/', 1)[-1] else name
+            repo_digests.append(repo + '@' + manifest_digest)
+        return sorted(set(tags)), sorted(set(repo_digests))
+
+    async def index(self, names: List[str] = None) -> List[str]:
+        """
+        Save images of containerd and their layers to database, all of them,
+        or the ones with `names`, keeping other names of them
+
+        Returns:
+            list: ids of saved images
+        """
+        filters = ['name==%s' % json.dumps(name) for name in names] if names else None
+        response = await self.images_client.list_images(filters)
+        targets = {} # type: Dict[Tuple[str, str], List[str]]
+        for image in response.images:
+            targets.setdefault((image.target.media_type, image.target.digest), []) \
+                   .append(image.name)
+
+        resolved = await self.resolve_all(targets)
+
+        images = {} # type: Dict[str, dict]
+        layers = {} # type: Dict[str, dict]
+        for target, result in zip(targets, resolved):
+            if result:
+                self.collect(images, layers, targets[target], *result)
+
+        self.save(images, layers, merge_names=bool(names))
+        self.logger.debug("saved %d images and %d layers of containerd",
+                          len(images), len(layers))
+        return list(images)
+
+    async def resolve_all(self, targets: Dict[Tuple[str, str], List[str]]) \
+            -> List[Optional[Tuple[str, dict, str]]]:
+        """
+        Resolve targets of images concurrently, None for the ones which cannot be read
+
+        Args:
+            targets (dict): names of images by their target media type and digest
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(target: Tuple[str, str]) -> Optional[Tuple[str, dict, str]]:
+            async with semaphore:
+                try:
+                    return await self.resolve(*target)
+                except Exception as err: # pylint: disable=broad-except
+                    self.logger.error("cannot read image %s of containerd: %s",
+                                      ', '.join(targets[target]), err)
+                    return None
+
+        return await asyncio.gather(*[fetch(target) for target in targets])
+
+    def collect(self, images: Dict[str, dict], layers: Dict[str, dict], # pylint: disable=too-many-arguments
+                names: List[str], manifest_digest: str, manifest: dict, config: str):
+        """Add image resolved from containerd and its layers to `images` and `layers` rows"""
+        config_dict = json.loads(config)
+        hash_id = manifest['config']['digest']
+        diff_ids = config_dict['rootfs']['diff_ids']
+        tags, repo_digests = self.references(names, manifest_digest)
+
+        image = images.setdefault(hash_id, {'tags': [], 'repo_digests': []})
+        image.update({
+            'hash_id': hash_id,
+            'created_at': created_at(config_dict),
+            'size': sum(layer['size'] for layer in manifest['layers']),
+            'tags': sorted(set(image['tags'] + tags)),
+            'repo_digests': sorted(set(image['repo_digests'] + repo_digests)),
+            'manifest': manifest,
+            'layers': diff_ids,
+            'config': config
+        })
+
+        self.collect_layers(layers, hash_id, manifest['layers'], diff_ids)
+
+    @staticmethod
+    def collect_layers(layers: Dict[str, dict], hash_id: str, descriptors: List[dict],
+                       diff_ids: List[str]):
+        """Add layers of image `hash_id` to `layers` rows"""
+        chain_id = ''
+        for descriptor, diff_id in zip(descriptors, diff_ids):
+            chain_id = ContainerUtil.calc_chain_id(chain_id, diff_id) if chain_id \
+                       else diff_id
+            layer = layers.setdefault(diff_id, {'local_image_refs': []})
+            layer.update({
+                'digest': descriptor['digest'],
+                'diff_id': diff_id,
+                'chain_id': chain_id,
+                'size': descriptor['size']
+            })
+            layer['local_image_refs'].append(hash_id)
+
+    def save(self, images: Dict[str, dict], layers: Dict[str, dict], merge_names: bool = False):
+        """
+        Write images and layers, keeping their availability at other nodes,
+        and tags and repo digests of images if `merge_names`
+        """
+        database = ContainerImage._meta.database # pylint: disable=protected-access
+        with database.atomic():
+            self.save_images(images, merge_names)
+            self.save_layers(layers)
+
+    def save_images(self, images: Dict[str, dict], merge_names: bool = False):
+        """Write images, keeping tags and repo digests of them if `merge_names`"""
+        rows = []
+        for hash_ids in chunked(list(images), self.BATCH):
+            existing = {image.hash_id: image for image in
+                        ContainerImage.select().where(ContainerImage.hash_id.in_(hash_ids))}
+            for hash_id in hash_ids:
+                row = dict(existing[hash_id].__data__) if hash_id in existing else {}
+                if merge_names and row:
+                    for key in ('tags', 'repo_digests'):
+                        images[hash_id][key] = sorted(set(row[key] + images[hash_id][key]))
+                row.update(images[hash_id])
+                row['available_at'] = sorted(set(row.get('available_at', [])) |
+                                             {self.node_uuid})
+                rows.append(self.with_defaults(ContainerImage, row))
+        for batch in chunked(rows, self.BATCH):
+            ContainerImage.insert_many(batch).on_conflict_replace().execute()
+
+    def save_layers(self, layers: Dict[str, dict]):
+        """Write layers, keeping their local image references"""
+        new_rows, rows = [], []
+        for diff_ids in chunked(list(layers), self.BATCH):
+            existing = {layer.diff_id: layer for layer in
+                        ContainerLayer.select().where(ContainerLayer.diff_id.in_(diff_ids))}
+            for diff_id in diff_ids:
+                row = dict(existing[diff_id].__data__) if diff_id in existing else {}
+                refs = row.get('local_image_refs', []) + layers[diff_id]['local_image_refs']
+                row.update(layers[diff_id])
+                row['local_image_refs'] = sorted(set(refs))
+                row['available_at'] = sorted(set(row.get('available_at', [])) |
+                                             {self.node_uuid})
+                (rows if 'id' in row else new_rows).append(
+                    self.with_defaults(ContainerLayer, row))
+        for batch in chunked(rows, self.BATCH) + chunked(new_rows, self.BATCH):
+            ContainerLayer.insert_many(batch).on_conflict_replace().execute()
+
+    def remove(self, names: List[str]) -> List[str]:
+        """
+        Forget names of images deleted from containerd, images without names
+        left are not available at this node anymore
+
+        Returns:
+            list: ids of images not available anymore
+        """
+        removed = []
+        names = [name for name in names if not name.startswith('sha256:')]
+        local = SQL('available_at LIKE \'%%"%s"%%\'' % self.node_uuid)
+        database = ContainerImage._meta.database # pylint: disable=protected-access
+        with database.atomic():
+            for image in ContainerImage.select().where(local):
+                if not set(names) & set(image.tags + image.repo_digests):
+                    continue
+                image.tags = [tag for tag in image.tags if tag not in names]
+                repos = {tag.rsplit(':', 1)[0] for tag in image.tags}
+                image.repo_digests = [digest for digest in image.repo_digests
+                                      if digest not in names and digest.split('@')[0] in repos]
+                if not image.tags and not image.repo_digests:
+                    image.unset_available_at(self.node_uuid)
+                    self.unset_local_layers(image)
+                    removed.append(image.hash_id)
+                image.save()
+        return removed
+
+    def unset_local_layers(self, image: ContainerImage):
+        """Layers not referred by local images are not available at this node"""
+        local = SQL('available_at LIKE \'%%"%s"%%\'' % self.node_uuid)
+        for layer in ContainerLayer.select() \
+                                   .where(ContainerLayer.diff_id.in_(image.layers)) \
+                                   .where(local):
+            layer.unset_local_image_refs(image.hash_id)
+            if not layer.local_image_refs and not layer.cache_path and not layer.cache_gz_path:
+                layer.unset_available_at(self.node_uuid)
+            layer.save()
+
+    def remove_content(self, digests: List[str]):
+        """Layers of blobs deleted from containerd are not available at this node"""
+        local = SQL('available_at LIKE \'%%"%s"%%\'' % self.node_uuid)
+        for layer in ContainerLayer.select() \
+                                   .where(ContainerLayer.digest.in_(digests)) \
+                                   .where(local):
+            if not layer.cache_path and not layer.cache_gz_path:
+                layer.unset_available_at(self.node_uuid)
+                layer.save()
+
+    @staticmethod
+    def with_defaults(model, row: dict) -> dict:
+        """Row with defaults of fields not given, so rows of a batch have the same columns"""
+        for name, field in model._meta.fields.items(): # pylint: disable=protected-access
+            if name not in row and not field.primary_key:
+                row[name] = field.default() if callable(field.default) else field.default
+        return row
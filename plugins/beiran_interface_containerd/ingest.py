@@ -0,0 +1,194 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Ingestion of pulled images into content store of containerd
+
+Layers in cache are written to containerd with the Content API, skipping
+the ones it already has, then config and manifest are committed and the
+image is created with the Images API. No image tarball is built.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import AsyncIterator, List, Tuple
+
+import aiofiles
+import grpc
+
+from beiran_package_container.grpc.images_pb2 import Image
+from beiran_package_container.grpc.descriptor_pb2 import Descriptor
+from beiran_package_container.image_ref import del_idpref
+from beiran_interface_containerd.services.content import ContentClient
+from beiran_interface_containerd.services.images import ImagesClient
+
+
+MEDIA_MANIFEST = 'application/vnd.docker.distribution.manifest.v2+json'
+MEDIA_CONFIG = 'application/vnd.docker.container.image.v1+json'
+MEDIA_LAYER = 'application/vnd.docker.image.rootfs.diff.tar'
+MEDIA_LAYER_GZIP = 'application/vnd.docker.image.rootfs.diff.tar.gzip'
+
+# labels keeping blobs referred by manifest from garbage collection
+GC_LABEL_CONFIG = 'containerd.io/gc.ref.content.config'
+GC_LABEL_LAYER = 'containerd.io/gc.ref.content.l.%d'
+GC_LABEL_MANIFEST = 'containerd.io/gc.ref.content.m.%d'
+
+# a manifest or manifest list and its media type
+Blob = Tuple[bytes, str]
+
+
+async def file_chunks(path: str, size: int) -> AsyncIterator[bytes]:
+    """Chunks of file at `path`"""
+    async with aiofiles.open(path, 'rb') as file:
+        while True:
+            chunk = await file.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def bytes_chunks(data: bytes) -> AsyncIterator[bytes]:
+    """`data` as a single chunk"""
+    yield data
+
+
+class ContentIngester:
+    """Write images pulled by beiran to containerd"""
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, content_client: ContentClient, images_client: ImagesClient,
+                 logger: logging.Logger = None) -> None:
+        self.content_client = content_client
+        self.images_client = images_client
+        self.logger = logger if logger else logging.getLogger('beiran.containerd')
+
+    async def has_content(self, digest: str) -> bool:
+        """Does containerd have blob of `digest`"""
+        try:
+            await self.content_client.info(digest)
+            return True
+        except grpc.RpcError as err:
+            if err.code() == grpc.StatusCode.NOT_FOUND: # pylint: disable=no-member
+                return False
+            raise
+
+    async def write_content(self, digest: str, size: int, chunks: AsyncIterator[bytes],
+                            labels: dict = None):
+        """Commit blob to containerd, another writer committing it first is fine"""
+        try:
+            await self.content_client.write('beiran-' + del_idpref(digest), digest, size,
+                                            chunks, labels)
+        except grpc.RpcError as err:
+            if err.code() != grpc.StatusCode.ALREADY_EXISTS: # pylint: disable=no-member
+                raise
+
+    async def write_layers(self, layers: List[Tuple[str, str, str]]) -> List[dict]:
+        """
+        Write layer files missing in containerd
+
+        Args:
+            layers (list): media type, digest and path of file of layers
+
+        Returns:
+            list: descriptors of layers
+        """
+        descriptors = []
+        for media_type, digest, path in layers:
+            size = os.path.getsize(path)
+            if await self.has_content(digest):
+                self.logger.debug("containerd already has layer %s", digest)
+            else:
+                self.logger.debug("writing layer %s to containerd", digest)
+                await self.write_content(digest, size, file_chunks(path, self.CHUNK_SIZE))
+            descriptors.append({'mediaType': media_type, 'size': size, 'digest': digest})
+        return descriptors
+
+    async def ingest_image(self, name: str, config_json_str: str, # pylint: disable=too-many-arguments
+                           layers: List[Tuple[str, str, str]], manifest: Blob = None,
+                           index: Blob = None) -> str:
+        """
+        Write image to containerd, as image `name`. The manifest it is pulled
+        with is written as registry serves it, so that the image keeps its
+        digest; it is rebuilt if some of its layers are not in cache as they
+        are in registry.
+
+        Args:
+            name (str): normalized reference, like docker.io/library/nginx:latest
+            config_json_str (str): image config
+            layers (list): media type, digest and path of file of layers, in order
+            manifest (tuple): manifest of image and its media type, as registry serves it
+            index (tuple): manifest list `manifest` is in, and its media type
+
+        Returns:
+            str: digest of target of image, manifest list or manifest
+        """
+        layer_descriptors = await self.write_layers(layers)
+
+        config = config_json_str.encode()
+        config_digest = 'sha256:' + hashlib.sha256(config).hexdigest()
+        await self.write_content(config_digest, len(config), bytes_chunks(config))
+
+        digests = [descriptor['digest'] for descriptor in layer_descriptors]
+        if manifest and [layer['digest'] for layer in
+                         json.loads(manifest[0].decode())['layers']] != digests:
+            self.logger.debug("layers of %s are not in cache as in registry, "
+                              "rebuilding its manifest", name)
+            manifest, index = None, None
+        if not manifest:
+            manifest = (json.dumps({
+                'schemaVersion': 2,
+                'mediaType': MEDIA_MANIFEST,
+                'config': {'mediaType': MEDIA_CONFIG, 'size': len(config),
+                           'digest': config_digest},
+                'layers': layer_descriptors
+            }).encode(), MEDIA_MANIFEST)
+
+        labels = {GC_LABEL_CONFIG: config_digest}
+        labels.update({GC_LABEL_LAYER % idx: digest for idx, digest in enumerate(digests)})
+        target = await self.write_blob(manifest, labels)
+
+        # other platforms of manifest list are left out, like containerd does
+        if index:
+            manifests = [descriptor['digest'] for descriptor in
+                         json.loads(index[0].decode())['manifests']]
+            target = await self.write_blob(index, {
+                GC_LABEL_MANIFEST % manifests.index(target.digest): target.digest
+            })
+
+        image = Image(name=name, target=target)
+        try:
+            await self.images_client.create_image(image)
+        except grpc.RpcError as err:
+            if err.code() != grpc.StatusCode.ALREADY_EXISTS: # pylint: disable=no-member
+                raise
+            await self.images_client.update_image(image)
+
+        self.logger.debug("image %s is written to containerd as %s", name, target.digest)
+        return target.digest
+
+    async def write_blob(self, blob: Blob, labels: dict) -> Descriptor:
+        """Commit manifest or manifest list to containerd"""
+        content, media_type = blob
+        digest = 'sha256:' + hashlib.sha256(content).hexdigest()
+        await self.write_content(digest, len(content), bytes_chunks(content), labels)
+        return Descriptor(media_type=media_type, digest=digest, size=len(content))
@@ -22,26 +22,58 @@
 client of Content
 """
 
+from typing import AsyncIterator
 import grpc
 
 from beiran_package_container.grpc.content_pb2_grpc import ContentStub
-# from beiran_interface_containerd.api_pb2 import ImageFilter, ImageSpec, AuthConfig
-# from beiran_interface_containerd.api_pb2 import ListImagesRequest, ImageStatusRequest, \
-#                                                 PullImageRequest, ImageFsInfoRequest
+from beiran_package_container.grpc.content_pb2 import InfoRequest, ReadContentRequest, \
+                                                    WriteContentRequest, COMMIT, WRITE
+from beiran_interface_containerd.services.images import CONTAINERD_NAMESPACE_KEY, \
+                                                        CONTAINERD_NAMESPACE_VALUE
 
 class ContentClient:
     """This client class communicates with ContentServicer"""
-    def __init__(self, channel: grpc.Channel):
+    def __init__(self, channel: grpc.aio.Channel):
         self.stub = ContentStub(channel)
+        self.namespace = (CONTAINERD_NAMESPACE_KEY, CONTAINERD_NAMESPACE_VALUE)
 
-    # async def list_images(self, image: str = None):
-    #     """Send ListImagesRequest to containerd"""
-    #     return self.stub.ListImages(
-    #         ListImagesRequest(
-    #             filter=ImageFilter(
-    #                 image=ImageSpec(
-    #                     image=image
-    #                 )
-    #             )
-    #         )
-    #     )
+    def set_namespace(self, namespace: str):
+        """Set new namespace"""
+        self.namespace = (CONTAINERD_NAMESPACE_KEY, namespace)
+
+    @property
+    def metadata(self) -> list:
+        """Create new metadata"""
+        return [self.namespace]
+
+    async def info(self, digest: str):
+        """Send InfoRequest to containerd"""
+        return await self.stub.Info(
+            InfoRequest(
+                digest=digest
+            ),
+            metadata=self.metadata
+        )
+
+    async def read(self, digest: str) -> bytes:
+        """Read whole blob of `digest` from containerd"""
+        chunks = []
+        async for response in self.stub.Read(ReadContentRequest(digest=digest),
+                                             metadata=self.metadata):
+            chunks.append(response.data)
+        return b''.join(chunks)
+
+    async def write(self, ref: str, digest: str, size: int, chunks: AsyncIterator[bytes],
+                    labels: dict = None):
+        """Write blob of `digest` from `chunks` under ingest `ref`, and commit it"""
+        async def requests():
+            offset = 0
+            async for chunk in chunks:
+                yield WriteContentRequest(action=WRITE, ref=ref, total=size, expected=digest,
+                                          offset=offset, data=chunk)
+                offset += len(chunk)
+            yield WriteContentRequest(action=COMMIT, ref=ref, total=size, expected=digest,
+                                      labels=labels)
+
+        async for _ in self.stub.Write(requests(), metadata=self.metadata):
+            pass
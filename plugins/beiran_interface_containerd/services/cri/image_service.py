@@ -31,7 +31,7 @@ from beiran_package_container.grpc.api_pb2 import ListImagesRequest, ImageStatus
 
 class ImageServiceClient:
     """This client class communicates with ImageServiceServicer"""
-    def __init__(self, channel: grpc.Channel):
+    def __init__(self, channel: grpc.aio.Channel):
         self.stub = ImageServiceStub(channel)
 
     async def get_all_image_datas(self):
@@ -59,7 +59,7 @@ class ImageServiceClient:
 
     async def list_images(self, image: str = None):
         """Send ListImagesRequest to containerd"""
-        return self.stub.ListImages(
+        return await self.stub.ListImages(
             ListImagesRequest(
                 filter=ImageFilter(
                     image=ImageSpec(
@@ -71,7 +71,7 @@ class ImageServiceClient:
 
     async def image_status(self, image: str, verbose: bool = True):
         """Send ImageStatusRequest to containerd"""
-        return self.stub.ImageStatus(
+        return await self.stub.ImageStatus(
             ImageStatusRequest(
                 image=ImageSpec(
                     image=image
@@ -82,7 +82,7 @@ class ImageServiceClient:
 
     async def pull_image(self, image: str, **kwargs):
         """Send PullImageRequest to containerd"""
-        return self.stub.PullImage(
+        return await self.stub.PullImage(
             PullImageRequest(
                 image=ImageSpec(
                     image=image
@@ -96,6 +96,6 @@ class ImageServiceClient:
 
     async def image_fs_info(self):
         """Send ImageFsInfoRequest to containerd"""
-        return self.stub.ImageFsInfo(
+        return await self.stub.ImageFsInfo(
             ImageFsInfoRequest()
         )
@@ -0,0 +1,62 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+client of Events
+"""
+
+from typing import List, Optional
+import grpc
+
+from beiran_package_container.grpc.events_pb2_grpc import EventsStub
+from beiran_package_container.grpc.events_pb2 import Envelope, SubscribeRequest
+from beiran_package_container.grpc.image_events_pb2 import ImageCreate, ImageUpdate, \
+                                                         ImageDelete
+from beiran_package_container.grpc.content_events_pb2 import ContentDelete
+
+# events by topic, and their field naming the image or content changed
+EVENT_TYPES = {
+    '/images/create': (ImageCreate, 'name'),
+    '/images/update': (ImageUpdate, 'name'),
+    '/images/delete': (ImageDelete, 'name'),
+    '/content/delete': (ContentDelete, 'digest'),
+}
+
+
+def event_subject(envelope: Envelope) -> Optional[str]:
+    """Name of image, or digest of content, the event is about; None for other events"""
+    if envelope.topic not in EVENT_TYPES:
+        return None
+    event_type, field = EVENT_TYPES[envelope.topic]
+    # containerd sends type urls without `type.googleapis.com/`, which Any.Unpack needs
+    if envelope.event.TypeName() != event_type.DESCRIPTOR.full_name:
+        return None
+    event = event_type.FromString(envelope.event.value)
+    return getattr(event, field) or None
+
+
+class EventsClient:
+    """This client class subscribes to EventsServicer"""
+    def __init__(self, channel: grpc.aio.Channel):
+        self.stub = EventsStub(channel)
+
+    def subscribe(self, filters: List[str] = None):
+        """Stream of envelopes of events matching any of `filters`"""
+        return self.stub.Subscribe(SubscribeRequest(filters=filters or []))
@@ -26,14 +26,15 @@ from typing import List
 import grpc
 
 from beiran_package_container.grpc.images_pb2_grpc import ImagesStub
-from beiran_package_container.grpc.images_pb2 import ListImagesRequest
+from beiran_package_container.grpc.images_pb2 import ListImagesRequest, CreateImageRequest, \
+                                                   UpdateImageRequest, Image
 
 CONTAINERD_NAMESPACE_KEY = 'containerd-namespace'
 CONTAINERD_NAMESPACE_VALUE = 'default'
 
 class ImagesClient:
     """This client class communicates with ImagesServicer"""
-    def __init__(self, channel: grpc.Channel):
+    def __init__(self, channel: grpc.aio.Channel):
         self.stub = ImagesStub(channel)
         self.namespace = (CONTAINERD_NAMESPACE_KEY, CONTAINERD_NAMESPACE_VALUE)
     
@@ -49,9 +50,27 @@ class ImagesClient:
 
     async def list_images(self, filters: List[str] = None):
         """Send ListImagesRequest to containerd"""
-        return self.stub.List(
+        return await self.stub.List(
             ListImagesRequest(
                 filters=filters
             ),
             metadata=self.metadata
         )
+
+    async def create_image(self, image: Image):
+        """Send CreateImageRequest to containerd"""
+        return await self.stub.Create(
+            CreateImageRequest(
+                image=image
+            ),
+            metadata=self.metadata
+        )
+
+    async def update_image(self, image: Image):
+        """Send UpdateImageRequest to containerd"""
+        return await self.stub.Update(
+            UpdateImageRequest(
+                image=image
+            ),
+            metadata=self.metadata
+        )
@@ -20,9 +20,9 @@
 
 """Docker API endpoints"""
 import os
-import random
 import re
 import json
+import time
 import asyncio
 import uuid
 import aiohttp
@@ -34,10 +34,20 @@ from peewee import SQL
 import aiodocker
 # from beiran.util import create_tar_archive
 from beiran.client import Client
-from beiran.models import Node
-from beiran.cmd_req_handler import RPCEndpoint, rpc
+from beiran.models import Node, Job
+from beiran.cmd_req_handler import RPCEndpoint, JSONEndpoint, rpc
+from beiran.daemon.common import UPLOADS, BANDWIDTH
+from beiran.daemon.peer import PEER_REGISTRY
+from beiran.daemon.jobs import ReportFunc
+from beiran.daemon.scoring import SCORES
+from beiran.ratelimit import PRIORITIES, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 from beiran.util import until_event
 from beiran_package_container.models import ContainerImage, ContainerLayer
+from beiran_interface_docker.jobs_api import pull_job
+
+# formats layers can be downloaded in by peers, see `LayerDownload.requested_format`
+LAYER_FORMATS = ('tar', 'gz')
+
 
 class Services:
     """These needs to be injected from the plugin init code"""
@@ -47,6 +57,52 @@ class Services:
     docker_util = None
     loop = None
     daemon = None
+    catalogs = None
+    availability = None
+    holders = None
+    layer_stats = None
+    replicator = None
+    containerd = None
+    prewarms = {} # type: dict
+
+
+def reject_upload(handler: web.RequestHandler, holders: list):
+    """
+    Reject an upload request since node is saturated, telling client when
+    to retry and which other nodes hold the object.
+    """
+    local_uuid = Services.local_node.uuid.hex # type: ignore
+    holders = SCORES.rank([uuid for uuid in holders if uuid != local_uuid])
+
+    handler.clear_header("Content-Type")
+    handler.set_status(503)
+    handler.set_header("Retry-After", str(UPLOADS.retry_after))
+    if holders:
+        handler.set_header("Beiran-Holders", ",".join(holders))
+    handler.finish()
+
+
+def upload_peer(handler: web.RequestHandler) -> str:
+    """
+    Peer an upload is for. Uuid told by client is trusted only if it is of a
+    known peer at the address request comes from, else the address is used.
+    """
+    remote_ip = handler.request.remote_ip
+    uuid_hex = handler.request.headers.get('Beiran-Node')
+    for peer in PEER_REGISTRY.values():
+        if not peer.local and peer.uuid == uuid_hex and \
+                remote_ip in (peer.node.ip_address, peer.node.ip_address_6):
+            return uuid_hex
+    return remote_ip
+
+
+def upload_transfer(handler: web.RequestHandler):
+    """
+    Bandwidth shaped transfer of an upload, with priority told by client. Peers
+    tell their uuid, which their per peer limit is kept by, like on their side.
+    """
+    priority = handler.request.headers.get('Beiran-Priority', PRIORITY_INTERACTIVE)
+    return BANDWIDTH['upload'].transfer(upload_peer(handler), priority)
 
 
 class ImagesTarHandler(web.RequestHandler):
@@ -60,24 +116,32 @@ class ImagesTarHandler(web.RequestHandler):
         """
             Get image as a tarball
         """
+        if not await UPLOADS.acquire():
+            reject_upload(self, await ContainerImage.get_available_nodes(image_identifier))
+            return
+
         try:
             # pylint: disable=no-member
             content = await Services.aiodocker.images.export_image(image_identifier) # type: ignore
             # pylint: enable=no-member
             self.set_header("Content-Type", "application/x-tar")
 
-            while True:
-                chunk = await content.read(65536)
-                if not chunk:
-                    break
-                self.write(chunk)
-                await self.flush()
+            with upload_transfer(self) as transfer:
+                while True:
+                    chunk = await content.read(65536)
+                    if not chunk:
+                        break
+                    await transfer.throttle(len(chunk))
+                    self.write(chunk)
+                    await self.flush()
             self.finish()
         except aiodocker.exceptions.DockerError as error:
             raise HTTPError(status_code=404, log_message=error.message)
         except Exception as error:
             Services.logger.error("Image Stream failed: %s", str(error)) # type: ignore
             raise HTTPError(status_code=500, log_message=str(error))
+        finally:
+            UPLOADS.release()
 
     async def head(self, image_identifier: str):
         """
@@ -198,12 +262,36 @@ class LayerDownload(web.RequestHandler):
 
         return layer.cache_path
 
+    def requested_format(self) -> str:
+        """Layer format asked by client with `?format=tar|gz`, tar by default"""
+        layer_format = self.get_argument('format', 'tar')
+        if layer_format not in LAYER_FORMATS:
+            raise HTTPError(status_code=400, log_message="Unknown layer format")
+        return layer_format
+
+    async def prepare_layer_file(self, layer_id: str) -> str:
+        """
+        Pick the file to serve for `layer_id` in requested format and set format headers.
+        Compressed layers are served as they are, without any work on our side, when they
+        exist in cache, tar archives otherwise.
+        """
+        if self.requested_format() == 'gz':
+            layer = ContainerLayer.select().where(ContainerLayer.digest == layer_id).first()
+            if layer and layer.cache_gz_path and os.path.exists(layer.cache_gz_path):
+                # a blob of its own, not a content encoding clients would undo
+                self.set_header("Content-Type", "application/gzip")
+                self.set_header("Beiran-Layer-Format", 'gz')
+                return layer.cache_gz_path
+
+        self.set_header("Beiran-Layer-Format", 'tar')
+        return await self.prepare_tar_archive(layer_id)
+
     # pylint: disable=arguments-differ
     async def head(self, layer_id: str):
         """Head response with actual Content-Lenght of layer"""
         self._set_headers(layer_id)
-        tar_path = await self.prepare_tar_archive(layer_id)
-        self.set_header("Content-Length", str(os.path.getsize(tar_path)))
+        path = await self.prepare_layer_file(layer_id)
+        self.set_header("Content-Length", str(os.path.getsize(path)))
         self.finish()
 
     # pylint: enable=arguments-differ
@@ -213,17 +301,40 @@ class LayerDownload(web.RequestHandler):
         """
         Get layer info by given layer_id
         """
-        self._set_headers(layer_id)
-        tar_path = await self.prepare_tar_archive(layer_id)
+        # replication traffic is not demand, do not count it
+        stats = Services.layer_stats
+        if self.request.headers.get('Beiran-Priority') == PRIORITY_BACKGROUND:
+            stats = None
+        if stats:
+            stats.requested(layer_id)
+
+        if not await UPLOADS.acquire():
+            if stats:
+                stats.rejected(layer_id)
+            layer = ContainerLayer.select().where(ContainerLayer.digest == layer_id).first()
+            reject_upload(self, layer.available_at if layer else [])
+            return
 
-        with open(tar_path, 'rb') as file:
-            while True:
-                data = file.read(51200)
-                if not data:
-                    break
-                self.write(data)
+        success = False
+        try:
+            self._set_headers(layer_id)
+            path = await self.prepare_layer_file(layer_id)
+
+            with open(path, 'rb') as file, upload_transfer(self) as transfer:
+                while True:
+                    data = file.read(51200)
+                    if not data:
+                        break
+                    await transfer.throttle(len(data))
+                    self.write(data)
+                    await self.flush()
 
-        self.finish()
+            self.finish()
+            success = True
+        finally:
+            UPLOADS.release()
+            if stats:
+                stats.finished(layer_id, success)
 
     # pylint: enable=arguments-differ
 
@@ -307,20 +418,36 @@ class ImageList(RPCEndpoint):
         force = bool('force' in body and body['force'])
         show_progress = bool('progress' in body and body['progress'])
         whole_image_only = bool('whole_image_only' in body and body['whole_image_only'])
+        priority = body.get('priority') or PRIORITY_INTERACTIVE
+        if priority not in PRIORITIES:
+            raise HTTPError(status_code=400, log_message='Unknown priority')
 
         if whole_image_only:
             await self.pull_routine(image_identifier, node_identifier,
-                                    self, wait, show_progress, force)
+                                    self, wait, show_progress, force, priority)
 
         else:
             # distributed layer-by-layer download
-            await self.pull_routine_distributed(image_identifier, self, wait, show_progress)
+            await pull_job(self, image_identifier, wait, show_progress, priority)
+
+    @staticmethod
+    async def run_pull_job(job: Job, report: ReportFunc):
+        """Run a distributed pull job, keeping id of the pulled image in its params"""
+        image_id = await ImageList.pull_routine_distributed(job.params['image'],
+                                                            priority=job.priority,
+                                                            on_progress=report)
+        job.params = {**job.params, 'image_id': image_id}
 
 
     @staticmethod
     async def pull_routine_distributed(tag_or_digest: str, rpc_endpoint: "RPCEndpoint" = None, # pylint: disable=too-many-locals,too-many-branches, too-many-statements
-                                       wait: bool = False, show_progress: bool = False) -> None:
-        """Coroutine to pull image (download distributed layers)
+                                       wait: bool = False, show_progress: bool = False,
+                                       priority: str = PRIORITY_INTERACTIVE,
+                                       on_progress: ReportFunc = None) -> str:
+        """Coroutine to pull image (download distributed layers), returns image id
+
+        Progress of each layer is written to `rpc_endpoint` if `show_progress`,
+        and reported to `on_progress` if given, as `on_progress(digest, update)`.
         """
         Services.logger.debug("Will fetch %s", tag_or_digest) # type: ignore
 
@@ -333,21 +460,49 @@ class ImageList(RPCEndpoint):
             rpc_endpoint.flush() # type: ignore
 
         jobid = uuid.uuid4().hex
-        Services.docker_util.container.create_emitter(jobid) # type: ignore
+        Services.docker_util.container.create_emitter(jobid, priority) # type: ignore
+        try:
+            return await ImageList._pull_layers(tag_or_digest, jobid, rpc_endpoint, wait,
+                                               show_progress, on_progress)
+        finally:
+            # forget download job, also when it fails
+            Services.docker_util.container.queues.pop(jobid, None) # type: ignore
+            Services.docker_util.container.priorities.pop(jobid, None) # type: ignore
+            Services.docker_util.container.emitters.pop(jobid, None) # type: ignore
 
+    @staticmethod
+    async def _pull_layers(tag_or_digest: str, jobid: str, # pylint: disable=too-many-arguments,too-many-locals
+                           rpc_endpoint: "RPCEndpoint" = None, wait: bool = False,
+                           show_progress: bool = False, on_progress: ReportFunc = None) -> str:
+        """Download layers of image as download job `jobid`, then load image to docker"""
         config_future = asyncio.ensure_future(
             Services.docker_util.docker_create_download_config( # type: ignore
                 tag_or_digest, jobid)
         )
-        await until_event(
+        started = asyncio.ensure_future(until_event(
             Services.docker_util.container.emitters[jobid], # type: ignore
             Services.docker_util.container.EVENT_START_LAYER_DOWNLOAD # type: ignore
-        )
+        ))
+        # do not wait for layer downloads forever if preparing them fails
+        await asyncio.wait([started, config_future], return_when=asyncio.FIRST_COMPLETED)
+        if not started.done():
+            started.cancel()
+            config_future.result()
 
         def format_progress(digest: str, status: str, progress: int = 100):
             """generate json dictionary for sending progress of layer downloading"""
             return '{"digest": "%s", "status": "%s", "progress": %d},' % (digest, status, progress)
 
+        def report(digest: str, status: str, progress: int = 100):
+            """report progress of layer downloading"""
+            if on_progress:
+                on_progress(digest, {"digest": digest, "status": status, "progress": progress})
+            if show_progress:
+                rpc_endpoint.write( # type: ignore
+                    format_progress(digest, status, progress)
+                )
+                rpc_endpoint.flush() # type: ignore
+
         async def send_progress(digest):
             """send progress of layer downloading"""
             progress = 0
@@ -356,11 +511,7 @@ class ImageList(RPCEndpoint):
             # if layer already exist
             status = Services.docker_util.container.queues[jobid][digest]['status']
             if status == Services.docker_util.container.DL_ALREADY:
-                if show_progress:
-                    rpc_endpoint.write( # type: ignore
-                        format_progress(digest, status)
-                    )
-                    rpc_endpoint.flush() # type: ignore
+                report(digest, status)
                 return
 
             while True:
@@ -375,11 +526,7 @@ class ImageList(RPCEndpoint):
                         last_size /
                         Services.docker_util.container.queues[jobid][digest]['size'] * 100
                     )
-                    if show_progress:
-                        rpc_endpoint.write( # type: ignore
-                            format_progress(digest, status, progress)
-                        )
-                        rpc_endpoint.flush() # type: ignore
+                    report(digest, status, progress)
                 else:
                     return
 
@@ -389,10 +536,15 @@ class ImageList(RPCEndpoint):
         ]
         pro_future = asyncio.gather(*pro_tasks)
 
-        await pro_future
-        config_json_str, image_id, _ = await config_future
-        del Services.docker_util.container.queues[jobid] # type: ignore
-
+        try:
+            await pro_future
+            config_json_str, image_id, repo_digest = await config_future
+        finally:
+            pro_future.cancel()
+            config_future.cancel()
+
+        if on_progress:
+            on_progress('done', {"digest": 'done', "status": 'done', "progress": 100})
         if show_progress:
             rpc_endpoint.write(format_progress('done', 'done')[:-1]) # type: ignore
             rpc_endpoint.flush() # type: ignore
@@ -402,10 +554,14 @@ class ImageList(RPCEndpoint):
         #     await Services.docker_util.docker_create_download_config(
         #         tag_or_digest) # type: ignore
 
-        tarball_path = await Services.docker_util.container.create_image_from_tar( # type: ignore
-            tag_or_digest, config_json_str, image_id)
-
-        await Services.docker_util.load_image(tarball_path) # type: ignore
+        if Services.containerd:
+            await Services.containerd.load_image( # type: ignore
+                tag_or_digest, config_json_str, repo_digest)
+        else:
+            container = Services.docker_util.container # type: ignore
+            tarball_path = await container.create_image_from_tar(tag_or_digest, config_json_str,
+                                                                 image_id)
+            await Services.docker_util.load_image(tarball_path) # type: ignore
 
         # # save repo_digest ?
         # image = ContainerImage.get().where(...)
@@ -420,27 +576,38 @@ class ImageList(RPCEndpoint):
             rpc_endpoint.write(']}') # type: ignore
             rpc_endpoint.finish() # type: ignore
 
+        return image_id
+
     @staticmethod
     async def pull_routine(image_identifier: str, node_identifier: str = None, # pylint: disable=too-many-arguments,too-many-locals,too-many-branches,too-many-statements
                            rpc_call: "RPCEndpoint" = None, wait: bool = False,
-                           show_progress: bool = False, force: bool = False) -> str:
+                           show_progress: bool = False, force: bool = False,
+                           priority: str = PRIORITY_INTERACTIVE) -> str:
         """Coroutine to pull image in cluster
         """
+        try:
+            image = ContainerImage.get_image_data(image_identifier)
+        except ContainerImage.DoesNotExist:
+            raise HTTPError(status_code=404, log_message='Image Not Found')
+
+        if not node_identifier:
+            # prefer the best scored node which holds the image right now
+            local_uuid = Services.local_node.uuid.hex # type: ignore
+            holders = await Services.holders.find('image', image_identifier) # type: ignore
+            holders = [h['uuid'] for h in holders if h['uuid'] != local_uuid]
+            if holders:
+                node_identifier = holders[0]
+
         if not node_identifier:
             available_nodes = await ContainerImage.get_available_nodes(image_identifier)
             online_nodes = Services.daemon.nodes.all_nodes.keys() # type: ignore
             online_availables = [n for n in available_nodes if n in online_nodes]
             if online_availables:
-                node_identifier = random.choice(online_availables)
+                node_identifier = SCORES.rank(online_availables, image.size)[0]
 
         if not node_identifier:
             raise HTTPError(status_code=404, log_message='Image is not available in cluster')
 
-        try:
-            image = ContainerImage.get_image_data(image_identifier)
-        except ContainerImage.DoesNotExist:
-            raise HTTPError(status_code=404, log_message='Image Not Found')
-
         uuid_pattern = re.compile(r'^([a-f0-9]+)$', re.IGNORECASE)
         Services.logger.debug("Will fetch %s from >>%s<<", # type: ignore
                               image_identifier, node_identifier)
@@ -513,15 +680,24 @@ class ImageList(RPCEndpoint):
             # pylint: enable=no-value-for-parameter,no-member
             docker_result = asyncio.ensure_future(docker_future)
 
-            image_response = await client.stream_image(image_identifier)
-            async for data in image_response.content.iter_chunked(64*1024):
-                # Services.logger.debug("Pull: Chunk received with length: %s", len(data))
-                chunks.put_nowait(data)
+            started = time.time()
+            received = 0
+            with BANDWIDTH['download'].transfer(node.uuid.hex, priority) as transfer:
+                image_response = await client.stream_image(
+                    image_identifier, headers={'Beiran-Priority': priority,
+                                               'Beiran-Node': Services.local_node.uuid.hex})
+                async for data in image_response.content.iter_chunked(64*1024):
+                    # Services.logger.debug("Pull: Chunk received with length: %s", len(data))
+                    await transfer.throttle(len(data))
+                    received += len(data)
+                    chunks.put_nowait(data)
 
             chunks.put_nowait(None)
+            SCORES.observe_transfer(node.uuid.hex, received, time.time() - started)
 
             await docker_result
         except Client.Error as error:
+            SCORES.observe_failure(node.uuid.hex)
             Services.logger.error(error) # type: ignore
             if wait:
                 raise HTTPError(status_code=500, log_message=str(error))
@@ -623,11 +799,182 @@ class LayerList(web.RequestHandler):
     # pylint: enable=arguments-differ
 
 
+class LayerStatsHandler(JSONEndpoint):
+    """Request counts of layers served by this node"""
+
+    def get(self):
+        """
+        Return request counts of layers, decaying by time, and layers which
+        are hot enough to be replicated to more nodes
+        """
+        replicator = Services.replicator
+        self.response = {
+            "layers": Services.layer_stats.to_dict(), # type: ignore
+            "hot": replicator.stats.hot(replicator.threshold), # type: ignore
+            "replicas": replicator.replicas, # type: ignore
+        }
+        self.write_json()
+        self.finish()
+
+
+class LayerReplicateHandler(JSONEndpoint):
+    """Download a hot layer asked by one of its holders"""
+
+    # pylint: disable=arguments-differ
+    def post(self, digest: str):
+        """
+        Start downloading layer from its holders with background priority,
+        and answer without waiting for it
+        """
+        layer = ContainerLayer.select().where(ContainerLayer.digest == digest).first()
+        if not layer:
+            raise HTTPError(status_code=404, log_message="Layer Not Found")
+
+        if Services.docker_util.local_layer(digest): # type: ignore
+            self.response = {"digest": digest, "replicating": False}
+        else:
+            Services.replicator.replicate(layer) # type: ignore
+            self.response = {"digest": digest, "replicating": True}
+            self.set_status(202)
+        self.write_json()
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+class CatalogTreeHandler(web.RequestHandler):
+    """Catalog hash tree of local node"""
+
+    def data_received(self, chunk):
+        pass
+
+    # pylint: disable=arguments-differ
+    def get(self, kind: str, prefix: str = ''):
+        """
+        Return a node of images or layers catalog hash tree,
+        see ``beiran.merkle.MerkleTree.node``
+        """
+        try:
+            self.write(Services.catalogs[kind].node(prefix or '')) # type: ignore
+        except KeyError:
+            raise HTTPError(status_code=404, log_message="Catalog tree node not found")
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+class CatalogEntries(JSONEndpoint):
+    """Catalog entries of local node"""
+
+    # pylint: disable=arguments-differ
+    def post(self):
+        """
+        Return images and layers of requested catalog keys, which are
+        available at local node.
+        """
+        image_ids = []
+        diff_ids = []
+        for key in self.json_data.get('keys', []):
+            kind, _, identifier = key.partition(':')
+            if kind == 'image':
+                image_ids.append(identifier)
+            elif kind == 'layer':
+                diff_ids.append(identifier)
+
+        available = SQL('available_at LIKE \'%%"%s"%%\'' % Services.local_node.uuid.hex)
+        self.response = {
+            "images": [image.to_dict(dialect="api") for image in
+                       ContainerImage.select().where(ContainerImage.hash_id.in_(image_ids))
+                       .where(available)],
+            "layers": [layer.to_dict(dialect="api") for layer in
+                       ContainerLayer.select().where(ContainerLayer.diff_id.in_(diff_ids))
+                       .where(available)],
+        }
+        self.write_json()
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+class HoldersHandler(web.RequestHandler):
+    """Nodes holding a layer or an image"""
+
+    def initialize(self, kind: str): # pylint: disable=arguments-differ
+        """Set kind of objects, `layer` or `image`"""
+        self.kind = kind # pylint: disable=attribute-defined-outside-init
+
+    def data_received(self, chunk):
+        pass
+
+    def has_local(self, identifier: str) -> bool:
+        """Does local node hold the object"""
+        local_uuid = Services.local_node.uuid.hex # type: ignore
+        if self.kind == 'image':
+            try:
+                image = ContainerImage.get_image_data(identifier)
+            except ContainerImage.DoesNotExist:
+                return False
+            return local_uuid in image.available_at
+
+        layers = ContainerLayer.select().where(ContainerLayer.digest == identifier) \
+                               .where(SQL('available_at LIKE \'%%"%s"%%\'' % local_uuid))
+        for layer in layers:
+            if layer.docker_path or any(path and os.path.exists(path) for path in
+                                        (layer.cache_path, layer.cache_gz_path)):
+                return True
+        return False
+
+    # pylint: disable=arguments-differ
+    async def get(self, identifier: str):
+        """
+        Return online nodes holding the object with their load and rtt, asking
+        peers in parallel. With `local=true` only answer for local node.
+        """
+        local = {
+            "uuid": Services.local_node.uuid.hex, # type: ignore
+            "has": self.has_local(identifier),
+            "load": UPLOADS.load
+        }
+        if self.get_argument('local', False) == 'true':
+            self.write(local)
+            self.finish()
+            return
+
+        refresh = self.get_argument('refresh', False) == 'true'
+        holders = await Services.holders.find(self.kind, identifier, # type: ignore
+                                              local=local, refresh=refresh)
+        self.write({"holders": holders})
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+class LayerFilterHandler(web.RequestHandler):
+    """Bloom filter of local layers"""
+
+    def data_received(self, chunk):
+        pass
+
+    # pylint: disable=arguments-differ
+    def get(self):
+        """
+        Return versioned bloom filter of digests of local layers. Filter
+        is omitted if `since` argument is its current version.
+        """
+        since = self.get_argument('since', None)
+        self.write(Services.availability.advertisement(since=since)) # type: ignore
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
 ROUTES = [
     (r'/docker/images', ImageList),
     (r'/docker/layers', LayerList),
+    (r'/docker/layers/filter', LayerFilterHandler),
+    (r'/docker/layers/stats', LayerStatsHandler),
+    (r'/docker/images/(.+)/holders', HoldersHandler, dict(kind='image')),
     (r'/docker/images/(.*(?<![/config|/info])$)', ImagesTarHandler),
     (r'/docker/images/(.*/info)', ImageInfoHandler),
     (r'/docker/images/(.*/config)', ImageConfigHandler),
+    (r'/docker/layers/([0-9a-fsh:]+)/holders', HoldersHandler, dict(kind='layer')),
+    (r'/docker/layers/([0-9a-fsh:]+)/replicate', LayerReplicateHandler),
     (r'/docker/layers/([0-9a-fsh:]+)', LayerDownload),
+    (r'/docker/catalog/(image|layer)s/tree/?([0-9a-z]*)', CatalogTreeHandler),
+    (r'/docker/catalog/entries', CatalogEntries),
 ]
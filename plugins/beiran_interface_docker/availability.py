@@ -0,0 +1,222 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Layer availability advertisement
+
+Instead of replicating `available_at` of every layer of every node, nodes
+advertise a bloom filter of digests of their layers. Filters point to the
+candidate holders of a layer, which are confirmed by asking the node
+before downloading.
+
+Alternatively, peers can be asked directly who holds a layer or an image
+right now, see `HolderQuery`.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from peewee import SQL
+
+from beiran.bloom import BloomFilter
+from beiran.client import Client
+from beiran.daemon.peer import PEER_REGISTRY
+from beiran.daemon.scoring import SCORES
+from beiran.lib import async_req
+from beiran.models import Node
+
+from beiran_package_container.models import ContainerLayer
+
+
+class LayerAvailability:
+    """Bloom filter of local layers and filters advertised by peers"""
+
+    CONFIRM_TIMEOUT = 5
+
+    def __init__(self, local_node: Node, error_rate: float = 0.01,
+                 logger: logging.Logger = None) -> None:
+        self.local_node = local_node
+        self.error_rate = error_rate
+        self.logger = logger if logger else logging.getLogger('beiran.docker.availability')
+        # hash of filter contents, so versions are not reused after a restart
+        self.version = None # type: Optional[str]
+        self._filter = None # type: Optional[BloomFilter]
+        self._dirty = True
+        self.peer_filters = {} # type: Dict[str, Tuple[str, BloomFilter]]
+
+    def invalidate(self):
+        """Local layers changed, rebuild filter when it is needed"""
+        self._dirty = True
+
+    def local_digests(self) -> Iterable[str]:
+        """Digests of layers available at local node"""
+        query = ContainerLayer.select(ContainerLayer.digest) \
+                              .where(ContainerLayer.digest.is_null(False)) \
+                              .where(SQL('available_at LIKE \'%%"%s"%%\'' %
+                                         self.local_node.uuid.hex))
+        return (layer.digest for layer in query)
+
+    @property
+    def filter(self) -> BloomFilter:
+        """Bloom filter of local layers"""
+        if self._dirty or not self._filter:
+            self._filter = BloomFilter.from_keys(self.local_digests(), self.error_rate)
+            serialized = json.dumps(self._filter.to_dict(), sort_keys=True)
+            self.version = hashlib.sha256(serialized.encode('utf-8')).hexdigest()[:16]
+            self._dirty = False
+        return self._filter
+
+    def advertisement(self, since: str = None) -> dict:
+        """Versioned filter of local layers, without filter if `since` is current version"""
+        bloom = self.filter
+        if since == self.version:
+            return {"version": self.version}
+        return {"version": self.version, "filter": bloom.to_dict()}
+
+    async def fetch_from_peer(self, peer):
+        """Fetch layer filter of peer unless we already have its current version"""
+        known_version, _ = self.peer_filters.get(peer.uuid, (None, None))
+        advertisement = await peer.client.get_layer_filter(since=known_version, timeout=10)
+        if 'filter' in advertisement:
+            self.peer_filters[peer.uuid] = (advertisement['version'],
+                                            BloomFilter.from_dict(advertisement['filter']))
+            self.logger.debug("received layer filter %s of %s",
+                              advertisement['version'], peer.uuid)
+
+    def forget(self, uuid_hex: str):
+        """Drop filter of a node which is not a peer anymore"""
+        self.peer_filters.pop(uuid_hex, None)
+
+    def candidates(self, digest: str, exclude: Iterable[str] = ()) -> List[str]:
+        """Nodes which probably have the layer"""
+        return [uuid_hex for uuid_hex, (_, bloom) in self.peer_filters.items()
+                if uuid_hex not in exclude and digest in bloom]
+
+    async def confirm(self, digest: str, node: Node) -> bool:
+        """Check if node really has the layer, without making it prepare the layer"""
+        url = node.url_without_uuid + '/docker/layers/' + digest + '/holders?local=true'
+        try:
+            resp, answer = await async_req(url=url, timeout=self.CONFIRM_TIMEOUT)
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as err:
+            self.logger.debug("cannot confirm layer %s at %s: %s", digest, node.uuid.hex, err)
+            return False
+        return resp.status == 200 and bool(answer.get('has'))
+
+
+class HolderQuery:
+    """
+    Ask peers in parallel which of them hold a layer or an image, with their
+    load and round trip times. Answers arriving after the deadline are
+    ignored, results are cached for a short time.
+    """
+
+    DEADLINE = 2.0
+    CACHE_TTL = 10.0
+    CACHE_SIZE = 1024
+
+    def __init__(self, local_node: Node, logger: logging.Logger = None) -> None:
+        self.local_node = local_node
+        self.logger = logger if logger else logging.getLogger('beiran.docker.availability')
+        # oldest first, so expired results are dropped from its head
+        self.cache = OrderedDict() # type: Dict[Tuple[str, str], Tuple[float, List[dict]]]
+
+    @staticmethod
+    def peers() -> list:
+        """Connected peers"""
+        return [peer for peer in PEER_REGISTRY.values() if not peer.local]
+
+    async def ask(self, peer, kind: str, identifier: str) -> Optional[dict]:
+        """Ask a peer if it holds the object, return its answer with rtt in ms"""
+        started = time.time()
+        try:
+            answer = await peer.client.get_holders(kind, identifier, local=True,
+                                                   timeout=self.DEADLINE)
+        except (Client.Error, aiohttp.ClientError, ValueError) as err:
+            self.logger.debug("holder query to %s failed: %s", peer.uuid, err)
+            SCORES.observe_failure(peer.uuid)
+            return None
+        answer['rtt'] = round((time.time() - started) * 1000)
+        SCORES.observe_rtt(peer.uuid, answer['rtt'])
+        SCORES.observe_load(peer.uuid, answer.get('load', 0))
+        return answer
+
+    async def find(self, kind: str, identifier: str, local: dict = None,
+                   refresh: bool = False) -> List[dict]:
+        """
+        Find holders of a layer or an image.
+
+        Args:
+            kind (str): `layer` or `image`
+            identifier (str): layer digest or image identifier
+            local (dict): answer of local node, included if it holds the object
+            refresh (bool): bypass the cache
+
+        Returns:
+            list: holders as dicts of `uuid`, `load` and `rtt`, the best
+            source first according to peer scores
+        """
+        key = (kind, identifier)
+        now = time.time()
+        if not refresh and key in self.cache and self.cache[key][0] > now:
+            return self.cache[key][1]
+
+        holders = []
+        if local and local.get('has'):
+            holders.append({"uuid": local['uuid'], "load": local['load'], "rtt": 0})
+
+        tasks = [asyncio.ensure_future(self.ask(peer, kind, identifier))
+                 for peer in self.peers()]
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self.DEADLINE)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                answer = task.result()
+                if answer and answer.get('has'):
+                    holders.append({"uuid": answer['uuid'], "load": answer.get('load', 0),
+                                    "rtt": answer['rtt']})
+
+        ranks = SCORES.rank([holder['uuid'] for holder in holders])
+        holders.sort(key=lambda holder: ranks.index(holder['uuid']))
+        self.keep(key, holders, now)
+        return holders
+
+    def keep(self, key: Tuple[str, str], holders: List[dict], now: float):
+        """Cache result of a query, dropping expired ones and the oldest beyond `CACHE_SIZE`"""
+        self.cache.pop(key, None)
+        for old_key in list(self.cache):
+            if self.cache[old_key][0] > now and len(self.cache) < self.CACHE_SIZE:
+                break
+            del self.cache[old_key]
+        self.cache[key] = (now + self.CACHE_TTL, holders)
+
+    def invalidate(self, kind: str = None, identifier: str = None):
+        """Drop cached results, all of them unless an object is given"""
+        if kind and identifier:
+            self.cache.pop((kind, identifier), None)
+        else:
+            self.cache = OrderedDict()
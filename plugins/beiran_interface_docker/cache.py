@@ -0,0 +1,193 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Cluster wide layer cache
+
+If enabled, every layer is assigned to `replicas` home nodes by rendezvous
+hashing of its digest over online nodes. Home nodes fetch the layers of the
+cluster they are home of, and keep them while other layers are evicted when the
+cache directory grows over its limit. A layer no node has yet is fetched
+from registry by its first home node, see `DockerUtil.origin_fetcher`.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from typing import List
+
+from peewee import SQL
+
+from beiran.daemon.common import DISK
+from beiran.daemon.placement import rendezvous
+from beiran.plugin import History
+
+from beiran_package_container.models import ContainerLayer
+from beiran_package_container.util import ContainerUtil
+
+
+class LayerCache:
+    """Placement of layers on home nodes and eviction of cached layers"""
+
+    # layers used more recently than this may be part of a pull, never evicted
+    EVICT_GRACE = 600
+
+    # layers fetched by a home node at most per round
+    FETCH_BATCH = 4
+
+    def __init__(self, util, replicas: int = 0, limit: int = 0, # pylint: disable=too-many-arguments
+                 interval: float = 60., history: History = None,
+                 logger: logging.Logger = None) -> None:
+        """
+        Args:
+            util (DockerUtil): docker utilities of plugin
+            replicas (int): number of home nodes of each layer, 0 disables home placement
+            limit (int): size limit of cached layers in bytes, 0 means unlimited
+            interval (float): seconds between rounds of fetching and evicting
+        """
+        self.util = util
+        self.replicas = max(int(replicas), 0)
+        self.limit = int(limit)
+        self.interval = float(interval)
+        self.history = history
+        self.logger = logger if logger else logging.getLogger('beiran.docker.cache')
+
+    @property
+    def local_uuid(self) -> str:
+        """uuid of local node"""
+        return self.util.local_node.uuid.hex
+
+    def home_nodes(self, digest: str) -> List[str]:
+        """Online nodes the layer is assigned to"""
+        nodes = list(self.util.online_peers()) + [self.local_uuid]
+        return rendezvous(digest, nodes)[:self.replicas]
+
+    def is_home(self, digest: str) -> bool:
+        """Is local node a home node of the layer"""
+        return self.local_uuid in self.home_nodes(digest)
+
+    def cached_layers(self) -> list:
+        """Local layers with files in cache directory"""
+        return list(ContainerLayer.select()
+                    .where(SQL('available_at LIKE \'%%"%s"%%\'' % self.local_uuid))
+                    .where(ContainerLayer.cache_path.is_null(False) |
+                           ContainerLayer.cache_gz_path.is_null(False)))
+
+    @staticmethod
+    def cache_files(layer: ContainerLayer) -> List[str]:
+        """Existing files of layer in cache directory"""
+        return [path for path in (layer.cache_path, layer.cache_gz_path)
+                if path and os.path.exists(path)]
+
+    def usage(self) -> int:
+        """Size of cached layers in bytes"""
+        return sum(os.path.getsize(path) for layer in self.cached_layers()
+                   for path in self.cache_files(layer))
+
+    async def fetch_home_layers(self) -> int:
+        """
+        Fetch layers of other nodes which local node is a home node of,
+        with background priority
+
+        Returns:
+            int: number of fetched layers
+        """
+        if not self.replicas:
+            return 0
+
+        online = self.util.online_peers()
+        fetched = 0
+        layers = ContainerLayer.select() \
+                               .where(ContainerLayer.digest.is_null(False)) \
+                               .where(SQL('available_at NOT LIKE \'%%"%s"%%\'' % self.local_uuid))
+        for layer in layers:
+            if fetched >= self.FETCH_BATCH or (self.limit and self.usage() >= self.limit):
+                break
+            if not any(uuid in online for uuid in layer.available_at):
+                continue
+            if not self.is_home(layer.digest):
+                continue
+            if await self.util.replicate_layer(layer):
+                fetched += 1
+
+        if fetched:
+            self.logger.debug("fetched %d layers local node is home of", fetched)
+            if self.history:
+                self.history.update('home_layers_fetched={}'.format(fetched))
+        return fetched
+
+    def evict(self) -> int:
+        """
+        Remove least recently used layers from cache directory until it fits in
+        the limit. Layers local node is a home node of are evicted last.
+
+        Returns:
+            int: number of evicted layers
+        """
+        if not self.limit:
+            return 0
+
+        usage = 0
+        candidates = []
+        now = time.time()
+        for layer in self.cached_layers():
+            stats = [os.stat(path) for path in self.cache_files(layer)]
+            size = sum(stat.st_size for stat in stats)
+            usage += size
+            used_at = max([max(stat.st_atime, stat.st_mtime) for stat in stats] or [0])
+            if now - used_at < self.EVICT_GRACE:
+                continue
+            home = bool(layer.digest) and self.is_home(layer.digest)
+            candidates.append((home, used_at, size, layer))
+
+        evicted = 0
+        for _, _, size, layer in sorted(candidates, key=lambda entry: entry[:2]):
+            if usage <= self.limit:
+                break
+            for path in self.cache_files(layer):
+                DISK.removed(path)
+                os.remove(path)
+            layer.cache_path = None
+            layer.cache_gz_path = None
+            # layers in docker storage are still served from there
+            if not layer.docker_path:
+                layer.unset_available_at(self.local_uuid)
+                if self.util.catalogs:
+                    self.util.catalogs['layer'].discard(ContainerUtil.layer_catalog_entry(layer)[0])
+            layer.save()
+            usage -= size
+            evicted += 1
+
+        if evicted:
+            self.logger.debug("evicted %d layers from cache, %d bytes are used", evicted, usage)
+            if self.history:
+                self.history.update('evicted_layers={}'.format(evicted))
+        return evicted
+
+    async def run(self):
+        """Fetch home layers and evict others periodically"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.fetch_home_layers()
+                self.evict()
+            except Exception as err: # pylint: disable=broad-except
+                self.logger.error("layer cache round failed: %s", err)
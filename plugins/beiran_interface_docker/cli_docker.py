@@ -23,6 +23,7 @@ Beiran Docker Plugin command line interface module
 """
 
 import asyncio
+import time
 # import progressbar
 import click
 from tabulate import tabulate
@@ -48,7 +49,7 @@ def cli():
 def image():
     """Manage Docker Images
 
-    List and pull docker images.
+    List, pull and pre-warm docker images.
     """
     pass
 
@@ -157,6 +158,53 @@ def image_pull(ctx, node: str, wait: bool, force: bool, progress: bool,
 # pylint: enable-msg=too-many-arguments
 
 
+@image.command('prewarm')
+@click.option('--node', 'nodes', multiple=True,
+              help='Pull on specific node, may be repeated; all online nodes if not given')
+@click.option('--selector', default=None,
+              help='Pull on nodes matching labels, such as zone=eu-1,rack=r1')
+@click.option('--deadline', default=None, type=int,
+              help='Give up pulls not finished in this many seconds')
+@click.option('--concurrency', default=2, type=int,
+              help='Number of nodes pulling at the same time')
+@click.option('--wait', 'wait', default=False, is_flag=True,
+              help='Wait for pulls and report progress')
+@click.argument('imagenames', nargs=-1, required=True)
+@click.pass_obj
+@pass_context
+# pylint: disable-msg=too-many-arguments
+def image_prewarm(ctx, nodes: tuple, selector: str, deadline: int, concurrency: int,
+                  wait: bool, imagenames: tuple):
+    """Pull container images on nodes of cluster in background"""
+
+    async def _prewarm():
+        """Start pre-warming, and follow its progress if asked"""
+        client = ctx.async_beiran_client
+        prewarm = await client.prewarm_images(
+            list(imagenames),
+            nodes=list(nodes) or None,
+            selector=selector,
+            deadline=time.time() + deadline if deadline else None,
+            concurrency=concurrency
+        )
+        click.echo('Pre-warming %s is started on %d node(s)' %
+                   (prewarm['id'], len(prewarm['nodes'])))
+        while wait and not prewarm['finished']:
+            await asyncio.sleep(2)
+            prewarm = await client.get_prewarms(prewarm['id'])
+            click.echo(', '.join('%s: %d' % item for item in sorted(prewarm['counts'].items())))
+        return prewarm
+
+    prewarm = asyncio.get_event_loop().run_until_complete(_prewarm())
+    if wait:
+        table = [[node, image, state['status'], state.get('error', '')]
+                 for node, images in prewarm['nodes'].items()
+                 for image, state in images.items()]
+        click.echo(tabulate(table, headers=["Node", "Image", "Status", "Error"]))
+
+# pylint: enable-msg=too-many-arguments
+
+
 @image.command('list')
 @click.option('--all', 'all_nodes', default=False, is_flag=True,
               help='List images from all known nodes')
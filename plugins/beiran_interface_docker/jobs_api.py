@@ -0,0 +1,88 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Image pulls queued as jobs
+
+Distributed pulls of images run as jobs of the daemon, see
+`beiran.daemon.jobs`. Requests to pull the same image share one job, and
+each of them follows its progress.
+"""
+
+import json
+
+from tornado.web import HTTPError
+
+from beiran.cmd_req_handler import RPCEndpoint
+from beiran.daemon.common import JOBS
+from beiran.models import Job
+from beiran.ratelimit import PRIORITY_INTERACTIVE
+from beiran_package_container.image_ref import normalize_ref, marshal_normalize_ref
+
+# kind of jobs pulling images layer by layer
+PULL_JOB = 'docker.pull'
+
+
+def submit_pull_job(image_identifier: str, priority: str = PRIORITY_INTERACTIVE) -> Job:
+    """Queue a distributed pull of image, requests of the same image share the job"""
+    ref = normalize_ref(image_identifier)
+    return JOBS.submit(PULL_JOB, marshal_normalize_ref(image_identifier),
+                       {'image': image_identifier}, priority=priority,
+                       registry=ref['domain'])
+
+
+async def pull_job(handler: RPCEndpoint, image_identifier: str, # pylint: disable=too-many-arguments
+                   wait: bool = False, show_progress: bool = False,
+                   priority: str = PRIORITY_INTERACTIVE):
+    """
+    Queue a distributed pull of image as a job, or join the unfinished one
+    of the same image, and answer as `pull_routine_distributed` does.
+    """
+    job = submit_pull_job(image_identifier, priority)
+
+    if not wait and not show_progress:
+        handler.write({'started': True, 'task': job.id})
+        handler.finish()
+        return
+
+    if show_progress:
+        handler.write('{"image":"%s","task":"%s","progress":[' % (image_identifier, job.id))
+        handler.flush()
+
+    separator = ''
+    task = None
+    async for event in JOBS.follow(job.id):
+        if event['type'] == 'status':
+            task = event['task']
+        elif show_progress:
+            handler.write(separator + json.dumps(event['update']))
+            handler.flush()
+            separator = ','
+
+    error = None
+    if task['status'] != Job.STATUS_DONE: # type: ignore
+        error = task['error'] or 'Pull is {}'.format(task['status']) # type: ignore
+
+    if show_progress:
+        handler.write('],"error":%s}' % json.dumps(error) if error else ']}')
+    elif error:
+        raise HTTPError(status_code=500, log_message=error)
+    else:
+        handler.write({'finished': True})
+    handler.finish()
@@ -24,21 +24,32 @@ Docker interface plugin
 
 import os
 import asyncio
+from functools import partial
 from aiodocker import Docker
 from aiodocker.exceptions import DockerError
 from peewee import SQL
 
 from beiran.plugin import BaseInterfacePlugin, History
 from beiran.models import Node
+from beiran.client import Client
+from beiran.merkle import MerkleTree
 from beiran.daemon.peer import Peer
+from beiran.daemon.common import JOBS, DISK
 
 from beiran_package_container.container import ContainerPackaging
 from beiran_package_container.util import ContainerUtil
 from beiran_package_container.image_ref import del_idpref
 from beiran_package_container.models import ContainerImage, ContainerLayer
 from beiran_interface_docker.util import DockerUtil
-from beiran_interface_docker.api import ROUTES
+from beiran_interface_docker.availability import LayerAvailability, HolderQuery
+from beiran_interface_docker.cache import LayerCache
+from beiran_interface_docker.replication import LayerStats, HotLayerReplicator
+from beiran_interface_docker.api import ROUTES, ImageList
 from beiran_interface_docker.api import Services as ApiDependencies
+from beiran_interface_docker.jobs_api import PULL_JOB
+from beiran_interface_docker.prewarm_api import PREWARM_ROUTES
+from beiran_interface_docker.registry import REGISTRY_ROUTES
+from beiran_interface_docker.relay_api import RELAY_ROUTES
 
 
 PLUGIN_NAME = 'docker'
@@ -50,9 +61,36 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
     """Docker support for Beiran"""
     DEFAULTS = {
         'storage': '/var/lib/docker',
-        'tar_split_path': os.path.dirname(__file__) + '/tar-split'
+        'tar_split_path': os.path.dirname(__file__) + '/tar-split',
+        # `replicate` keeps availability of layers of every node in db,
+        # `filter` keeps only bloom filters of layers advertised by peers
+        'availability_mode': 'replicate',
+        'filter_error_rate': 0.01,
+        # every layer is kept by this many home nodes of the cluster, which
+        # fetch it in background; 0 disables home placement
+        'home_replicas': 0,
+        # size limit of cached layers in bytes, layers of other home nodes
+        # are evicted first, 0 means unlimited
+        'cache_limit': 0,
+        'cache_interval': 60,
+        # layers requested this many times, halving each `hot_half_life`
+        # seconds, are replicated until `hot_replicas` online nodes have them
+        'hot_threshold': 10,
+        'hot_half_life': 3600,
+        'hot_replicas': 3,
+        'hot_interval': 60,
+        # after joining, fetch this many most requested layers of cluster,
+        # of this many bytes at most; 0 disables warming up
+        'warmup_layers': 0,
+        'warmup_budget': 2 * 1024 ** 3,
+        # `docker` loads pulled images into docker daemon, `containerd` writes
+        # them into content store of containerd, needs containerd interface
+        'pull_into': 'docker',
     }
 
+    # seconds to wait after first peer joins, so others join too before warming up
+    WARMUP_DELAY = 10
+
     # def __init__(self, plugin_config: dict) -> None:
     #     super().__init__(plugin_config)
 
@@ -62,9 +100,37 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
                                logger=self.log, local_node=self.node,
                                tar_split_path=self.config['tar_split_path'])
         self.probe_task = None
-        self.api_routes = ROUTES
+        self.api_routes = ROUTES + RELAY_ROUTES + PREWARM_ROUTES + REGISTRY_ROUTES
         self.history = History() # type: History
         self.last_error = None
+        self.catalogs = {'image': MerkleTree(), 'layer': MerkleTree()}
+        self.availability = LayerAvailability(self.node, logger=self.log,
+                                              error_rate=float(self.config['filter_error_rate']))
+        self.util.availability = self.availability
+        self.holders = HolderQuery(self.node, logger=self.log)
+        self.util.holders = self.holders
+        self.util.catalogs = self.catalogs
+        self.cache = LayerCache(self.util, replicas=int(self.config['home_replicas']),
+                                limit=int(self.config['cache_limit']),
+                                interval=float(self.config['cache_interval']),
+                                history=self.history, logger=self.log)
+        self.cache_task = None
+        self.layer_stats = LayerStats(half_life=float(self.config['hot_half_life']))
+        self.replicator = HotLayerReplicator(self.util, self.layer_stats,
+                                             replicas=int(self.config['hot_replicas']),
+                                             threshold=float(self.config['hot_threshold']),
+                                             interval=float(self.config['hot_interval']),
+                                             history=self.history, logger=self.log)
+        self.replicator_task = None
+        self.warmup_task = None
+        self.history.on('update', lambda update: self.availability.invalidate())
+        DISK.add_store('docker', self.config['storage'])
+        # only images pulled or removed change the store much, tags and caches do not
+        self.on('docker_daemon.new_image_saved', lambda image_id: DISK.changed('docker'))
+        self.on('docker_daemon.existing_image_deleted', lambda image_id: DISK.changed('docker'))
+        self.config['events'].on('node.removed',
+                                 lambda node: self.availability.forget(node.uuid.hex))
+        self.config['events'].on('node.added', self.on_node_added)
 
         ApiDependencies.aiodocker = self.aiodocker
         ApiDependencies.logger = self.log
@@ -72,10 +138,21 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
         ApiDependencies.local_node = self.node
         ApiDependencies.loop = self.loop
         ApiDependencies.daemon = self.daemon
+        ApiDependencies.catalogs = self.catalogs
+        ApiDependencies.availability = self.availability
+        ApiDependencies.holders = self.holders
+        ApiDependencies.layer_stats = self.layer_stats
+        ApiDependencies.replicator = self.replicator
+        JOBS.register(PULL_JOB, ImageList.run_pull_job)
 
     async def load_depend_plugin_instances(self, instances: list) -> None:
         """Load instances of plugins that has dependencies on this plugin"""
         self.util.container = instances['package:container'] # type: ignore
+        if self.config['pull_into'] == 'containerd':
+            ApiDependencies.containerd = instances.get('interface:containerd') # type: ignore
+            if not ApiDependencies.containerd:
+                self.log.warning("containerd interface is not loaded, "
+                                 "pulled images are loaded into docker")
 
     async def start(self):
         self.log.debug("starting docker plugin")
@@ -84,6 +161,9 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
         # background, we have no rush and it will run
         # forever anyway
         self.probe_task = self.loop.create_task(self.probe_daemon())
+        if self.cache.replicas or self.cache.limit:
+            self.cache_task = self.loop.create_task(self.cache.run())
+        self.replicator_task = self.loop.create_task(self.replicator.run())
 
         self.on('docker_daemon.new_image', self.new_image_saved)
         self.on('docker_daemon.existing_image_deleted', self.existing_image_deleted)
@@ -91,12 +171,98 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
     async def stop(self):
         if self.probe_task:
             self.probe_task.cancel()
+        if self.cache_task:
+            self.cache_task.cancel()
+        if self.replicator_task:
+            self.replicator_task.cancel()
+        if self.warmup_task:
+            self.warmup_task.cancel()
+
+    async def on_node_added(self, node: Node): # pylint: disable=unused-argument
+        """Warm up once, when first peer is added after local node joins"""
+        if int(self.config['warmup_layers']) and not self.warmup_task:
+            self.warmup_task = self.loop.create_task(self.warm_up())
+
+    async def warm_up(self):
+        """Fetch most requested layers of cluster"""
+        await asyncio.sleep(self.WARMUP_DELAY)
+        try:
+            await self.replicator.warm_up(int(self.config['warmup_layers']),
+                                          int(self.config['warmup_budget']))
+        except Exception as err:  # pylint: disable=broad-except
+            self.log.error("warming up failed: %s", err)
+
+    @property
+    def replicate_layers(self) -> bool:
+        """Do we keep availability of layers of other nodes in db"""
+        return self.config['availability_mode'] != 'filter'
 
     async def sync(self, peer: Peer):
+        # compare catalog trees of peer with what we know about it,
+        # and fetch only the differences
+        changed = {} # type: dict
+        removed = [] # type: list
+        for kind in ('image', 'layer') if self.replicate_layers else ('image',):
+            known = MerkleTree()
+            known.reset(ContainerUtil.catalog_entries(peer.node.uuid.hex, kind))
+            try:
+                kind_changed, kind_removed = await known.diff(
+                    partial(peer.client.get_catalog_tree, kind, timeout=10))
+            except Client.HTTPError as err:
+                if err.status != 404:
+                    raise
+                self.log.debug("peer does not serve catalog tree, fetching whole catalog")
+                await self.full_sync(peer)
+                return
+            changed.update(kind_changed)
+            removed.extend(kind_removed)
+
+        if not self.replicate_layers:
+            await self.availability.fetch_from_peer(peer)
+
+        self.log.debug("catalog of peer differs by %d new, %d removed entries",
+                       len(changed), len(removed))
+        if changed:
+            await self.fetch_catalog_entries_from_peer(peer, list(changed))
+        if removed:
+            await self.remove_catalog_entries_of_node(removed, peer.node)
+
+    async def full_sync(self, peer: Peer):
+        """Replace everything we know about peer with its whole catalog"""
         await ContainerUtil.reset_info_of_node(peer.node.uuid.hex)
 
         await self.util.container.fetch_images_from_peer(peer)
-        await self.fetch_layers_from_peer(peer)
+        if self.replicate_layers:
+            await self.fetch_layers_from_peer(peer)
+
+    async def fetch_catalog_entries_from_peer(self, peer: Peer, keys: list):
+        """fetch images and layers of catalog keys from the node and update local db"""
+        entries = await peer.client.get_catalog_entries(keys, timeout=30)
+
+        for image_data in entries.get('images', []):
+            image_data.pop('id', None)
+            image = ContainerImage.from_dict(image_data)
+            await self.util.container.save_image_at_node(image, peer.node)
+
+        for layer_data in entries.get('layers', []):
+            layer_data.pop('id', None)
+            layer = ContainerLayer.from_dict(layer_data)
+            await self.save_layer_at_node(layer, peer.node)
+
+    @staticmethod
+    async def remove_catalog_entries_of_node(keys: list, node: Node):
+        """unset availability of images and layers of catalog keys at node"""
+        image_ids = [key[len('image:'):] for key in keys if key.startswith('image:')]
+        diff_ids = [key[len('layer:'):] for key in keys if key.startswith('layer:')]
+
+        for image in ContainerImage.select().where(ContainerImage.hash_id.in_(image_ids)):
+            image.unset_available_at(node.uuid.hex)
+            image.save()
+        for layer in ContainerLayer.select().where(ContainerLayer.diff_id.in_(diff_ids)):
+            layer.unset_available_at(node.uuid.hex)
+            layer.save()
+
+        await ContainerUtil.delete_unavailable_objects()
 
     async def save_layer_at_node(self, layer: ContainerLayer, node: Node):
         """Save a layer from a node into db"""
@@ -202,6 +368,8 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
             # This will be converted to something like
             #   daemon.plugins['docker'].setReady(true)
             # in the future; will we in docker plugin code.
+            for kind, catalog in self.catalogs.items():
+                catalog.reset(ContainerUtil.catalog_entries(self.node.uuid.hex, kind))
             self.history.update('init')
             self.status = 'ready'
 
@@ -273,6 +441,7 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
         # image_data = await self.aiodocker.images.get(name=image_id)
         image = ContainerImage.get(ContainerImage.hash_id == image_id)
         image.unset_available_at(self.node.uuid.hex)
+        self.catalogs['image'].discard(ContainerUtil.image_catalog_entry(image)[0])
 
         await self.unset_local_layers(image.layers, image_id)
 
@@ -297,6 +466,7 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
             if not layer.local_image_refs:
                 layer.unset_available_at(self.node.uuid.hex)
                 layer.docker_path = None
+                self.catalogs['layer'].discard(ContainerUtil.layer_catalog_entry(layer)[0])
             layer.save()
 
     async def save_image(self, id_or_tag: str, skip_updates: bool = False,
@@ -347,12 +517,24 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
 
         image.save(force_insert=not image_exists_in_db)
 
+        self.catalogs['image'].set(*ContainerUtil.image_catalog_entry(image))
+        for layer in layers:
+            if self.node.uuid.hex in layer.available_at:
+                self.catalogs['layer'].set(*ContainerUtil.layer_catalog_entry(layer))
+
         if not skip_updates:
             self.history.update('new_image={}'.format(image.hash_id))
         self.emit('docker_daemon.new_image_saved', image.hash_id)
 
         if image_data['RepoTags']:
-            await ContainerPackaging.tag_image(id_or_tag, image_data['RepoTags'][0])
+            retagged = await ContainerPackaging.tag_image(id_or_tag, image_data['RepoTags'][0])
+            self.update_image_catalog(retagged)
+
+    def update_image_catalog(self, images: list):
+        """Update catalog entries of images with changed tags, which are available locally"""
+        for image in images:
+            if self.node.uuid.hex in image.available_at:
+                self.catalogs['image'].set(*ContainerUtil.image_catalog_entry(image))
 
     async def untag_image(self, image_identifier: str):
         """
@@ -364,6 +546,8 @@ class DockerInterface(BaseInterfacePlugin):  # pylint: disable=too-many-instance
             image = ContainerImage.get(ContainerImage.hash_id == image_data['Id'])
             image.tags = image_data['RepoTags']
             image.save()
+            self.update_image_catalog([image])
+            self.history.update('untagged_image={}'.format(image.hash_id))
         except DockerError:
             # if the image was deleted by `docker rmi`, no image information was found
             pass
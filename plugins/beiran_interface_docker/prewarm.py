@@ -0,0 +1,161 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Pre-warming images on nodes of cluster
+
+A node coordinates pulling a list of images on a set of nodes before a
+deadline, with a bounded number of nodes pulling at the same time.
+"""
+
+import asyncio
+import time
+import uuid
+
+from typing import Any, Awaitable, Callable, Dict, List
+
+from beiran.models import Node
+
+
+PullFunc = Callable[[str, str], Awaitable[Any]]
+
+
+def parse_selector(selector: str) -> Dict[str, str]:
+    """
+    Parse a label selector like `zone=eu-1,architecture=x86_64`
+
+    Raises:
+        ValueError: if a term is not `key=value`
+    """
+    labels = {}
+    for term in filter(None, (term.strip() for term in (selector or '').split(','))):
+        key, sep, value = term.partition('=')
+        if not sep or not key.strip():
+            raise ValueError("invalid selector term `{}`".format(term))
+        labels[key.strip()] = value.strip()
+    return labels
+
+
+def select_nodes(nodes: List[Node], selector: str) -> List[Node]:
+    """Nodes whose attributes match all labels of selector"""
+    labels = parse_selector(selector)
+    selected = []
+    for node in nodes:
+        attributes = node.to_dict()
+        if all(str(attributes.get(key)) == value for key, value in labels.items()):
+            selected.append(node)
+    return selected
+
+
+class Prewarm:
+    """Pulling images on nodes before a deadline"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_PULLING = 'pulling'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_EXPIRED = 'expired'
+
+    def __init__(self, images: List[str], nodes: List[str], pull: PullFunc, # pylint: disable=too-many-arguments
+                 deadline: float = None, concurrency: int = 2) -> None:
+        """
+        Args:
+            images (list): image references to pull
+            nodes (list): uuids of nodes to pull images on
+            pull (PullFunc): coroutine function pulling an image on a node,
+                called as `pull(node_uuid, image)`
+            deadline (float): unix time to give up pulls which are not finished
+            concurrency (int): number of nodes pulling at the same time
+        """
+        self.id = uuid.uuid4().hex # pylint: disable=invalid-name
+        self.images = images
+        self.nodes = nodes
+        self.pull = pull
+        self.deadline = deadline
+        self.concurrency = max(int(concurrency), 1)
+        self.started_at = time.time()
+        self.finished_at = None # type: float
+        self.states = {node: {image: {'status': self.STATUS_PENDING} for image in images}
+                       for node in nodes} # type: Dict[str, Dict[str, dict]]
+        self.task = None # type: asyncio.Future
+
+    @property
+    def finished(self) -> bool:
+        """Are all pulls done, failed or expired"""
+        return self.finished_at is not None
+
+    def start(self) -> asyncio.Future:
+        """Start pulling in background"""
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    async def run(self):
+        """Pull images on nodes, `concurrency` nodes at a time"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(node: str):
+            """pull images on node one by one"""
+            async with semaphore:
+                for image in self.images:
+                    await self.pull_on(node, image)
+
+        try:
+            await asyncio.gather(*[warm(node) for node in self.nodes])
+        finally:
+            self.finished_at = time.time()
+
+    async def pull_on(self, node: str, image: str):
+        """Pull an image on a node, recording its state"""
+        state = self.states[node][image]
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline - time.time()
+            if timeout <= 0:
+                state['status'] = self.STATUS_EXPIRED
+                return
+
+        state['status'] = self.STATUS_PULLING
+        state['started_at'] = time.time()
+        try:
+            await asyncio.wait_for(self.pull(node, image), timeout)
+            state['status'] = self.STATUS_DONE
+        except asyncio.TimeoutError:
+            state['status'] = self.STATUS_EXPIRED
+        except Exception as err: # pylint: disable=broad-except
+            state['status'] = self.STATUS_FAILED
+            state['error'] = str(err)
+        state['finished_at'] = time.time()
+
+    def to_dict(self) -> dict:
+        """Progress of pulls"""
+        counts = {} # type: Dict[str, int]
+        for images in self.states.values():
+            for state in images.values():
+                counts[state['status']] = counts.get(state['status'], 0) + 1
+        return {
+            'id': self.id,
+            'images': self.images,
+            'deadline': self.deadline,
+            'concurrency': self.concurrency,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'finished': self.finished,
+            'counts': counts,
+            'nodes': self.states,
+        }
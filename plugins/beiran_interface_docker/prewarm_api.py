@@ -0,0 +1,116 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Pre-warming endpoints, see `beiran_interface_docker.prewarm`
+"""
+
+from tornado.web import HTTPError
+
+from beiran.client import Client
+from beiran.cmd_req_handler import JSONEndpoint
+from beiran.daemon.common import JOBS
+from beiran.models import Job
+from beiran.ratelimit import PRIORITY_BACKGROUND
+from beiran_interface_docker.api import Services
+from beiran_interface_docker.jobs_api import submit_pull_job
+from beiran_interface_docker.prewarm import Prewarm, select_nodes
+
+
+class PrewarmHandler(JSONEndpoint):
+    """Image pre-warming coordinated by this node"""
+
+    # pylint: disable=arguments-differ
+    def get(self, prewarm_id: str = None):
+        """Return progress of a pre-warming, or of all of them"""
+        if prewarm_id:
+            if prewarm_id not in Services.prewarms:
+                raise HTTPError(status_code=404, log_message="Pre-warming Not Found")
+            self.response = Services.prewarms[prewarm_id].to_dict()
+        else:
+            self.response = {"prewarms": [prewarm.to_dict()
+                                          for prewarm in Services.prewarms.values()]}
+        self.write_json()
+        self.finish()
+
+    def post(self, prewarm_id: str = None):
+        """Pull images on a set of nodes in background, before a deadline"""
+        if prewarm_id:
+            raise HTTPError(status_code=405, log_message="Pre-warming exists")
+
+        images = self.json_data.get('images') or []
+        if not images or not all(isinstance(image, str) for image in images):
+            raise HTTPError(status_code=400, log_message='Images are not given')
+
+        local_node = Services.local_node
+        nodes = {peer.uuid: peer.node
+                 for peer in Services.docker_util.online_peers().values()} # type: ignore
+        nodes[local_node.uuid.hex] = local_node # type: ignore
+
+        targets = self.json_data.get('nodes') or list(nodes)
+        unknown = [node for node in targets if node not in nodes]
+        if unknown:
+            raise HTTPError(status_code=400,
+                            log_message='Nodes are not online: {}'.format(', '.join(unknown)))
+        try:
+            targets = [node.uuid.hex for node in
+                       select_nodes([nodes[node] for node in targets],
+                                    self.json_data.get('selector'))]
+        except ValueError as error:
+            raise HTTPError(status_code=400, log_message=str(error))
+        if not targets:
+            raise HTTPError(status_code=400, log_message='No node matches the selector')
+
+        deadline = self.json_data.get('deadline')
+        prewarm = Prewarm(images, targets, self.pull,
+                          deadline=float(deadline) if deadline else None,
+                          concurrency=int(self.json_data.get('concurrency') or 2))
+
+        # forget finished ones, except the latest
+        for old_id, old in list(Services.prewarms.items())[:-10]:
+            if old.finished:
+                del Services.prewarms[old_id]
+        Services.prewarms[prewarm.id] = prewarm
+        prewarm.start()
+
+        self.response = prewarm.to_dict()
+        self.write_json()
+        self.finish()
+    # pylint: enable=arguments-differ
+
+    @staticmethod
+    async def pull(node_uuid: str, image: str):
+        """Pull image on a node with background priority"""
+        if node_uuid == Services.local_node.uuid.hex: # type: ignore
+            job = submit_pull_job(image, PRIORITY_BACKGROUND)
+            job = await JOBS.wait(job.id)
+            if job.status != Job.STATUS_DONE:
+                raise RuntimeError(job.error or 'Pull is {}'.format(job.status))
+            return
+
+        peer = Services.docker_util.online_peers().get(node_uuid) # type: ignore
+        if not peer:
+            raise Client.Error("Node {} is not online".format(node_uuid))
+        await peer.client.pull_image(image, wait=True, priority=PRIORITY_BACKGROUND,
+                                     raise_error=True)
+
+
+PREWARM_ROUTES = [
+    (r'/docker/prewarm/?([0-9a-f]*)', PrewarmHandler),
+]
@@ -0,0 +1,235 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Read-only Docker Registry HTTP API V2
+
+Docker (as one of `registry-mirrors`) and containerd (as a mirror host) can
+pull images from beirand natively, skipping layers they already have.
+Manifests and image configs come from origin registry. Layers come from the
+cache directory, or are fetched through the cluster like relayed layers,
+and kept in cache for next pulls.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Tuple
+
+import aiohttp
+from tornado import web
+from tornado.web import HTTPError
+
+from beiran_package_container.image_ref import DEFAULT_DOMAIN, DEFAULT_INDEX_DOMAIN
+from beiran_package_container.util import BlobCache
+from beiran_interface_docker.api import Services
+from beiran_interface_docker.relay import OriginFetch
+
+
+MANIFEST_TYPES = [
+    "application/vnd.docker.distribution.manifest.v2+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.v1+prettyjws",
+]
+
+
+BLOBS = BlobCache()
+
+# digests of configs in served manifests, they are not layers
+CONFIGS = set() # type: set
+
+
+def origin_ref(handler: web.RequestHandler, name: str) -> dict:
+    """
+    Registry of repository `name`. containerd tells the registry it mirrors
+    with `ns` argument, docker mirrors only Docker Hub.
+    """
+    namespace = handler.get_argument('ns', None)
+    if not namespace or namespace == DEFAULT_DOMAIN:
+        namespace = DEFAULT_INDEX_DOMAIN
+    return {'domain': namespace, 'repo': name}
+
+
+class RegistryHandler(web.RequestHandler):
+    """Base of registry endpoints, speaking registry errors"""
+
+    # registry error code of 404 responses
+    UNKNOWN_CODE = 'NAME_UNKNOWN'
+
+    def data_received(self, chunk):
+        pass
+
+    def set_default_headers(self):
+        self.set_header("Docker-Distribution-Api-Version", "registry/2.0")
+
+    def write_error(self, status_code: int, **kwargs):
+        message = self._reason
+        if 'exc_info' in kwargs and isinstance(kwargs['exc_info'][1], HTTPError):
+            message = kwargs['exc_info'][1].log_message or message
+        code = self.UNKNOWN_CODE if status_code == 404 else 'UNAVAILABLE'
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps({"errors": [{"code": code, "message": message}]}))
+
+
+class RegistryRoot(RegistryHandler):
+    """API version check"""
+
+    def get(self):  # pylint: disable=arguments-differ
+        """Answer registry clients that v2 API is supported"""
+        self.set_header("Content-Type", "application/json")
+        self.finish('{}')
+
+
+class ManifestHandler(RegistryHandler):
+    """Manifests of images, proxied from origin"""
+
+    UNKNOWN_CODE = 'MANIFEST_UNKNOWN'
+
+    async def load(self, name: str, reference: str) -> Tuple[bytes, str, str]:
+        """
+        Returns:
+            (bytes, str, str): manifest, its media type and digest
+        """
+        cached = BLOBS.get(reference)
+        if cached:
+            return cached[0], cached[1], reference
+
+        ref = origin_ref(self, name)
+        accept = self.request.headers.get('Accept') or ', '.join(MANIFEST_TYPES)
+        container = Services.docker_util.container # type: ignore
+        try:
+            manifest, media_type = await container.fetch_image_manifest_raw(
+                ref['domain'], ref['repo'], reference, accept)
+        except container.FetchManifestFailed as error:
+            raise HTTPError(status_code=404, log_message=str(error))
+        except (container.AuthenticationFailed, aiohttp.ClientError,
+                asyncio.TimeoutError) as error:
+            raise HTTPError(status_code=502, log_message=str(error))
+
+        digest = 'sha256:' + hashlib.sha256(manifest).hexdigest()
+        BLOBS.set(digest, manifest, media_type)
+        try:
+            CONFIGS.add(json.loads(manifest.decode('utf-8'))['config']['digest'])
+        except (ValueError, KeyError, TypeError):
+            # manifest lists and schema v1 manifests have no config
+            pass
+        return manifest, media_type, digest
+
+    async def prepare_manifest(self, name: str, reference: str) -> bytes:
+        """Load manifest and set its headers"""
+        manifest, media_type, digest = await self.load(name, reference)
+        self.set_header("Content-Type", media_type)
+        self.set_header("Content-Length", str(len(manifest)))
+        self.set_header("Docker-Content-Digest", digest)
+        self.set_header("Etag", '"{}"'.format(digest))
+        return manifest
+
+    # pylint: disable=arguments-differ
+    async def head(self, name: str, reference: str):
+        """Headers of manifest of `name` by tag or digest"""
+        await self.prepare_manifest(name, reference)
+        self.finish()
+
+    async def get(self, name: str, reference: str):
+        """Manifest of `name` by tag or digest"""
+        self.finish(await self.prepare_manifest(name, reference))
+    # pylint: enable=arguments-differ
+
+
+class BlobHandler(RegistryHandler):
+    """Layers and image configs"""
+
+    UNKNOWN_CODE = 'BLOB_UNKNOWN'
+
+    def _set_blob_headers(self, digest: str, size: int = None):
+        self.set_header("Content-Type", "application/octet-stream")
+        self.set_header("Docker-Content-Digest", digest)
+        self.set_header("Etag", '"{}"'.format(digest))
+        self.set_header("Cache-Control", "max-age=31536000")
+        if size is not None:
+            self.set_header("Content-Length", str(size))
+
+    async def load_config(self, name: str, digest: str) -> bytes:
+        """Image config from origin registry"""
+        cached = BLOBS.get(digest)
+        if cached:
+            return cached[0]
+
+        ref = origin_ref(self, name)
+        container = Services.docker_util.container # type: ignore
+        try:
+            config = await container.download_config_from_origin(ref['domain'], ref['repo'],
+                                                                  digest)
+        except container.ConfigDownloadFailed as error:
+            raise HTTPError(status_code=404, log_message=str(error))
+        except (container.AuthenticationFailed, aiohttp.ClientError,
+                asyncio.TimeoutError) as error:
+            raise HTTPError(status_code=502, log_message=str(error))
+        content = config.encode('utf-8')
+        BLOBS.set(digest, content, "application/octet-stream")
+        return content
+
+    async def layer_fetch(self, name: str, digest: str) -> OriginFetch:
+        """Layer from cache directory, or being fetched through cluster"""
+        layer = Services.docker_util.local_layer(digest) # type: ignore
+        if layer and layer.cache_gz_path and os.path.exists(layer.cache_gz_path):
+            fetch = OriginFetch.complete(layer.cache_gz_path)
+        else:
+            # layers only in docker storage can not be compressed to the same digest
+            fetch = Services.docker_util.origin_fetch(origin_ref(self, name), digest) # type: ignore
+        if not await fetch.wait_started():
+            raise HTTPError(status_code=404, log_message=str(fetch.error))
+        return fetch
+
+    # pylint: disable=arguments-differ
+    async def head(self, name: str, digest: str):
+        """Headers of config or layer blob"""
+        if digest in CONFIGS:
+            self._set_blob_headers(digest, len(await self.load_config(name, digest)))
+        else:
+            fetch = await self.layer_fetch(name, digest)
+            self._set_blob_headers(digest, fetch.total or None)
+        self.finish()
+
+    async def get(self, name: str, digest: str):
+        """Config or layer blob, layers are streamed as they are fetched"""
+        if digest in CONFIGS:
+            config = await self.load_config(name, digest)
+            self._set_blob_headers(digest, len(config))
+            self.finish(config)
+            return
+
+        fetch = await self.layer_fetch(name, digest)
+        self._set_blob_headers(digest, fetch.total or None)
+        # a failure after this point closes the connection, client verifies the data
+        async for chunk in fetch.follow():
+            self.write(chunk)
+            await self.flush()
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+REGISTRY_ROUTES = [
+    (r'/v2/?', RegistryRoot),
+    (r'/v2/(.+)/manifests/([^/]+)', ManifestHandler),
+    (r'/v2/(.+)/blobs/(sha256:[0-9a-f]{64})', BlobHandler),
+]
@@ -0,0 +1,116 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Cut-through relay of layers downloaded from registry
+
+Only one node of the cluster downloads a layer from registry. Other nodes
+do not wait for it to finish; they follow the download and get every
+chunk as soon as the fetching node has written it to its cache.
+"""
+
+import asyncio
+import os
+
+from typing import AsyncIterator, Optional
+
+
+class OriginFetch:
+    """A layer being downloaded into a file, which relays can follow"""
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self) -> None:
+        self.path = None # type: Optional[str]
+        self.size = 0
+        self.total = 0
+        self.done = False
+        self.error = None # type: Optional[BaseException]
+        self.task = None # type: Optional[asyncio.Future]
+        self._changed = asyncio.Event()
+
+    @classmethod
+    def complete(cls, path: str) -> "OriginFetch":
+        """A finished download of an existing file"""
+        fetch = cls()
+        fetch.start(path, os.path.getsize(path))
+        fetch.received(fetch.total)
+        fetch.finish()
+        return fetch
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @property
+    def started(self) -> bool:
+        """Is file being written"""
+        return self.path is not None
+
+    def start(self, path: str, total: int = 0):
+        """Download started writing into `path`, `total` bytes are expected if known"""
+        self.path = path
+        self.total = total
+        self._notify()
+
+    def received(self, amount: int):
+        """`amount` more bytes are written to file"""
+        self.size += amount
+        self._notify()
+
+    def finish(self, path: str = None, error: BaseException = None):
+        """Download finished, the file may have been moved to `path`"""
+        if path:
+            self.path = path
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def wait_started(self) -> bool:
+        """Wait until file is being written, return False if download failed before"""
+        while not self.started and not self.done:
+            await self._changed.wait()
+        return self.started and not self.error
+
+    async def follow(self) -> AsyncIterator[bytes]:
+        """
+        Read file as it is written, until download is finished
+
+        Raises:
+            The error the download failed with
+        """
+        if not await self.wait_started():
+            raise self.error or EOFError("download did not start")
+
+        with open(self.path, 'rb') as file: # type: ignore
+            position = 0
+            while True:
+                changed = self._changed
+                if position < self.size or self.done:
+                    chunk = file.read(min(self.CHUNK_SIZE, max(self.size - position, 0)) or
+                                      self.CHUNK_SIZE)
+                    if chunk:
+                        position += len(chunk)
+                        yield chunk
+                        continue
+                    if self.done:
+                        if self.error:
+                            raise self.error
+                        return
+                await changed.wait()
@@ -0,0 +1,88 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Relay endpoints, see `beiran_interface_docker.relay`
+"""
+
+import os
+
+from tornado.web import HTTPError
+
+from beiran.cmd_req_handler import JSONEndpoint
+from beiran.daemon.common import UPLOADS
+from beiran_package_container.models import ContainerLayer
+from beiran_interface_docker.api import Services, reject_upload, upload_transfer
+from beiran_interface_docker.relay import OriginFetch
+
+
+class LayerFetchHandler(JSONEndpoint):
+    """Download a layer from registry on behalf of other nodes"""
+
+    # pylint: disable=arguments-differ
+    async def get(self, digest: str):
+        """
+        Stream compressed layer, as it is downloaded from registry of `domain` and
+        `repo` query arguments. Downloads requested at the same time are shared.
+        """
+        ref = {key: self.get_argument(key, None) for key in ('domain', 'repo')}
+        if not all(ref.values()):
+            raise HTTPError(status_code=400, log_message="domain and repo are required")
+
+        if not await UPLOADS.acquire():
+            layer = ContainerLayer.select().where(ContainerLayer.digest == digest).first()
+            reject_upload(self, layer.available_at if layer else [])
+            return
+
+        try:
+            await self.relay(ref, digest)
+        finally:
+            UPLOADS.release()
+
+    async def relay(self, ref: dict, digest: str):
+        """Stream layer from cache directory, or as it is fetched"""
+        layer = Services.docker_util.local_layer(digest) # type: ignore
+        if layer and not (layer.cache_gz_path and os.path.exists(layer.cache_gz_path)):
+            raise HTTPError(status_code=409, log_message="Layer is here, download it")
+        if layer:
+            fetch = OriginFetch.complete(layer.cache_gz_path)
+        else:
+            fetch = Services.docker_util.origin_fetch(ref, digest) # type: ignore
+
+        if not await fetch.wait_started():
+            raise HTTPError(status_code=502, log_message=str(fetch.error))
+
+        self.set_header("Content-Type", "application/octet-stream")
+        self.set_header("Docker-Content-Digest", digest)
+        if fetch.total:
+            self.set_header("Content-Length", str(fetch.total))
+
+        # a failure after this point closes the connection, caller verifies the data
+        with upload_transfer(self) as transfer:
+            async for chunk in fetch.follow():
+                await transfer.throttle(len(chunk))
+                self.write(chunk)
+                await self.flush()
+        self.finish()
+    # pylint: enable=arguments-differ
+
+
+RELAY_ROUTES = [
+    (r'/docker/layers/([0-9a-fsh:]+)/fetch', LayerFetchHandler),
+]
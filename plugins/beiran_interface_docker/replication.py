@@ -0,0 +1,230 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Replication of hot layers
+
+Nodes count requests for layers they serve. A holder of a layer requested
+often asks other nodes to download it, until the layer is on enough online
+nodes, so load of popular layers spreads across more sources. A node which
+joins the cluster may warm up by fetching the most requested layers.
+"""
+
+import asyncio
+import logging
+import math
+import time
+
+from typing import Dict, List
+
+import aiohttp
+
+from beiran.client import Client
+from beiran.daemon.placement import rendezvous
+from beiran.plugin import History
+from beiran.ratelimit import PRIORITY_BACKGROUND
+
+from beiran_package_container.models import ContainerLayer
+
+
+class LayerStats:
+    """Request counts of layers served by local node, decaying by time"""
+
+    def __init__(self, half_life: float = 3600.) -> None:
+        """
+        Args:
+            half_life (float): seconds for request rate of a layer to halve
+        """
+        self.half_life = float(half_life)
+        self.layers = {} # type: Dict[str, dict]
+
+    def _entry(self, digest: str) -> dict:
+        now = time.time()
+        entry = self.layers.setdefault(digest, {'requests': 0., 'updated': now,
+                                                'served': 0, 'failed': 0, 'rejected': 0})
+        entry['requests'] *= math.pow(0.5, (now - entry['updated']) / self.half_life)
+        entry['updated'] = now
+        return entry
+
+    def requested(self, digest: str):
+        """Layer is requested by a client"""
+        self._entry(digest)['requests'] += 1
+
+    def finished(self, digest: str, success: bool):
+        """Layer is served, or serving it failed"""
+        self._entry(digest)['served' if success else 'failed'] += 1
+
+    def rejected(self, digest: str):
+        """Request for layer is rejected since node is saturated"""
+        self._entry(digest)['rejected'] += 1
+
+    def rate(self, digest: str) -> float:
+        """Decayed request count of layer"""
+        if digest not in self.layers:
+            return 0.
+        return self._entry(digest)['requests']
+
+    def hot(self, threshold: float) -> List[str]:
+        """Layers requested at least `threshold` times, most requested first"""
+        rates = {digest: self.rate(digest) for digest in list(self.layers)}
+        return sorted([digest for digest, rate in rates.items() if rate >= threshold],
+                      key=lambda digest: -rates[digest])
+
+    def to_dict(self) -> dict:
+        """Stats of layers"""
+        stats = {}
+        for digest in list(self.layers):
+            stats[digest] = dict(self._entry(digest))
+            stats[digest]['requests'] = round(stats[digest]['requests'], 2)
+        return stats
+
+
+class HotLayerReplicator:
+    """Spread hot layers to more nodes with background priority"""
+
+    # seconds before asking the same node for the same layer again
+    ASK_AGAIN = 600
+
+    def __init__(self, util, stats: LayerStats, replicas: int = 3, # pylint: disable=too-many-arguments
+                 threshold: float = 10., interval: float = 60., history: History = None,
+                 logger: logging.Logger = None) -> None:
+        """
+        Args:
+            util (DockerUtil): docker utilities of plugin
+            stats (LayerStats): request counts of layers
+            replicas (int): number of online nodes to have a hot layer
+            threshold (float): request count of a layer to be hot
+            interval (float): seconds between rounds
+        """
+        self.util = util
+        self.stats = stats
+        self.replicas = int(replicas)
+        self.threshold = float(threshold)
+        self.interval = float(interval)
+        self.history = history
+        self.logger = logger if logger else logging.getLogger('beiran.docker.replication')
+        self.asked = {} # type: Dict[tuple, float]
+        self.tasks = {} # type: Dict[str, asyncio.Future]
+
+    def targets(self, digest: str, holders: List[str], online: List[str]) -> List[str]:
+        """
+        Nodes to replicate layer to. Holders pick them by rendezvous hashing,
+        so they ask the same nodes.
+        """
+        missing = self.replicas - len(holders)
+        if missing <= 0:
+            return []
+        return [uuid for uuid in rendezvous(digest, online) if uuid not in holders][:missing]
+
+    async def replicate_hot_layers(self) -> int:
+        """
+        Ask nodes to download hot layers local node has
+
+        Returns:
+            int: number of requests made
+        """
+        local_uuid = self.util.local_node.uuid.hex
+        online = self.util.online_peers()
+        now = time.time()
+        self.asked = {key: at for key, at in self.asked.items() if now - at < self.ASK_AGAIN}
+
+        asked = 0
+        for digest in self.stats.hot(self.threshold):
+            layer = self.util.local_layer(digest)
+            if not layer:
+                continue
+            holders = [uuid for uuid in layer.available_at if uuid in online or uuid == local_uuid]
+            for uuid in self.targets(digest, holders, list(online)):
+                if (digest, uuid) in self.asked:
+                    continue
+                self.asked[(digest, uuid)] = now
+                try:
+                    await online[uuid].client.replicate_layer(digest, timeout=10)
+                    asked += 1
+                except (Client.Error, aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    self.logger.debug("cannot ask %s to replicate %s: %s", uuid, digest, err)
+        return asked
+
+    async def popular_layers(self) -> List[str]:
+        """Layers requested at online nodes, most requested first"""
+        rates = {} # type: Dict[str, float]
+        for peer in self.util.online_peers().values():
+            try:
+                stats = await peer.client.get_layer_stats(timeout=10)
+            except (Client.Error, aiohttp.ClientError, asyncio.TimeoutError) as err:
+                self.logger.debug("cannot get layer stats of %s: %s", peer.uuid, err)
+                continue
+            for digest, entry in stats['layers'].items():
+                rates[digest] = rates.get(digest, 0.) + entry['requests']
+        return sorted(rates, key=lambda digest: -rates[digest])
+
+    async def warm_up(self, count: int, budget: int) -> int:
+        """
+        Fetch most requested layers of cluster with background priority, so
+        first pulls of a fresh node find layers in its cache
+
+        Args:
+            count (int): number of layers to fetch at most
+            budget (int): total size of layers to fetch at most, in bytes
+
+        Returns:
+            int: number of fetched layers
+        """
+        fetched = 0
+        for digest in await self.popular_layers():
+            if fetched >= count:
+                break
+            # layers of peers are known only if their availability is replicated
+            layer = ContainerLayer.select().where(ContainerLayer.digest == digest).first()
+            if not layer or not layer.size or layer.size > budget:
+                continue
+            if self.util.local_layer(digest):
+                continue
+            if await self.util.replicate_layer(layer, PRIORITY_BACKGROUND):
+                fetched += 1
+                budget -= layer.size
+
+        self.logger.info("warmed up with %d popular layers", fetched)
+        if fetched and self.history:
+            self.history.update('warmed_up_layers={}'.format(fetched))
+        return fetched
+
+    def replicate(self, layer: ContainerLayer) -> asyncio.Future:
+        """Download layer asked by a holder, or join the running download"""
+        if layer.digest not in self.tasks:
+            task = asyncio.ensure_future(self._replicate(layer))
+            task.add_done_callback(lambda _: self.tasks.pop(layer.digest, None))
+            self.tasks[layer.digest] = task
+        return self.tasks[layer.digest]
+
+    async def _replicate(self, layer: ContainerLayer) -> bool:
+        if not await self.util.replicate_layer(layer, PRIORITY_BACKGROUND):
+            return False
+        if self.history:
+            self.history.update('replicated_layer={}'.format(layer.digest))
+        return True
+
+    async def run(self):
+        """Replicate hot layers periodically"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.replicate_hot_layers()
+            except Exception as err: # pylint: disable=broad-except
+                self.logger.error("hot layer replication failed: %s", err)
@@ -24,10 +24,13 @@ import asyncio
 import os
 import logging
 import json
+import time
 import uuid
+import hashlib
 import subprocess
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 import aiohttp
+import async_timeout
 
 import aiofiles
 
@@ -35,10 +38,18 @@ from aiodocker import Docker
 
 from beiran.log import build_logger
 from beiran.models import Node
+from beiran.daemon.peer import PEER_REGISTRY, Peer
+from beiran.daemon.placement import rendezvous
+from beiran.daemon.scoring import SCORES
+from beiran.daemon.common import BANDWIDTH, DISK
+from beiran.ratelimit import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 
 from beiran_package_container.models import ContainerLayer
+from beiran_package_container.util import ContainerUtil
 from beiran_package_container.image_ref import add_idpref, del_idpref
 
+from beiran_interface_docker.relay import OriginFetch
+
 
 LOGGER = build_logger()
 
@@ -70,6 +81,12 @@ class DockerUtil: # pylint: disable=too-many-instance-attributes
         """..."""
         pass
 
+    # seconds without receiving data from a source before racing a backup one
+    STALL_TIMEOUT = 5
+
+    # seconds to wait for another node to download a layer from registry for us
+    ORIGIN_FETCH_TIMEOUT = 600
+
     def __init__(self, storage: str, # pylint: disable=too-many-arguments
                  aiodocker: Docker = None, logger: logging.Logger = None,
                  local_node: Node = None, tar_split_path=None) -> None:
@@ -81,6 +98,10 @@ class DockerUtil: # pylint: disable=too-many-instance-attributes
         self.logger = logger if logger else LOGGER
         self.tar_split_path = tar_split_path
         self.container = None
+        self.availability = None
+        self.holders = None
+        self.catalogs = None
+        self.origin_fetches = {} # type: dict
 
     @property
     def digest_path(self)-> str:
@@ -402,18 +423,25 @@ class DockerUtil: # pylint: disable=too-many-instance-attributes
                   chain_id.replace(':', '/') + '/cache-id') as file:
             return file.read()
 
-    async def ensure_docker_having_layer(self, digest: str, jobid: str) -> Tuple[str, str]:
+    async def ensure_docker_having_layer(self, digest: str, jobid: str,
+                                         ref: dict = None) -> Tuple[str, str]:
         """Download a layer if it doesnt exist locally
         This function returns the path of .tar.gz file, .tar file file or the layer directory
 
         Args:
             digest(str): digest of layer
+            ref(dict): image reference, to have the layer fetched from registry by
+                       another node of the zone if no node has it
         """
-        diff_id = self.container.get_diffid_by_digest(digest) # type: ignore
-        tar_layer_path = self.container.get_layer_tar_file(diff_id) # type: ignore
-
+        local_uuid = self.local_node.uuid.hex # type: ignore
         try:
             layer = ContainerLayer.get(ContainerLayer.digest == digest)
+        except ContainerLayer.DoesNotExist:
+            layer = None
+
+        holders = []
+        if layer:
+            holders = [n for n in layer.available_at if n != local_uuid]
 
             # check docker storage
             try:
@@ -427,25 +455,476 @@ class DockerUtil: # pylint: disable=too-many-instance-attributes
             except DockerUtil.LayerMetadataNotFound:
                 pass
 
-            # try to download layer from node that has tarball in own cache directory
-            for node_id in layer.available_at:
-                if node_id == self.local_node.uuid.hex: # type: ignore
-                    continue
+        nodes = await self.layer_sources(digest, layer, holders)
+
+        # try to download layer from nodes that have tarball in own cache directory
+        if nodes and await self.download_layer_racing(digest, jobid, nodes):
+            diff_id = self.container.get_diffid_by_digest(digest) # type: ignore
+            tar_layer_path = self.container.get_layer_tar_file(diff_id) # type: ignore
+            if not os.path.exists(tar_layer_path):
+                raise self.container.LayerNotFound( # type: ignore
+                    "Layer doesn't exist in cache directory")
+            return 'cache', tar_layer_path
+
+        # nobody has it, let the node assigned to this layer download it from
+        # registry, and get it from that node while it is being downloaded
+        if ref:
+            gz_layer_path = await self.relay_layer_from_origin(digest, jobid, ref)
+            if gz_layer_path:
+                return 'cache-gz', gz_layer_path
+            # this node is the assigned one, or relaying failed; peers asking
+            # for the layer meanwhile follow this download instead of starting one
+            return 'cache', await self.fetch_layer_from_origin(ref, digest, jobid)
 
+        return '', ''
+
+    async def layer_sources(self, digest: str, layer: Optional[ContainerLayer],
+                            holders: list) -> List[Node]:
+        """
+        Nodes to download layer from, best first
+
+        Args:
+            digest (str): digest of layer
+            layer (ContainerLayer): layer record, if known
+            holders (list): uuids of nodes the layer record is available at
+        """
+        local_uuid = self.local_node.uuid.hex # type: ignore
+
+        # `available_at` may be stale, ask peers who holds the layer right now
+        sources = [] # type: list
+        if self.holders:
+            sources = [holder['uuid'] for holder in await self.holders.find('layer', digest)
+                       if holder['uuid'] != local_uuid]
+
+        # layers of other nodes may not be replicated, ask their filters too
+        candidates = [] # type: list
+        if not sources:
+            if self.availability:
+                candidates = self.availability.candidates(digest, exclude=holders + [local_uuid])
+            sources = holders + candidates
+
+        nodes = []
+        for node_id in SCORES.rank(sources, layer.size if layer else None):
+            try:
                 node = Node.get(Node.uuid == node_id)
-                resp = await self.container.download_docker_layer_from_node( # type: ignore
-                    node.url_without_uuid, layer.digest, jobid)
+            except Node.DoesNotExist:
+                continue
 
-                if resp.status == 200:
-                    if not os.path.exists(tar_layer_path):
-                        raise self.container.LayerNotFound( # type: ignore
-                            "Layer doesn't exist in cache directory")
-                    return 'cache', tar_layer_path
+            if node_id in candidates and not await self.availability.confirm(digest, node):
+                continue
+            nodes.append(node)
+        return nodes
 
-        except (ContainerLayer.DoesNotExist, IndexError):
-            pass
+    async def relay_layer_from_origin(self, digest: str, jobid: str, ref: dict) -> str:
+        """
+        Get layer from the node assigned to download it from registry, into
+        cache directory. Returns path of the .tar.gz file, empty if it fails.
+        """
+        fetcher = self.origin_fetcher(digest)
+        gz_layer_path = self.container.get_layer_gz_file(digest) # type: ignore
+        tmp_path = self.container.get_layer_gz_file(uuid.uuid4().hex) # type: ignore
+        if fetcher and await self.download_layer_relayed(fetcher, ref, digest, jobid, tmp_path):
+            os.rename(tmp_path, gz_layer_path)
+            DISK.removed(tmp_path)
+            DISK.added(gz_layer_path)
+            self.container.queues[jobid][digest]['status'] = \
+                self.container.DL_FINISH # type: ignore
+            return gz_layer_path
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return ''
+
+    async def fetch_layer_from_origin(self, ref: dict, digest: str, jobid: str) -> str:
+        """
+        Download layer from registry into cache directory, sharing the download
+        with peers relaying it. Progress is reported to job `jobid`.
 
-        return '', ''
+        Returns:
+            str: path of the .tar file
+        """
+        fetch = self.origin_fetch(ref, digest)
+        entry = self.container.queues[jobid][digest] # type: ignore
+        try:
+            if await fetch.wait_started():
+                entry['size'] = fetch.total or entry['size']
+                entry['status'] = self.container.DL_GZ_DOWNLOADING # type: ignore
+                async for chunk in fetch.follow():
+                    entry['queue'].put_nowait(chunk)
+            layer = await asyncio.shield(fetch.task) # type: ignore
+        finally:
+            entry['queue'].put_nowait(None)
+        entry['status'] = self.container.DL_FINISH # type: ignore
+        return layer.cache_path
+
+    def origin_fetcher(self, digest: str, zone: bool = True) -> Optional[Peer]:
+        """
+        Online peer assigned to download layer from registry; among peers of local
+        zone if `zone` and zones are used, among all peers otherwise. None if local
+        node is the assigned one.
+        """
+        local_zone = self.local_node.zone # type: ignore
+        peers = {uuid_hex: peer for uuid_hex, peer in self.online_peers().items()
+                 if not zone or not local_zone or peer.node.zone == local_zone}
+        fetcher = rendezvous(digest, list(peers) + [self.local_node.uuid.hex])[0] # type: ignore
+        return peers.get(fetcher)
+
+    @staticmethod
+    def online_peers() -> Dict[str, Peer]:
+        """Connected online peers by uuid"""
+        return {peer.uuid: peer for peer in PEER_REGISTRY.values()
+                if not peer.local and peer.node.status == Node.STATUS_ONLINE}
+
+    def local_layer(self, digest: str) -> Optional[ContainerLayer]:
+        """Layer if local node has its files"""
+        layer = ContainerLayer.select().where(ContainerLayer.digest == digest).first()
+        if layer and self.local_node.uuid.hex in layer.available_at and \
+                (layer.docker_path or any(path and os.path.exists(path) for path in # type: ignore
+                                          (layer.cache_path, layer.cache_gz_path))):
+            return layer
+        return None
+
+    def create_layer_job(self, digest: str, priority: str) -> str:
+        """Create a download job of a single layer, outside of image pulls"""
+        jobid = uuid.uuid4().hex
+        self.container.queues[jobid] = { # type: ignore
+            digest: {
+                'queue': asyncio.Queue(),
+                'status': self.container.DL_INIT, # type: ignore
+                'size': 0
+            }
+        }
+        self.container.priorities[jobid] = priority # type: ignore
+        return jobid
+
+    def remove_layer_job(self, jobid: str):
+        """Forget a download job of a single layer"""
+        del self.container.queues[jobid] # type: ignore
+        del self.container.priorities[jobid] # type: ignore
+
+    async def replicate_layer(self, layer: ContainerLayer,
+                              priority: str = PRIORITY_BACKGROUND) -> bool:
+        """
+        Download a layer of other nodes into cache directory
+
+        Returns:
+            bool: if layer is downloaded
+        """
+        local_uuid = self.local_node.uuid.hex # type: ignore
+        online = self.online_peers()
+        nodes = [online[node_id].node for node_id in
+                 SCORES.rank([n for n in layer.available_at if n in online], layer.size)]
+        if not nodes:
+            return False
+
+        self.logger.debug("replicating layer %s", layer.digest)
+        jobid = self.create_layer_job(layer.digest, priority)
+        progress = self.container.queues[jobid][layer.digest]['queue'] # type: ignore
+
+        async def drain():
+            """nobody follows the progress"""
+            while True:
+                await progress.get()
+
+        drainer = asyncio.ensure_future(drain())
+        self.container.diffid_mapping[layer.diff_id] = layer.digest # type: ignore
+        try:
+            if not await self.download_layer_racing(layer.digest, jobid, nodes):
+                return False
+        finally:
+            drainer.cancel()
+            self.remove_layer_job(jobid)
+
+        layer.cache_path = self.container.get_layer_tar_file(layer.diff_id) # type: ignore
+        layer.set_available_at(local_uuid)
+        layer.save()
+        if self.catalogs:
+            self.catalogs['layer'].set(*ContainerUtil.layer_catalog_entry(layer))
+        return True
+
+    def origin_fetch(self, ref: dict, digest: str) -> OriginFetch:
+        """Start downloading layer from registry for other nodes, or join the running one"""
+        if digest not in self.origin_fetches:
+            fetch = OriginFetch()
+            fetch.task = asyncio.ensure_future(self._fetch_layer_from_origin(ref, digest, fetch))
+            fetch.task.add_done_callback(lambda _: self.origin_fetches.pop(digest, None))
+            self.origin_fetches[digest] = fetch
+        return self.origin_fetches[digest]
+
+    async def _fetch_layer_from_origin(self, ref: dict, digest: str,
+                                       fetch: OriginFetch) -> ContainerLayer:
+        gz_layer_path = self.container.get_layer_gz_file(digest) # type: ignore
+        jobid = self.create_layer_job(digest, PRIORITY_INTERACTIVE)
+        try:
+            # with zones, one node of each zone fetches for its zone, and
+            # relays from the one node fetching for the cluster
+            upstream = self.origin_fetcher(digest, zone=False) \
+                       if self.local_node.zone else None # type: ignore
+            relayed = upstream and \
+                await self._relay_from_upstream(upstream, ref, digest, jobid, fetch)
+
+            # relays which started following the failed relay can not continue
+            if not relayed and fetch.started:
+                raise self.container.LayerDownloadFailed( # type: ignore
+                    "Relaying layer from %s failed" % upstream.uuid) # type: ignore
+
+            if not relayed:
+                follower = asyncio.ensure_future(
+                    self._follow_layer_job(jobid, digest, fetch, gz_layer_path))
+                try:
+                    await self.container.download_layer_from_origin( # type: ignore
+                        ref, digest, jobid)
+                finally:
+                    follower.cancel()
+
+            diff_id, tar_layer_path = \
+                await self.container.decompress_gz_layer(gz_layer_path) # type: ignore
+        except Exception as err:
+            fetch.finish(error=err)
+            raise
+        finally:
+            self.remove_layer_job(jobid)
+        fetch.finish(gz_layer_path)
+
+        layer = ContainerLayer.select().where(ContainerLayer.digest == digest).first() or \
+                ContainerLayer(digest=digest, chain_id='')
+        layer.diff_id = add_idpref(diff_id)
+        layer.size = os.path.getsize(tar_layer_path)
+        layer.cache_gz_path = gz_layer_path
+        layer.cache_path = tar_layer_path
+        layer.set_available_at(self.local_node.uuid.hex) # type: ignore
+        layer.save()
+        self.container.diffid_mapping[layer.diff_id] = digest # type: ignore
+        if self.catalogs:
+            self.catalogs['layer'].set(*ContainerUtil.layer_catalog_entry(layer))
+        return layer
+
+    async def _relay_from_upstream(self, upstream: Peer, ref: dict, digest: str, # pylint: disable=too-many-arguments
+                                   jobid: str, fetch: OriginFetch) -> bool:
+        """Relay layer into cache directory from the node fetching it for the cluster"""
+        gz_layer_path = self.container.get_layer_gz_file(digest) # type: ignore
+        tmp_path = self.container.get_layer_gz_file(uuid.uuid4().hex) # type: ignore
+        follower = asyncio.ensure_future(self._follow_layer_job(jobid, digest, fetch, tmp_path))
+        relayed = await self.download_layer_relayed(upstream, ref, digest, jobid, tmp_path)
+        follower.cancel()
+        if relayed:
+            os.rename(tmp_path, gz_layer_path)
+            DISK.removed(tmp_path)
+            DISK.added(gz_layer_path)
+            fetch.path = gz_layer_path
+        elif not fetch.started and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return relayed
+
+    async def _follow_layer_job(self, jobid: str, digest: str, fetch: OriginFetch, path: str):
+        """Let relays follow the file being written by a layer download job"""
+        entry = self.container.queues[jobid][digest] # type: ignore
+        while True:
+            chunk = await entry['queue'].get()
+            if chunk is None:
+                return
+            if not fetch.started:
+                fetch.start(path, entry['size'])
+            fetch.received(len(chunk))
+
+    async def download_layer_relayed(self, peer: Peer, ref: dict, digest: str, # pylint: disable=too-many-arguments
+                                     jobid: str, save_path: str) -> bool:
+        """
+        Download compressed layer into `save_path` from peer, while peer itself
+        is downloading it from registry. Data is verified against the digest.
+
+        Returns:
+            bool: if layer is downloaded
+        """
+        entry = self.container.queues[jobid][digest] # type: ignore
+        priority = self.container.priorities.get(jobid, PRIORITY_INTERACTIVE) # type: ignore
+        url = '{}/docker/layers/{}/fetch'.format(peer.node.url_without_uuid, digest)
+        self.logger.debug("relaying layer %s from %s", digest, peer.uuid)
+
+        try:
+            with BANDWIDTH['download'].transfer(peer.uuid, priority) as transfer:
+                async with aiohttp.ClientSession() as session:
+                    async with async_timeout.timeout(self.ORIGIN_FETCH_TIMEOUT):
+                        headers = {'Beiran-Priority': priority,
+                                   'Beiran-Node': self.local_node.uuid.hex} # type: ignore
+                        async with session.get(url, headers=headers, params={
+                                'domain': ref['domain'], 'repo': ref['repo']}) as resp:
+                            if resp.status != 200:
+                                self.logger.debug("relaying layer %s from %s failed: %d",
+                                                  digest, peer.uuid, resp.status)
+                                return False
+                            entry['size'] = int(resp.headers.get('Content-Length', 0)) or \
+                                            entry['size']
+                            entry['status'] = self.container.DL_GZ_DOWNLOADING # type: ignore
+                            checksum = await self._save_relayed(resp, entry, transfer,
+                                                                save_path)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            self.logger.debug("relaying layer %s from %s failed: %s", digest, peer.uuid, err)
+            SCORES.observe_failure(peer.uuid)
+            return False
+
+        if add_idpref(checksum) != digest:
+            self.logger.debug("relayed layer %s from %s is corrupt", digest, peer.uuid)
+            SCORES.observe_failure(peer.uuid)
+            return False
+
+        entry['queue'].put_nowait(None)
+        return True
+
+    @staticmethod
+    async def _save_relayed(resp: aiohttp.ClientResponse, entry: dict, transfer,
+                            save_path: str) -> str:
+        """Write relayed layer into `save_path` as it is received, returns its sha256"""
+        checksum = hashlib.sha256()
+        with open(save_path, 'wb') as file:
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                await transfer.throttle(len(chunk))
+                checksum.update(chunk)
+                file.write(chunk)
+                file.flush()
+                entry['queue'].put_nowait(chunk)
+        return checksum.hexdigest()
+
+    async def download_layer_racing(self, digest: str, jobid: str, nodes: list) -> bool:
+        """
+        Download layer from the first of `nodes`. If it stalls, start downloading
+        from the next one as well and keep whichever finishes first. Failed
+        sources are replaced with the next ones. Layers are asked compressed
+        from nodes behind slow links, and as tarballs from the others.
+
+        Args:
+            digest (str): digest of layer
+            jobid (str): job id of pull
+            nodes (list): nodes to download from, best first
+
+        Returns:
+            bool: if layer is downloaded
+        """
+        # progress of the leading source is forwarded to the job
+        lead = {'queue': self.container.queues[jobid][digest]['queue'], # type: ignore
+                'forwarded': 0}
+        nodes = list(nodes)
+        tried = set(node.uuid.hex for node in nodes)
+        races = dict([self._start_race(digest, jobid, nodes.pop(0), lead)])
+        try:
+            while races:
+                done, _ = await asyncio.wait(list(races), timeout=1,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    race = races.pop(task)
+                    resp = None if task.exception() else task.result()
+                    if resp and resp.status == 200:
+                        await self._keep_race(digest, race, resp)
+                        # sources end their own progress, the job's ends here
+                        lead['queue'].put_nowait(None)
+                        return True
+
+                    self.logger.debug("downloading layer %s from %s failed: %s", digest,
+                                      race['node'].uuid.hex, task.exception() or resp.status)
+                    SCORES.observe_failure(race['node'].uuid.hex)
+                    self._discard_race(race)
+
+                    # a saturated node tells who else holds the layer
+                    if resp and resp.status == 503:
+                        nodes.extend(self._holder_hints(resp, tried))
+
+                stalled = self._stalled(races)
+                if nodes and (not races or stalled):
+                    if stalled:
+                        self.logger.info("downloading layer %s stalled, racing a backup source",
+                                         digest)
+                    task, race = self._start_race(digest, jobid, nodes.pop(0), lead)
+                    races[task] = race
+        finally:
+            for task, race in races.items():
+                task.cancel()
+                self._discard_race(race)
+
+        lead['queue'].put_nowait(None)
+        return False
+
+    def _start_race(self, digest: str, jobid: str, node: Node,
+                    lead: dict) -> Tuple[asyncio.Future, dict]:
+        """Start downloading layer from node into a temporary file"""
+        # compressed layers over slow links, raw tarballs over fast ones
+        layer_format = SCORES.layer_format(node.uuid.hex)
+        if layer_format == 'gz':
+            path = self.container.get_layer_gz_file(uuid.uuid4().hex) # type: ignore
+        else:
+            path = self.container.get_layer_tar_file(uuid.uuid4().hex) # type: ignore
+        race = {
+            'node': node,
+            'size': 0,
+            'started_at': time.time(),
+            'received_at': time.time(),
+            'queue': asyncio.Queue(),
+            'path': path
+        }
+        race['watcher'] = asyncio.ensure_future(self._watch_race(race, lead))
+        task = asyncio.ensure_future(self.container.download_layer_from_node( # type: ignore
+            digest, jobid,
+            node.url_without_uuid + '/docker/layers/' + digest + '?format=' + layer_format,
+            save_path=race['path'], queue=race['queue'], peer=node.uuid.hex))
+        return task, race
+
+    @staticmethod
+    async def _watch_race(race: dict, lead: dict):
+        """Follow received data of a source, forward progress of the leading one"""
+        while True:
+            chunk = await race['queue'].get()
+            if chunk is None:
+                return
+            race['size'] += len(chunk)
+            race['received_at'] = time.time()
+            if race['size'] > lead['forwarded']:
+                lead['queue'].put_nowait(chunk[len(chunk) - (race['size'] - lead['forwarded']):])
+                lead['forwarded'] = race['size']
+
+    def _stalled(self, races: dict) -> bool:
+        """Is the only running source silent for too long"""
+        now = time.time()
+        return bool(races) and len(races) < 2 and \
+            all(now - race['received_at'] > self.STALL_TIMEOUT for race in races.values())
+
+    async def _keep_race(self, digest: str, race: dict, resp: aiohttp.ClientResponse):
+        """Move layer downloaded by the winning source to its place in cache"""
+        await race['watcher']
+        uuid_hex = race['node'].uuid.hex
+        SCORES.observe_transfer(uuid_hex, race['size'], time.time() - race['started_at'])
+
+        # nodes serve tarballs when they have no compressed layer
+        served = resp.headers.get('Beiran-Layer-Format', 'tar')
+        if served == 'gz':
+            layer_path = self.container.get_layer_gz_file(digest) # type: ignore
+        else:
+            diff_id = self.container.get_diffid_by_digest(digest) # type: ignore
+            layer_path = self.container.get_layer_tar_file(diff_id) # type: ignore
+        os.rename(race['path'], layer_path)
+        DISK.removed(race['path'])
+        DISK.added(layer_path)
+        if served == 'gz':
+            await self.container.decompress_gz_layer(layer_path) # type: ignore
+        self.logger.debug("downloaded layer %s from %s", digest, uuid_hex)
+
+    @staticmethod
+    def _discard_race(race: dict):
+        """Stop following a source and remove what it downloaded"""
+        race['watcher'].cancel()
+        if os.path.exists(race['path']):
+            DISK.removed(race['path'])
+            os.remove(race['path'])
+
+    @staticmethod
+    def _holder_hints(resp: aiohttp.ClientResponse, tried: set) -> List[Node]:
+        """Nodes not tried yet, which a saturated node told to hold the layer"""
+        nodes = []
+        hints = resp.headers.get('Beiran-Holders', '')
+        for hint in [h for h in hints.split(',') if h and h not in tried]:
+            tried.add(hint)
+            try:
+                nodes.append(Node.get(Node.uuid == hint))
+            except Node.DoesNotExist:
+                pass
+        return nodes
 
     async def docker_create_download_config(self, tag: str, jobid: str = uuid.uuid4().hex):
         """
@@ -519,4 +998,5 @@ class DockerUtil: # pylint: disable=too-many-instance-attributes
         with open('/dev/null', 'w') as devnull:
             subprocess.run(cmd.split(), env=os.environ, stdout=devnull, stderr=devnull)
 
+        DISK.added(output_file)
         return output_file
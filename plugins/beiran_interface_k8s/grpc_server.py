@@ -20,16 +20,23 @@
 
 """
 gRPC server (CRI Version: v1alpha2)
-"""
-
 
+Servicer methods are coroutines served by `grpc.aio` on the daemon loop.
+"""
 
 import json
+import time
 import asyncio
+from typing import Optional
+
 import grpc
+from peewee import SQL
 
-from beiran.util import run_in_loop
+from beiran.daemon.common import JOBS, DISK
+from beiran.models import Job
+from beiran_package_container.channels import CHANNELS
 from beiran_package_container.models import ContainerImage
+from beiran_package_container.image_ref import is_digest, add_default_tag, add_idpref
 from beiran_package_container.grpc.api_pb2_grpc import ImageServiceServicer, ImageServiceStub
 from beiran_package_container.grpc.api_pb2 import Image, FilesystemUsage, FilesystemIdentifier, \
                                                   UInt64Value, Int64Value
@@ -37,7 +44,7 @@ from beiran_package_container.grpc.api_pb2 import ImageStatusResponse, ListImage
                                                   PullImageResponse, RemoveImageResponse, \
                                                   ImageFsInfoResponse
 
-from beiran_interface_docker.api import ImageList
+from beiran_interface_docker.jobs_api import submit_pull_job
 
 
 class Services:
@@ -63,94 +70,142 @@ def get_username_or_uid(username: str):
         return None, username
 
 
+class ImageSnapshot:
+    """
+    Local images as ready-made CRI protos. It is invalidated by history
+    updates of interface plugins, and rebuilt on the next request.
+    """
+
+    def __init__(self, node_uuid: str) -> None:
+        self.node_uuid = node_uuid
+        self.response = None # type: ListImagesResponse
+        self.by_id = {} # type: dict
+        self.by_tag = {} # type: dict
+        self.by_digest = {} # type: dict
+        self.configs = {} # type: dict
+
+    def invalidate(self, *_):
+        """Local images have changed"""
+        self.response = None
+
+    def refresh(self):
+        """Rebuild snapshot if it is invalidated"""
+        if self.response is not None:
+            return
+
+        by_id, by_tag, by_digest, configs = {}, {}, {}, {}
+        query = ContainerImage.select() \
+                              .where(SQL('available_at LIKE \'%%"%s"%%\'' % self.node_uuid))
+        for image in query:
+            uid, username = get_username_or_uid(image.config["User"])
+            proto = Image(
+                id=image.hash_id,
+                repo_tags=image.tags,
+                repo_digests=image.repo_digests,
+                size=image.size,
+                uid=uid,
+                username=username
+            )
+            by_id[image.hash_id] = proto
+            by_tag.update({tag: proto for tag in image.tags})
+            by_digest.update({digest: proto for digest in image.repo_digests})
+            configs[image.hash_id] = image.config
+
+        self.by_id, self.by_tag, self.by_digest, self.configs = by_id, by_tag, by_digest, configs
+        self.response = ListImagesResponse(images=list(by_id.values()))
+
+    def list_images(self) -> ListImagesResponse:
+        """Response of ListImages"""
+        self.refresh()
+        return self.response
+
+    def find(self, image_identifier: str) -> Optional[Image]:
+        """
+        Find image by repo digest, tag or (prefix of) id, as
+        `ContainerImage.get_image_data` does
+        """
+        self.refresh()
+        if is_digest(image_identifier):
+            return self.by_digest.get(image_identifier)
+
+        image = self.by_tag.get(add_default_tag(image_identifier))
+        if image:
+            return image
+
+        hash_id = add_idpref(image_identifier)
+        if hash_id in self.by_id:
+            return self.by_id[hash_id]
+        images = [image for image_id, image in self.by_id.items() if image_id.startswith(hash_id)]
+        return images[0] if len(images) == 1 else None
+
+
 class K8SImageServicer(ImageServiceServicer):
     """ImageService defines the public APIs for managing images.
     """
     TIMEOUT_SEC = 5
 
-    def __init__(self):
+    def __init__(self, snapshot: ImageSnapshot) -> None:
         self.cri_fw = CRIForwarder()
+        self.snapshot = snapshot
 
-    def ListImages(self, request, context):
+    async def ListImages(self, request, context):
         """ListImages lists existing images.
         """
         Services.logger.debug("request: ListImages")
         # don't care ImageFilter like containerd (containerd/cri/pkg/server/image_list.go)
 
-        if not self.check_plugin_timeout('package:docker', context):
+        if not await self.check_plugin_timeout('package:docker', context):
             return ListImagesResponse()
 
-        images = []
-
-        for image in ContainerImage.select():
-            uid, username = get_username_or_uid(image.config["User"])
-
-            images.append(Image(
-                id=image.hash_id,
-                repo_tags=image.tags,
-                repo_digests=image.repo_digests,
-                size=image.size,
-                uid=uid,
-                username=username
-            ))
-
-        response = ListImagesResponse(images=images)
-        return response
+        return self.snapshot.list_images()
 
-    def ImageStatus(self, request, context):
+    async def ImageStatus(self, request, context):
         """ImageStatus returns the status of the image. If the image is not
         present, returns a response with ImageStatusResponse.Image set to
         nil.
         """
         Services.logger.debug("request: ImageStatus")
 
-        if not self.check_plugin_timeout('package:docker', context):
+        if not await self.check_plugin_timeout('package:docker', context):
             return ImageStatusResponse()
 
         if not request.image:
             return ImageStatusResponse()
 
-        try:
-            image = ContainerImage.get_image_data(request.image.image)
-        except ContainerImage.DoesNotExist:
+        image = self.snapshot.find(request.image.image)
+        if not image:
             return ImageStatusResponse()
 
         info = {}
         if request.verbose:
-            info = {'config': json.dumps(image.config)} # tentatively return config...
-
-        uid, username = get_username_or_uid(image.config["User"])
-
-        response = ImageStatusResponse(image=Image(
-            id=image.hash_id,
-            repo_tags=image.tags,
-            repo_digests=image.repo_digests,
-            size=image.size,
-            uid=uid,
-            username=username
-        ), info=info)
+            # tentatively return config...
+            info = {'config': json.dumps(self.snapshot.configs[image.id])}
+
+        response = ImageStatusResponse(image=image, info=info)
         return response
 
-    def PullImage(self, request, context):
+    async def PullImage(self, request, context):
         """PullImage pulls an image with authentication config.
         """
         # This method operates like "beiran image pull".
         Services.logger.debug("request: PullImage")
 
-        if not self.check_plugin_timeout('package:docker', context):
+        if not await self.check_plugin_timeout('package:docker', context):
             return PullImageResponse()
 
-        try:
-            # not supporting AuthConfig and PodSandboxConfig now
-            image_ref = run_in_loop(ImageList.pull_routine(request.image.image),
-                                    loop=Services.loop,
-                                    sync=True)
-            response = PullImageResponse(image_ref=image_ref)
-        except Exception: # pylint: disable=broad-except
+        # not supporting AuthConfig and PodSandboxConfig now
+        # concurrent pulls of the same image, e.g. for many pods, share one job
+        job = submit_pull_job(request.image.image)
+        job = await JOBS.wait(job.id)
+
+        if job.status == Job.STATUS_DONE:
+            response = PullImageResponse(image_ref=job.params['image_id'])
+        else:
+            Services.logger.debug("pulling %s failed: %s", request.image.image, job.error)
             try:
                 Services.logger.debug("forward a pull request to other CRI endpoint")
-                response = self.cri_fw.PullImage(request)
-            except grpc._channel._Rendezvous: # pylint: disable=protected-access
+                response = await self.cri_fw.PullImage(request)
+            except grpc.RpcError:
                 context.set_code(grpc.StatusCode.INTERNAL)
                 context.set_details("request was forwarded but the endpoint is unavailable (%s)"
                                     % self.cri_fw.url)
@@ -158,14 +213,14 @@ class K8SImageServicer(ImageServiceServicer):
 
         return response
 
-    def RemoveImage(self, request, context):
+    async def RemoveImage(self, request, context):
         """RemoveImage removes the image.
         This call is idempotent, and must not return an error if the image has
         already been removed.
         """
         Services.logger.debug("request: RemoveImage")
 
-        if not self.check_plugin_timeout('package:docker', context):
+        if not await self.check_plugin_timeout('package:docker', context):
             return RemoveImageResponse()
 
         # not support
@@ -173,35 +228,36 @@ class K8SImageServicer(ImageServiceServicer):
         response = RemoveImageResponse()
         return response
 
-    def ImageFsInfo(self, request, context):
+    async def ImageFsInfo(self, request, context):
         """ImageFSInfo returns information of the filesystem that is used to store images.
         """
         Services.logger.debug("request: ImageFsInfo")
 
-        if not self.check_plugin_timeout('package:docker', context):
-            return RemoveImageResponse()
-
-        # not support
-
-        response = ImageFsInfoResponse(
-            image_filesystems=FilesystemUsage(
-                timestamp=None,
-                fs_id=FilesystemIdentifier(),
-                used_bytes=UInt64Value(),
-                inodes_used=UInt64Value()
+        if not await self.check_plugin_timeout('package:docker', context):
+            return ImageFsInfoResponse()
+
+        # image stores of runtimes first, kubelet looks at the first one
+        timestamp = int(time.time() * 1e9)
+        stores = sorted(DISK.to_dict().items(), key=lambda item: item[0] == 'cache')
+        response = ImageFsInfoResponse(image_filesystems=[
+            FilesystemUsage(
+                timestamp=timestamp,
+                fs_id=FilesystemIdentifier(mountpoint=usage['path']),
+                used_bytes=UInt64Value(value=usage['bytes']),
+                inodes_used=UInt64Value(value=usage['inodes'])
             )
-        )
+            for _, usage in stores
+        ])
         return response
 
-    def check_plugin_timeout(self, plugin_name, context):
+    async def check_plugin_timeout(self, plugin_name, context):
         """
         Check and wait until plugin status to be ready.
         If plugin status isn't 'ready', set an error code and a description to the context.
         """
         try:
-            Services.daemon.check_wait_plugin_status_ready(plugin_name,
-                                                           Services.loop,
-                                                           K8SImageServicer.TIMEOUT_SEC)
+            await Services.daemon.check_wait_plugin_status_ready(plugin_name,
+                                                                 K8SImageServicer.TIMEOUT_SEC)
             return True
         except asyncio.TimeoutError:
             context.set_code(grpc.StatusCode.INTERNAL)
@@ -214,9 +270,11 @@ class CRIForwarder():
     def __init__(self, url='unix:///var/run/dockershim.sock'):
         self.url = url
 
-    def PullImage(self, request): # pylint: disable=invalid-name
+    @property
+    def stub(self) -> ImageServiceStub:
+        """Stub on the shared channel of CRI service"""
+        return ImageServiceStub(CHANNELS.get(self.url))
+
+    async def PullImage(self, request): # pylint: disable=invalid-name
         """Send PullImageRequest to CRI service"""
-        channel = grpc.insecure_channel(self.url)
-        stub = ImageServiceStub(channel)
-        response = stub.PullImage(request)
-        return response
+        return await self.stub.PullImage(request)
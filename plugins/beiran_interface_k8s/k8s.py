@@ -22,14 +22,13 @@
 k8s interface plugin
 """
 
-from concurrent import futures
-
 import grpc
 
 from beiran.plugin import BaseInterfacePlugin
 from beiran.config import config
-from beiran_interface_k8s.grpc_server import K8SImageServicer
+from beiran_interface_k8s.grpc_server import K8SImageServicer, ImageSnapshot
 from beiran_interface_k8s.grpc_server import Services as ApiDependencies
+from beiran_package_container.channels import CHANNELS
 from beiran_package_container.grpc.api_pb2_grpc import add_ImageServiceServicer_to_server
 
 PLUGIN_NAME = 'k8s'
@@ -51,15 +50,24 @@ class K8SInterface(BaseInterfacePlugin):
         ApiDependencies.loop = self.loop
         ApiDependencies.daemon = self.daemon
 
-        self.servicer = K8SImageServicer()
-        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        self.snapshot = ImageSnapshot(self.node.uuid.hex)
+        self.servicer = K8SImageServicer(self.snapshot)
+        # served on daemon loop, without a thread pool limiting concurrent requests
+        self.server = grpc.aio.server()
         add_ImageServiceServicer_to_server(self.servicer, self.server)
         self.server.add_insecure_port(self.unix_socket_path)
 
+    async def load_depend_plugin_instances(self, instances: list) -> None:
+        """Rebuild image snapshot after images of docker or containerd change"""
+        for name in ('interface:docker', 'interface:containerd'):
+            if name in instances and instances[name].history: # type: ignore
+                instances[name].history.on('update', self.snapshot.invalidate) # type: ignore
+
     async def start(self):
         """Start gRPC server"""
-        self.server.start()
+        await self.server.start()
 
     async def stop(self):
         """Stop gRPC server"""
-        self.server.stop(None)
+        await self.server.stop(None)
+        await CHANNELS.close(self.servicer.cri_fw.url)
@@ -0,0 +1,68 @@
+# Beiran P2P Package Distribution Layer
+# Copyright (C) 2019  Rainlab Inc & Creationline, Inc & Beiran Contributors
+#
+# Rainlab Inc. https://rainlab.co.jp
+# Creationline, Inc. https://creationline.com">
+# Beiran Contributors https://docs.beiran.io/contributors.html
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Long-lived gRPC channels, shared by clients of the same endpoint
+
+Channels are `grpc.aio` ones, so calls do not block the daemon loop. They
+keep connections of long calls, like event subscriptions, alive with pings,
+and reconnect with backoff when the endpoint goes away, so callers do not
+set up connections per request.
+"""
+
+from typing import Dict
+
+import grpc
+
+
+# Go gRPC servers, like containerd, answer pings more frequent than every 5
+# minutes, or pings without calls in flight, with GOAWAY `too_many_pings`
+KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_time_ms', 300000),
+    ('grpc.keepalive_timeout_ms', 20000),
+    ('grpc.keepalive_permit_without_calls', 0),
+    ('grpc.initial_reconnect_backoff_ms', 1000),
+    ('grpc.max_reconnect_backoff_ms', 10000),
+]
+
+
+class ChannelPool:
+    """One channel for each target"""
+
+    def __init__(self, options: list = None) -> None:
+        self.options = options if options is not None else KEEPALIVE_OPTIONS
+        self.channels = {} # type: Dict[str, grpc.aio.Channel]
+
+    def get(self, target: str) -> grpc.aio.Channel:
+        """Channel of `target`, it is opened on first use, in the running loop"""
+        if target not in self.channels:
+            self.channels[target] = grpc.aio.insecure_channel(target, options=self.options)
+        return self.channels[target]
+
+    async def close(self, target: str = None):
+        """Close channel of `target`, or all channels"""
+        targets = [target] if target else list(self.channels)
+        for name in targets:
+            channel = self.channels.pop(name, None)
+            if channel:
+                await channel.close()
+
+
+CHANNELS = ChannelPool()
@@ -30,9 +30,10 @@ import tarfile
 import uuid
 import hashlib
 import gzip
-from typing import Tuple, Callable, Awaitable, Any
+from typing import Tuple, Callable, Awaitable, Any, List
 from collections import OrderedDict
 import aiohttp
+import async_timeout
 from pyee import EventEmitter
 from peewee import SQL
 
@@ -42,17 +43,23 @@ from beiran.models import Node
 from beiran.util import clean_keys
 from beiran.lib import async_write_file_stream, async_req
 from beiran.daemon.peer import Peer
+from beiran.daemon.common import BANDWIDTH, DISK
+from beiran.ratelimit import PRIORITY_INTERACTIVE
 
 from beiran_package_container.image_ref import is_tag, is_digest, add_default_tag, del_idpref, \
                                                add_idpref, normalize_ref
 from beiran_package_container.models import ContainerImage, ContainerLayer
 from beiran_package_container.models import MODEL_LIST
-from beiran_package_container.util import ContainerUtil
+from beiran_package_container.util import BlobCache, ContainerUtil
 
 
 PLUGIN_NAME = 'container'
 PLUGIN_TYPE = 'package'
 
+# ensure_layer_func(digest, jobid, ref) of interface plugins, which tries to get
+# a layer from other nodes and returns its storage and path, or ('', '')
+EnsureLayerFunc = Callable[[str, str, dict], Awaitable[Any]]
+
 
 # pylint: disable=attribute-defined-outside-init
 class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instance-attributes
@@ -118,21 +125,29 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
             os.makedirs(self.layer_gz_path)
         if not os.path.isdir(self.tmp_path):
             os.makedirs(self.tmp_path)
+        DISK.add_store('cache', self.cache_dir, track_files=True)
 
         self.model_list = MODEL_LIST
         self.history = History() # type: History
         self.queues: dict = {}
         self.emitters: dict = {}
+        self.priorities: dict = {}
 
         # TODO: Persist this mapping cache to disk or database
         self.diffid_mapping: dict = {}
         self.layerdb_mapping: dict = {}
 
+        # manifests fetched by pulls as registry serves them, by digest
+        self.manifests = BlobCache(size=64)
+
     async def save_image_at_node(self, image: ContainerImage, node: Node):
         """Save an image from a node into db"""
         try:
             image_ = ContainerImage.get(ContainerImage.hash_id == image.hash_id)
             image_.set_available_at(node.uuid.hex)
+            # nodes may name the same image differently, keep names of all
+            image_.tags = sorted(set(image_.tags) | set(image.tags))
+            image_.repo_digests = sorted(set(image_.repo_digests) | set(image.repo_digests))
             image_.save()
             self.log.debug("update existing image %s, now available on new node: %s",
                            image.hash_id, node.uuid.hex)
@@ -165,15 +180,20 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
                 layer.delete_instance()
 
     @staticmethod
-    async def tag_image(image_id: str, tag: str):
+    async def tag_image(image_id: str, tag: str) -> List[ContainerImage]:
         """
         Tag an image existing in database. If already same tag exists,
         move it from old one to new one.
+
+        Returns:
+            list: images whose tags are changed
         """
+        changed = []
         target = ContainerImage.get_image_data(image_id)
         if tag not in target.tags:
             target.tags = [tag] # type: ignore
             target.save()
+            changed.append(target)
 
         images = ContainerImage.select().where((SQL('tags LIKE \'%%"%s"%%\'' % tag)))
 
@@ -183,13 +203,15 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
 
             image.tags.remove(tag)
             image.save()
+            changed.append(image)
+        return changed
 
     def get_diffid_by_digest(self, digest: str)-> str:
         """Return diff id of a layer by digest from mapping."""
         return list(self.diffid_mapping.keys())[list(self.diffid_mapping.values()).index(digest)]
 
     async def ensure_having_layer(self, ref: dict, digest: str, jobid: str,
-                                  ensure_layer_func: Callable[[str, str], Awaitable[Any]],
+                                  ensure_layer_func: EnsureLayerFunc,
                                   **kwargs):
         """Download a layer if it doesnt exist locally
         This function returns the path of .tar.gz file, .tar file file or the layer directory
@@ -210,7 +232,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
             self.log.debug("Found layer (%s)", gz_layer_path)
             return 'cache-gz', gz_layer_path # .tar.gz file exists
 
-        storage, layer_path = await ensure_layer_func(digest, jobid)
+        storage, layer_path = await ensure_layer_func(digest, jobid, ref)
         if storage != '' and layer_path != '':
             return storage, layer_path
 
@@ -220,7 +242,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
         return 'cache-gz', gz_layer_path
 
     async def get_layer_diffid(self, ref: dict, digest: str, jobid: str,
-                               ensure_layer_func: Callable[[str, str], Awaitable[Any]],
+                               ensure_layer_func: EnsureLayerFunc,
                                **kwargs)-> str:
         """Calculate layer's diffid, using it's tar file"""
         storage, layer_path = await self.ensure_having_layer( # type: ignore
@@ -245,7 +267,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
 
 
     async def get_layer_diffids_of_image(self, ref: dict, descriptors: list, jobid: str,
-                                         ensure_layer_func: Callable[[str, str], Awaitable[Any]],
+                                         ensure_layer_func: EnsureLayerFunc,
                                          )-> dict:
         """Download and allocate layers included in an image."""
         self.queues[jobid] = dict() # type: ignore
@@ -278,39 +300,67 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
 
         return OrderedDict(type='layers', diff_ids=results)
 
-    def create_emitter(self, jobid):
-        """Create a new emitter and add it to a emitter dictionary"""
+    def create_emitter(self, jobid, priority: str = PRIORITY_INTERACTIVE):
+        """
+        Create a new emitter and add it to a emitter dictionary. Layers of
+        the job are downloaded with `priority`.
+        """
         self.emitters[jobid] = EventEmitter()
+        self.priorities[jobid] = priority
 
     async def fetch_image_manifest(self, host: str, repository: str, tag_or_digest: str,
                                    schema_v2_header: str, **kwargs) -> dict:
         """
         Fetch image manifest specified repository.
         """
+        manifest, _ = await self.fetch_and_keep_manifest(host, repository, tag_or_digest,
+                                                         schema_v2_header, **kwargs)
+        return manifest
+
+    async def fetch_and_keep_manifest(self, host: str, repository: str, tag_or_digest: str,
+                                      schema_v2_header: str, **kwargs) -> Tuple[dict, str]:
+        """
+        Fetch image manifest, keeping it as registry serves it in `manifests`
+
+        Returns:
+            (dict, str): manifest and its digest
+        """
+        raw, media_type = await self.fetch_image_manifest_raw(host, repository, tag_or_digest,
+                                                              schema_v2_header, **kwargs)
+        digest = add_idpref(hashlib.sha256(raw).hexdigest())
+        self.manifests.set(digest, raw, media_type)
+        return json.loads(raw.decode('utf-8')), digest
+
+    async def fetch_image_manifest_raw(self, host: str, repository: str, tag_or_digest: str,
+                                       accept: str, **kwargs) -> Tuple[bytes, str]:
+        """
+        Fetch image manifest as registry serves it, so that its digest is kept.
+
+        Returns:
+            (bytes, str): manifest and its media type
+        """
         url = 'https://{}/v2/{}/manifests/{}'.format(host, repository, tag_or_digest)
         requirements = ''
 
-        self.log.debug("fetch manifest from %s", url)
+        self.log.debug("fetch raw manifest from %s", url)
 
-        # try to access the server with HEAD requests
-        # there is a purpose to check the type of authentication
         resp, _ = await async_req(url=url, return_json=False, timeout=self.TIMEOUT,
                                   retry=self.RETRY, method='HEAD')
-        if resp.status == 401 or resp.status == 200:
-            if resp.status == 401:
-                requirements = await self.get_auth_requirements(resp.headers, **kwargs)
-
-            resp, manifest = await async_req(url=url, return_json=True, Authorization=requirements,
-                                             timeout=self.TIMEOUT_DL_MANIFEST, retry=self.RETRY,
-                                             Accept=schema_v2_header)
-        if resp.status != 200:
-            raise self.FetchManifestFailed("Failed to fetch manifest. code: %d"
-                                           % resp.status)
-        return manifest
+        if resp.status == 401:
+            requirements = await self.get_auth_requirements(resp.headers, **kwargs)
+
+        async with aiohttp.ClientSession() as session:
+            async with async_timeout.timeout(self.TIMEOUT_DL_MANIFEST):
+                async with session.get(url, headers={'Authorization': requirements,
+                                                     'Accept': accept}) as resp:
+                    if resp.status != 200:
+                        raise self.FetchManifestFailed("Failed to fetch manifest. code: %d"
+                                                       % resp.status)
+                    return await resp.read(), resp.headers.get('Content-Type', '')
 
     async def fetch_config_schema_v1(self, ref: dict, # pylint: disable=too-many-locals, too-many-branches
                                      manifest: dict, jobid: str,
-                                     ensure_layer_func: Callable[[str, str], Awaitable[Any]],
+                                     ensure_layer_func: EnsureLayerFunc,
                                      ) -> Tuple[str, str, str]:
         """
         Pull image using image manifest version 1
@@ -408,7 +458,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
 
     async def fetch_config_schema_v2(self, ref: dict,
                                      manifest: dict, jobid: str,
-                                     ensure_layer_func: Callable[[str, str], Awaitable[Any]]
+                                     ensure_layer_func: EnsureLayerFunc
                                      )-> Tuple[str, str, str]:
         """
         Pull image using image manifest version 2
@@ -443,7 +493,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
 
     async def fetch_manifest_list(self, ref: dict, # pylint: disable=too-many-arguments
                                   manifestlist: dict, jobid: str, schema_v2_header: dict,
-                                  ensure_layer_func: Callable[[str, str], Awaitable[Any]]
+                                  ensure_layer_func: EnsureLayerFunc
                                   )-> Tuple[str, str, str]:
         """
         Read manifest list and call appropriate pulling image function for the machine.
@@ -553,7 +603,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
 
     async def create_or_download_config(self, tag: str, jobid: str,
                                         schema_v2_header: dict,
-                                        ensure_layer_func: Callable[[str, str], Awaitable[Any]]):
+                                        ensure_layer_func: EnsureLayerFunc):
         """
         Create or download image config.
 
@@ -577,7 +627,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
         ref = normalize_ref(tag, index=True)
 
         # get manifest
-        manifest = await self.fetch_image_manifest( # type: ignore
+        manifest, manifest_digest = await self.fetch_and_keep_manifest( # type: ignore
             ref['domain'], ref['repo'], ref['suffix'], self.join_schema(schema_v2_header))
 
         schema_v = manifest['schemaVersion']
@@ -612,6 +662,9 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
 
             else:
                 raise self.ManifestError('Invalid media type: %d' % media_type)  # type: ignore # pylint: disable=line-too-long
+
+            # digest of manifest as registry serves it, see `manifests`
+            repo_digest = manifest_digest
         else:
             raise self.ManifestError('Invalid schema version: %d' % schema_v)  # type: ignore # pylint: disable=line-too-long
 
@@ -671,42 +724,72 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
             self.queues[jobid][digest]['size'] = layer_size
             self.queues[jobid][digest]['status'] = self.DL_GZ_DOWNLOADING
 
-            resp = await async_write_file_stream(url, save_path, timeout=self.TIMEOUT_DL_LAYER + \
-                                                 ContainerUtil.get_additional_time_downlaod(
-                                                     layer_size),
-                                                 retry=self.RETRY,
-                                                 queue=self.queues[jobid][digest]['queue'],
-                                                 Authorization=requirements)
+            priority = self.priorities.get(jobid, PRIORITY_INTERACTIVE)
+            shaper = BANDWIDTH['download']
+            with shaper.transfer(ref['domain'], priority) as transfer:
+                resp = await async_write_file_stream(
+                    url, save_path, timeout=self.TIMEOUT_DL_LAYER + \
+                    ContainerUtil.get_additional_time_downlaod(layer_size) + \
+                    shaper.duration(layer_size, priority),
+                    retry=self.RETRY,
+                    queue=self.queues[jobid][digest]['queue'],
+                    transfer=transfer,
+                    Authorization=requirements)
 
         if resp.status != 200:
             raise self.LayerDownloadFailed("Failed to download layer. code: %d"
                                            % resp.status)
 
         self.log.debug("downloaded layer %s to %s", digest, save_path)
+        DISK.added(save_path)
         self.queues[jobid][digest]['status'] = self.DL_FINISH
 
-    async def download_layer_from_node(self, digest: str, jobid: str,
-                                       url: str)-> aiohttp.client_reqrep.ClientResponse:
+    async def download_layer_from_node(self, digest: str, jobid: str, # pylint: disable=too-many-arguments
+                                       url: str, save_path: str = None,
+                                       queue: asyncio.Queue = None, peer: str = None
+                                       )-> aiohttp.client_reqrep.ClientResponse:
         """
         Download layer from other node.
+
+        Args:
+            save_path (str): where to save the layer, tar file of the layer in cache by default
+            queue (asyncio.Queue): where to put the chunks, progress queue of job by default
+            peer (str): uuid of the node, its downloads share a per peer bandwidth limit
         """
-        diff_id = self.get_diffid_by_digest(digest)
-        save_path = self.get_layer_tar_file(diff_id)
+        if not save_path:
+            diff_id = self.get_diffid_by_digest(digest)
+            save_path = self.get_layer_tar_file(diff_id)
         self.log.debug("downloading layer from %s", url)
 
         # HEAD request to get size
         resp, _ = await async_req(url=url, return_json=False, timeout=self.TIMEOUT,
                                   retry=self.RETRY, method='HEAD')
+        if resp.status != 200:
+            return resp
         layer_size = int(resp.headers.get('content-length'))
 
         self.queues[jobid][digest]['size'] = layer_size
         self.queues[jobid][digest]['status'] = self.DL_TAR_DOWNLOADING
 
-        resp = await async_write_file_stream(url, save_path, timeout=self.TIMEOUT_DL_LAYER + \
-                                             ContainerUtil.get_additional_time_downlaod(layer_size),
-                                             retry=self.RETRY,
-                                             queue=self.queues[jobid][digest]['queue'])
+        # uploading node shapes its side by priority as well
+        priority = self.priorities.get(jobid, PRIORITY_INTERACTIVE)
+        shaper = BANDWIDTH['download']
+        with shaper.transfer(peer, priority) as transfer:
+            resp = await async_write_file_stream(
+                url, save_path, timeout=self.TIMEOUT_DL_LAYER + \
+                ContainerUtil.get_additional_time_downlaod(layer_size) + \
+                shaper.duration(layer_size, priority),
+                retry=self.RETRY,
+                queue=queue or self.queues[jobid][digest]['queue'],
+                transfer=transfer,
+                **{'Beiran-Priority': priority, 'Beiran-Node': self.node.uuid.hex})
+        if resp.status != 200:
+            if os.path.exists(save_path):
+                os.remove(save_path)
+            return resp
+
         self.log.debug("downloaded layer %s to %s", digest, save_path)
+        DISK.added(save_path)
         self.queues[jobid][digest]['status'] = self.DL_FINISH
         return resp
 
@@ -728,6 +811,7 @@ class ContainerPackaging(BasePackagePlugin):  # pylint: disable=too-many-instanc
         diff_id = tmp_hash.hexdigest()
         tar_layer_path = self.get_layer_tar_file(diff_id)
         os.rename(tmp_file, tar_layer_path)
+        DISK.added(tar_layer_path)
         return diff_id, tar_layer_path
 
     async def create_image_from_tar(self, tag_or_digest: str, config_json_str: str, # pylint: disable=too-many-locals
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: content_events.proto
+
+import sys
+_b=sys.version_info[0]<3 and (lambda x:x) or (lambda x:x.encode('latin1'))
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import message as _message
+from google.protobuf import reflection as _reflection
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from .gogoproto import gogo_pb2 as gogoproto_dot_gogo__pb2
+
+
+DESCRIPTOR = _descriptor.FileDescriptor(
+  name='content_events.proto',
+  package='containerd.events',
+  syntax='proto3',
+  serialized_options=_b('Z2github.com/containerd/containerd/api/events;events'),
+  serialized_pb=_b('\n\x14\x63ontent_events.proto\x12\x11\x63ontainerd.events\x1a\x14gogoproto/gogo.proto\"S\n\rContentDelete\x12\x42\n\x06\x64igest\x18\x01 \x01(\tB2\xda\xde\x1f*github.com/opencontainers/go-digest.Digest\xc8\xde\x1f\x00\x42\x34Z2github.com/containerd/containerd/api/events;eventsX\x00\x62\x06proto3')
+  ,
+  dependencies=[gogoproto_dot_gogo__pb2.DESCRIPTOR,])
+
+
+
+
+_CONTENTDELETE = _descriptor.Descriptor(
+  name='ContentDelete',
+  full_name='containerd.events.ContentDelete',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='digest', full_name='containerd.events.ContentDelete.digest', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=_b('\332\336\037*github.com/opencontainers/go-digest.Digest\310\336\037\000'), file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=65,
+  serialized_end=148,
+)
+
+DESCRIPTOR.message_types_by_name['ContentDelete'] = _CONTENTDELETE
+_sym_db.RegisterFileDescriptor(DESCRIPTOR)
+
+ContentDelete = _reflection.GeneratedProtocolMessageType('ContentDelete', (_message.Message,), dict(
+  DESCRIPTOR = _CONTENTDELETE,
+  __module__ = 'content_events_pb2'
+  # @@protoc_insertion_point(class_scope:containerd.events.ContentDelete)
+  ))
+_sym_db.RegisterMessage(ContentDelete)
+
+
+DESCRIPTOR._options = None
+_CONTENTDELETE.fields_by_name['digest']._options = None
+# @@protoc_insertion_point(module_scope)
@@ -23,11 +23,36 @@
 import hashlib
 import platform
 import tarfile
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
 from peewee import SQL
+from beiran.merkle import entry_hash
 from .models import ContainerImage, ContainerLayer
 from .image_ref import add_idpref
 
 
+class BlobCache:
+    """Small LRU cache of manifests and configs by digest, they never change"""
+
+    def __init__(self, size: int = 256) -> None:
+        self.size = size
+        self.items = OrderedDict() # type: OrderedDict
+
+    def get(self, digest: str) -> Optional[Tuple[bytes, str]]:
+        """Content and media type of blob"""
+        if digest not in self.items:
+            return None
+        self.items.move_to_end(digest)
+        return self.items[digest]
+
+    def set(self, digest: str, content: bytes, media_type: str):
+        """Remember blob"""
+        self.items[digest] = (content, media_type)
+        self.items.move_to_end(digest)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+
 class ContainerUtil: # pylint: disable=too-many-instance-attributes
     """Container Utilities"""
     @staticmethod
@@ -61,6 +86,30 @@ class ContainerUtil: # pylint: disable=too-many-instance-attributes
         ContainerLayer.delete().where(SQL('available_at = \'[]\' AND ' \
             'download_progress = \'null\'')).execute()
 
+    @staticmethod
+    def image_catalog_entry(image: ContainerImage) -> Tuple[str, str]:
+        """Catalog tree key and value hash of an image, changes when it is (un)tagged"""
+        return 'image:' + image.hash_id, entry_hash(image.hash_id, image.layers,
+                                                    sorted(image.tags), sorted(image.repo_digests))
+
+    @staticmethod
+    def layer_catalog_entry(layer: ContainerLayer) -> Tuple[str, str]:
+        """Catalog tree key and value hash of a layer"""
+        return 'layer:' + layer.diff_id, entry_hash(layer.diff_id)
+
+    @staticmethod
+    def catalog_entries(uuid_hex: str, kind: str) -> Iterator[Tuple[str, str]]:
+        """Catalog tree entries of images or layers available at node"""
+        available = SQL('available_at LIKE \'%%"%s"%%\'' % uuid_hex)
+        if kind == 'image':
+            for image in ContainerImage.select(ContainerImage.hash_id, ContainerImage.layers,
+                                               ContainerImage.tags,
+                                               ContainerImage.repo_digests).where(available):
+                yield ContainerUtil.image_catalog_entry(image)
+        elif kind == 'layer':
+            for layer in ContainerLayer.select(ContainerLayer.diff_id).where(available):
+                yield ContainerUtil.layer_catalog_entry(layer)
+
     @staticmethod
     async def get_go_python_arch()-> str:
         """